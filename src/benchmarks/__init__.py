@@ -0,0 +1,7 @@
+'''
+Created on 2026-10-18 
+
+A package with a synthetic-data benchmark suite for the load and fit pipelines in clim and eva
+
+@author: agent, GPL v3
+'''
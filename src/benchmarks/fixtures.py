@@ -0,0 +1,184 @@
+'''
+Created on Oct 18, 2026
+
+Synthetic NetCDF fixtures that mimic the layout of the shape-averaged and station time-series of WRF, CESM
+and EC datasets (shape averages of WRF members are split into separate filetype files, like the production
+archive); the fixtures are served to the regular load functions by temporarily replacing loadDataset,
+so that the complete load and fit pipelines can be benchmarked without the production archive.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import netCDF4 as nc
+# internal imports
+from geodata.misc import DatasetError
+from geodata.netcdf import DatasetNetCDF
+from datasets.common import shp_params, stn_params
+from utils.misc import defaultNamedtuple
+
+# some definitions
+FixtureSize = defaultNamedtuple('FixtureSize', ('nstations','nyears','nbasins','nmembers'),
+                                defaults=dict(nstations=100, nyears=15, nbasins=5, nmembers=3))
+fixture_sizes = dict(small=FixtureSize(nstations=20, nyears=5, nbasins=2, nmembers=2),
+                     medium=FixtureSize(nstations=100, nyears=15, nbasins=5, nmembers=4),
+                     large=FixtureSize(nstations=800, nyears=30, nbasins=20, nmembers=10))
+flavors = ('WRF','CESM') # model-like experiments; observations are EC-like
+shape_vars = ('precip','T2','runoff','MaxPrecip_1d')
+wrf_filetypes = OrderedDict([('srfc',('T2','precip')), ('hydro',('precip','runoff')), ('lsm',('runoff',)), 
+                             ('xtrm',('MaxPrecip_1d',))]) # variables in WRF filetypes (some overlap)
+station_vars = ('precip','MaxPrecip_1d','MaxPrecip_5d')
+provinces = ('BC','AB','SK','MB','ON')
+cluster_name = 'cluster_projection'
+year0 = 1979 # reference year for time axes
+
+
+## helper functions to write NetCDF files
+
+def _addStrVar(ncfile, varname, strings, dim):
+  ''' add a string variable as a character array (with a separate string length dimension) '''
+  strlen = max(len(string) for string in strings)
+  ncfile.createDimension(varname+'_strlen', strlen)
+  var = ncfile.createVariable(varname, 'S1', (dim,varname+'_strlen'))
+  var[:] = nc.stringtochar(np.array(strings, dtype='S{:d}'.format(strlen)))
+  return var
+
+def _addTimeAxis(ncfile, nyears):
+  ''' monthly time axis in months since the reference year '''
+  ncfile.createDimension('time', nyears*12)
+  var = ncfile.createVariable('time', 'i4', ('time',))
+  var.units = 'month since {:04d}-01-01'.format(year0)
+  var[:] = np.arange(nyears*12)
+
+def _seasonalCycle(nyears, amplitude=1., mean=0., noise=0.2, random=None, size=None):
+  ''' synthetic monthly time-series with a seasonal cycle and random noise '''
+  shape = (nyears*12,) if size is None else (nyears*12,size)
+  cycle = np.cos(2*np.pi*(np.arange(nyears*12)%12 - 6)/12.)
+  if size is not None: cycle = cycle[:,np.newaxis]
+  return mean + amplitude*cycle + noise*random.standard_normal(shape)
+
+def writeShapeFixture(filepath, name, size, seed=None, varlist=None):
+  ''' write a shape-averaged time-series file with nbasins shapes (only variables in varlist, if given; the
+      values of a variable do not depend on varlist) '''
+  random = np.random.RandomState(seed)
+  with nc.Dataset(filepath, 'w', format='NETCDF4') as ncfile:
+    ncfile.name = name; ncfile.title = 'Synthetic {:s} Shape Averages'.format(name)
+    _addTimeAxis(ncfile, size.nyears)
+    ncfile.createDimension('shape', size.nbasins)
+    var = ncfile.createVariable('shape', 'i4', ('shape',)); var[:] = np.arange(size.nbasins)
+    names = ['B{:02d}'.format(i) for i in xrange(size.nbasins)]
+    for param in shp_params:
+      if param in ('shape_name','shp_long_name'): _addStrVar(ncfile, param, names, 'shape')
+      elif param == 'shp_type': _addStrVar(ncfile, param, ['BSN']*size.nbasins, 'shape')
+      elif param in ('shp_area','shp_encl'):
+        ncfile.createVariable(param, 'f4', ('shape',))[:] = random.uniform(1e3,1e5,size.nbasins)
+      # N.B.: 2D shape masks are omitted
+    for varname in shape_vars:
+      mean = 280. if varname == 'T2' else 3e-5
+      data = np.abs(_seasonalCycle(size.nyears, amplitude=0.2*mean, mean=mean, noise=0.1*mean,
+                                   random=random, size=size.nbasins))
+      if varlist is not None and varname not in varlist: continue # consume random numbers anyway
+      var = ncfile.createVariable(varname, 'f4', ('time','shape'))
+      var[:] = data; var.units = 'K' if varname == 'T2' else 'kg/m^2/s'
+
+def writeStationFixture(filepath, name, size, seed=None):
+  ''' write a station time-series file with nstations stations (common to all datasets) '''
+  random = np.random.RandomState(0) # station meta data is the same in all datasets
+  with nc.Dataset(filepath, 'w', format='NETCDF4') as ncfile:
+    ncfile.name = name; ncfile.title = 'Synthetic {:s} Station Data'.format(name)
+    _addTimeAxis(ncfile, size.nyears)
+    ncfile.createDimension('station', size.nstations)
+    var = ncfile.createVariable('station', 'i4', ('station',)); var[:] = np.arange(size.nstations)
+    for param in list(stn_params) + [cluster_name]:
+      if param == 'stn_prov': _addStrVar(ncfile, param, list(random.choice(provinces, size.nstations)), 'station')
+      elif param.endswith('name'):
+        _addStrVar(ncfile, param, ['S{:04d}'.format(i) for i in xrange(size.nstations)], 'station')
+      else:
+        var = ncfile.createVariable(param, 'f4', ('station',))
+        if param == 'stn_lat': var[:] = random.uniform(42,60,size.nstations)
+        elif param == 'stn_lon': var[:] = random.uniform(-130,-80,size.nstations)
+        elif param == 'stn_rec_len': var[:] = random.randint(1,size.nyears+1,size.nstations)
+        elif param == 'stn_begin_date': var[:] = random.randint(0,36,size.nstations); var.units = 'month since 1979-01-01'
+        elif param == 'stn_end_date': var[:] = size.nyears*12 - random.randint(0,36,size.nstations); var.units = 'month since 1979-01-01'
+        elif param == 'zs_err': var[:] = random.normal(0,100,size.nstations)
+        elif param == cluster_name: var[:] = random.randint(1,5,size.nstations)
+        else: var[:] = random.uniform(0,1000,size.nstations)
+    random = np.random.RandomState(seed)
+    for varname in station_vars:
+      var = ncfile.createVariable(varname, 'f4', ('time','station'))
+      if varname.startswith('Max'): data = random.gumbel(20., 5., (size.nyears*12,size.nstations))
+      else: data = np.abs(_seasonalCycle(size.nyears, amplitude=1., mean=3., noise=0.5, random=random,
+                                         size=size.nstations))
+      var[:] = data; var.units = 'mm/day'
+
+
+## the synthetic archive
+
+def memberNames(size):
+  ''' names of the synthetic experiments (WRF- and CESM-like members) '''
+  return ['{:s}-{:02d}'.format(flavor.lower(), i) for flavor in flavors for i in xrange(size.nmembers)]
+
+class SyntheticArchive(object):
+  ''' A folder with synthetic shape and station files for a set of experiments and EC-like observations '''
+  obs_name = 'EC'
+
+  def __init__(self, folder, size=None, lwrite=True):
+    if isinstance(size,basestring): size = fixture_sizes[size]
+    self.size = FixtureSize() if size is None else size
+    self.folder = folder
+    self.members = memberNames(self.size)
+    self.names = self.members + [self.obs_name]
+    self.WRF_exps = OrderedDict((name,name) for name in self.members if name.startswith('wrf'))
+    self.nopen = 0 # number of datasets that were opened (e.g. to detect cache hits)
+    self.nfiles = 0 # number of files that were opened
+    if lwrite: self.write()
+
+  def filepath(self, name, mode, filetype=None):
+    if filetype is None: return os.path.join(self.folder, '{:s}_{:s}.nc'.format(name, mode))
+    else: return os.path.join(self.folder, '{:s}_{:s}_{:s}.nc'.format(name, filetype, mode))
+
+  def filelist(self, name, mode, filetypes=None):
+    ''' source files of a dataset; shape averages of WRF members are split into filetypes (all by default) '''
+    if mode != 'shpavg' or name not in self.WRF_exps: return [self.filepath(name, mode)]
+    if not filetypes: filetypes = wrf_filetypes.keys()
+    for filetype in filetypes:
+      if filetype not in wrf_filetypes: raise DatasetError, "No synthetic filetype '{:s}'.".format(filetype)
+    return [self.filepath(name, mode, filetype) for filetype in filetypes]
+
+  def write(self):
+    ''' write all fixture files (existing files are replaced, even if they are still open) '''
+    if not os.path.exists(self.folder): os.makedirs(self.folder)
+    for filename in os.listdir(self.folder):
+      if filename.endswith('.nc'): os.remove(os.path.join(self.folder,filename))
+    for i,name in enumerate(self.names):
+      if name in self.WRF_exps:
+        for filetype,varlist in wrf_filetypes.iteritems():
+          writeShapeFixture(self.filepath(name,'shpavg',filetype), name, self.size, seed=i, varlist=varlist)
+      else: writeShapeFixture(self.filepath(name,'shpavg'), name, self.size, seed=i)
+      writeStationFixture(self.filepath(name,'ecprecip'), name, self.size, seed=i)
+
+  def loadDataset(self, name=None, station=None, shape=None, varlist=None, filetypes=None, **kwargs):
+    ''' replacement for datasets.common.loadDataset that opens fixture files (other arguments are ignored) '''
+    if not isinstance(name,basestring): name = name.name
+    if name not in self.names: raise DatasetError, "No synthetic dataset '{:s}'.".format(name)
+    mode = shape if shape else station
+    if mode not in ('shpavg','ecprecip'): raise DatasetError, "No synthetic '{}' data.".format(mode)
+    filelist = self.filelist(name, mode, filetypes=filetypes)
+    self.nopen += 1; self.nfiles += len(filelist)
+    dataset = DatasetNetCDF(name=name, filelist=filelist, varlist=varlist, mode='r')
+    return dataset
+
+  @contextmanager
+  def patch(self):
+    ''' context manager that serves fixtures to all load functions in datasets.common, clim and eva '''
+    import datasets.common, clim.load, clim.store
+    modules = (datasets.common, clim.load, clim.store)
+    originals = [module.loadDataset for module in modules]
+    for module in modules: module.loadDataset = self.loadDataset
+    try: yield self
+    finally:
+      for module,original in zip(modules,originals): module.loadDataset = original
@@ -0,0 +1,141 @@
+'''
+Created on Oct 18, 2026
+
+A benchmark suite for the load and fit pipelines: loadShapeEnsemble (with all or pruned WRF filetypes), 
+loadStationEnsemble, loadStationFit
+(flattened, per station, batched and with bootstrap) and rescaleDistributions are timed end to end on synthetic fixtures (see
+benchmarks.fixtures); results are written to a JSON file, so that runs can be compared between commits.
+
+Usage: python -m benchmarks.run --size medium --repeat 3 --output benchmark.json
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import os, time, json, shutil, tempfile, platform, subprocess
+from collections import OrderedDict
+import numpy as np
+# internal imports
+from clim.load import loadShapeEnsemble, loadStationEnsemble
+from clim.cache import FiletypeIndex
+from eva.load import loadStationFit, rescaleDistributions
+from benchmarks.fixtures import SyntheticArchive, FixtureSize, fixture_sizes, provinces, wrf_filetypes
+
+# some definitions
+default_constraints = dict(min_len=1, lat=(40,65), max_zerr=300, end_after=1980)
+
+
+## benchmark definitions (each returns a function without arguments that is timed)
+
+def benchShapeEnsemble(archive):
+  basins = ['B{:02d}'.format(i) for i in xrange(archive.size.nbasins)]
+  return lambda: loadShapeEnsemble(names=archive.members, basins=basins, varlist=['precip','T2'],
+                                   aggregation='mean', load_list=['basins'], lproduct='outer', variable_list=dict())
+
+def benchShapeFiletypes(archive, lprune=False):
+  basins = ['B{:02d}'.format(i) for i in xrange(archive.size.nbasins)]
+  ftindex = FiletypeIndex(filepath=os.path.join(archive.folder,'filetype_index.json')) if lprune else None
+  return lambda: loadShapeEnsemble(names=archive.WRF_exps.keys(), basins=basins, varlist=['precip','T2'],
+                                   aggregation='mean', load_list=['basins'], lproduct='outer', variable_list=dict(),
+                                   filetypes=wrf_filetypes.keys(), WRF_exps=archive.WRF_exps, filetype_index=ftindex)
+
+def benchShapePruned(archive):
+  return benchShapeFiletypes(archive, lprune=True)
+
+def benchStationEnsemble(archive):
+  return lambda: loadStationEnsemble(names=archive.names, provs=provinces[:2], varlist=['MaxPrecip_1d'],
+                                     stationtype='ecprecip', seasons=['summer','winter'], aggregation='max',
+                                     load_list=['season','prov'], lproduct='outer', variable_list=dict(),
+                                     default_constraints=default_constraints)
+
+def _stationFit(archive, lbootstrap=False, nbs=30, lflatten=True, lbatch=False):
+  return loadStationFit(names=archive.names, provs=provinces[:2], varlist=['MaxPrecip_1d'], stationtype='ecprecip',
+                        seasons=['summer'], aggregation='max', lfit=True, dist='gev', lflatten=lflatten,
+                        sample_axis=None if lflatten else 'year', lbatch=lbatch,
+                        lbootstrap=lbootstrap, nbs=nbs, load_list=['season'], lproduct='outer',
+                        variable_list=dict(), default_constraints=default_constraints)
+
+def benchStationFit(archive):
+  return lambda: _stationFit(archive, lbootstrap=False)
+
+def benchStationFitStations(archive):
+  return lambda: _stationFit(archive, lflatten=False)
+
+def benchStationFitBatch(archive):
+  return lambda: _stationFit(archive, lflatten=False, lbatch=True)
+
+def benchStationFitBootstrap(archive):
+  return lambda: _stationFit(archive, lbootstrap=True, nbs=30)
+
+def benchRescaling(archive):
+  stnens, fitens = _stationFit(archive, lbootstrap=False) # setup is not timed
+  return lambda: [rescaleDistributions(fit, reference=archive.obs_name, target=None) for fit in fitens]
+
+benchmarks = OrderedDict([('loadShapeEnsemble',benchShapeEnsemble), ('loadShapeEnsemble_filetypes',benchShapeFiletypes),
+                          ('loadShapeEnsemble_pruned',benchShapePruned), ('loadStationEnsemble',benchStationEnsemble),
+                          ('loadStationFit',benchStationFit), ('loadStationFit_stations',benchStationFitStations),
+                          ('loadStationFit_batch',benchStationFitBatch), ('loadStationFit_bootstrap',benchStationFitBootstrap),
+                          ('rescaleDistributions',benchRescaling)])
+
+
+## helper functions
+
+def timeCall(fct, repeat=3):
+  ''' time a function without arguments repeatedly (wall time in seconds) '''
+  times = []
+  for _ in xrange(repeat):
+    t0 = time.time(); fct(); times.append(time.time() - t0)
+  return times
+
+def gitCommit():
+  ''' return the current git commit (or None, if not available) '''
+  try:
+    folder = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.check_output(['git','rev-parse','HEAD'], cwd=folder, stderr=subprocess.STDOUT).strip()
+  except (OSError, subprocess.CalledProcessError): return None
+
+def runBenchmarks(size=None, folder=None, repeat=3, names=None, output=None, lprint=True):
+  ''' write fixtures, run benchmarks and return (and optionally write) the results as a dict '''
+  if isinstance(size,basestring): size = fixture_sizes[size]
+  if size is None: size = FixtureSize()
+  ltemp = folder is None
+  if ltemp: folder = tempfile.mkdtemp(prefix='clim_benchmark_')
+  names = benchmarks.keys() if names is None else names
+  try:
+    t0 = time.time()
+    archive = SyntheticArchive(folder, size=size)
+    meta = OrderedDict(commit=gitCommit(), timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       python=platform.python_version(), numpy=np.__version__, platform=platform.platform(),
+                       size=OrderedDict(zip(size._fields,size)), repeat=repeat, setup=time.time()-t0)
+    results = []
+    with archive.patch():
+      for name in names:
+        fct = benchmarks[name](archive)
+        times = timeCall(fct, repeat=repeat)
+        results.append(OrderedDict(name=name, times=times, min=min(times), median=float(np.median(times)),
+                                   mean=float(np.mean(times))))
+        if lprint: print('{:28s} min {:8.3f}s, median {:8.3f}s'.format(name, results[-1]['min'], results[-1]['median']))
+  finally:
+    if ltemp: shutil.rmtree(folder, ignore_errors=True)
+  report = OrderedDict(meta=meta, results=results)
+  if output:
+    with open(output,'w') as f: json.dump(report, f, indent=2)
+  return report
+
+
+if __name__ == '__main__':
+
+  import argparse
+  parser = argparse.ArgumentParser(description='Benchmark the clim and eva load pipelines on synthetic data.')
+  parser.add_argument('--size', default='medium', choices=sorted(fixture_sizes.keys()))
+  for field in FixtureSize._fields: parser.add_argument('--'+field, type=int, default=None)
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--folder', default=None, help='fixture folder (default: temporary)')
+  parser.add_argument('--output', default='benchmark.json')
+  parser.add_argument('--only', nargs='+', default=None, choices=benchmarks.keys())
+  args = parser.parse_args()
+  # override preset sizes
+  size = fixture_sizes[args.size]._replace(**{field:getattr(args,field) for field in FixtureSize._fields
+                                              if getattr(args,field) is not None})
+  runBenchmarks(size=size, folder=args.folder, repeat=args.repeat, names=args.only, output=args.output)
+  print('\nResults written to {:s}'.format(args.output))
@@ -0,0 +1,20 @@
+'''
+Created on Oct 18, 2026
+
+Aggregation of monthly time-series for the optimized load paths (chunked reduction, incremental refresh
+and multi-aggregation loads): all aggregations are computed with the seasonal and climatological methods
+of Dataset/Variable that loadEnsembleTS uses, so that results are the same as for a regular load.
+
+@author: agent, GPL v3
+'''
+
+
+## aggregation with the methods of loadEnsembleTS
+
+def applyAggregation(dataset, aggregation, season=None, taxis='time'):
+  ''' aggregate a Dataset or Variable with the seasonal/climatological methods that loadEnsembleTS uses 
+      (seasonal<Aggregation> or clim<Aggregation>), so that season definitions and degrees of freedom are
+      the same as for a regular load '''
+  method = aggregation if aggregation.isupper() else aggregation.title()
+  if season is None: return getattr(dataset,'clim'+method)(taxis=taxis)
+  else: return getattr(dataset,'seasonal'+method)(season=season, taxis=taxis)
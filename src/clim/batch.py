@@ -0,0 +1,160 @@
+'''
+Created on Oct 18, 2026
+
+A parallel execution engine for batch loading: the expanded argument list of a BatchLoad call (e.g. the
+outer product of basins, seasons and varlists) is evaluated concurrently in a thread pool (I/O-bound
+work) or a process pool (CPU-bound reductions); the output order is preserved and failures are
+re-raised with information about the failed cell.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import functools, sys, traceback
+from collections import OrderedDict
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+# internal imports
+from geodata.misc import ArgumentError
+from utils.misc import defaultNamedtuple
+from datasets.common import BatchLoad, expandArgumentList
+from clim.cache import inMemory, copyResult, getCacheKey
+
+# some definitions
+executor_list = ('serial','thread','process')
+PlanEntry = defaultNamedtuple('PlanEntry', ('name','filetype','domain','selection','season','period'))
+
+
+## load plan with duplicate elimination
+
+class LoadPlan(object):
+  ''' An expanded load plan: the list of cells (keyword arguments for the load function) with exact 
+      duplicates merged, and the datasets (PlanEntry tuples) that the cells will open, with the number 
+      of references and (optionally) estimated file counts and bytes. '''
+
+  def __init__(self, kwargs_list):
+    self.cells = list(kwargs_list)
+    keys = [getCacheKey('cell', **kwargs) for kwargs in self.cells]
+    self.unique = [] # indices of unique cells
+    self.mapping = [] # index of the unique cell for each cell
+    first = dict()
+    for i,key in enumerate(keys):
+      if key not in first: 
+        first[key] = len(self.unique); self.unique.append(i)
+      self.mapping.append(first[key])
+    self.entries = OrderedDict() # PlanEntry: dict(count, files, bytes)
+
+  @property
+  def ncells(self): return len(self.cells)
+
+  @property
+  def nunique(self): return len(self.unique)
+
+  @property
+  def unique_cells(self): return [self.cells[i] for i in self.unique]
+
+  def addEntry(self, entry, files=None, nbytes=None):
+    ''' add a dataset entry or increase its reference count '''
+    if entry in self.entries: self.entries[entry]['count'] += 1
+    else: self.entries[entry] = dict(count=1, files=files, bytes=nbytes)
+
+  @property
+  def nfiles(self): return sum(info['files'] or 0 for info in self.entries.itervalues())
+
+  @property
+  def nbytes(self): return sum(info['bytes'] or 0 for info in self.entries.itervalues())
+
+  def expand(self, results):
+    ''' map results for unique cells back to the full (expanded) list of cells; duplicate cells receive 
+        copies, so that results can be modified independently '''
+    if len(results) != self.nunique: raise ArgumentError, "Expected {:d} results.".format(self.nunique)
+    expanded = []; lused = [False]*self.nunique
+    for i in self.mapping:
+      expanded.append(copyResult(results[i]) if lused[i] else results[i])
+      lused[i] = True
+    return expanded
+
+  def __str__(self):
+    string = 'Load plan: {:d} cells ({:d} unique), {:d} datasets, {:d} files, {:.1f} MB\n'.format(
+              self.ncells, self.nunique, len(self.entries), self.nfiles, self.nbytes/1024.**2)
+    for entry,info in self.entries.iteritems():
+      files = '?' if info['files'] is None else '{:d}'.format(info['files'])
+      mb = '?' if info['bytes'] is None else '{:.1f}'.format(info['bytes']/1024.**2)
+      string += '  {:s}: {:d}x, {:s} files, {:s} MB\n'.format(', '.join(str(e) for e in entry), info['count'], files, mb)
+    return string
+
+
+## helper functions
+
+class _Cell(object):
+  ''' a picklable wrapper for a load function that catches exceptions, so that they can be re-raised
+      in the main process (in order) '''
+
+  def __init__(self, load_fct, lpickle=False):
+    self.load_fct = load_fct
+    self.lpickle = lpickle
+
+  def __call__(self, args):
+    i, kwargs = args
+    try:
+      result = self.load_fct(**kwargs)
+      if self.lpickle: result = inMemory(result)
+      return i, True, result, None
+    except Exception as err:
+      return i, False, err, (None if self.lpickle else sys.exc_info()[2], traceback.format_exc())
+
+def getNproc(nproc=None, ncells=None):
+  ''' determine a sensible number of workers '''
+  if nproc is None: nproc = multiprocessing.cpu_count()
+  if ncells is not None: nproc = min(nproc, ncells)
+  return max(nproc,1)
+
+
+## the executor
+
+def executeBatch(load_fct, kwargs_list, executor='thread', nproc=None, lunique=True):
+  ''' evaluate a load function for every entry of an (expanded) argument list; executor can be 'thread',
+      'process' or 'serial'; results are returned in input order; if any cell fails, the exception of
+      the first failed cell is re-raised with 'cell_index', 'cell_kwargs' and 'cell_traceback' attributes;
+      if lunique is True, duplicate cells are only evaluated once (and receive copies of the result) '''
+  if executor is None: executor = 'serial'
+  if executor not in executor_list: raise ArgumentError, executor
+  if lunique: 
+    plan = kwargs_list if isinstance(kwargs_list,LoadPlan) else LoadPlan(kwargs_list)
+    try: results = executeBatch(load_fct, plan.unique_cells, executor=executor, nproc=nproc, lunique=False)
+    except Exception as err:
+      if hasattr(err,'cell_index'): err.cell_index = plan.unique[err.cell_index] # index in full list
+      raise
+    return plan.expand(results)
+  cells = list(enumerate(kwargs_list))
+  nproc = getNproc(nproc, ncells=len(cells))
+  if executor == 'serial' or nproc == 1 or len(cells) < 2:
+    results = map(_Cell(load_fct), cells)
+  else:
+    if executor == 'thread': pool = ThreadPool(nproc)
+    else: pool = multiprocessing.Pool(nproc)
+    try: results = pool.map(_Cell(load_fct, lpickle=(executor == 'process')), cells, chunksize=1)
+    finally: pool.close(); pool.join()
+  # check for errors (in order) and return results
+  for i,lsuccess,result,info in results:
+    if not lsuccess:
+      tb, tbstr = info
+      result.cell_index = i; result.cell_kwargs = cells[i][1]; result.cell_traceback = tbstr
+      if tb is not None: raise result.__class__, result, tb
+      else: raise result
+  return [result for _,_,result,_ in results]
+
+
+## decorator for load functions
+
+def ParallelBatchLoad(load_fct):
+  ''' a decorator that works like BatchLoad, but adds the arguments 'executor' and 'nproc' to evaluate the
+      expanded argument list concurrently; without executor, cells are evaluated serially; in both cases,
+      duplicate cells are only evaluated once (see executeBatch) '''
+  batch_fct = BatchLoad(load_fct)
+  @functools.wraps(load_fct)
+  def parallelBatchLoad(load_list=None, lproduct='outer', executor=None, nproc=None, **kwargs):
+    if not load_list: return batch_fct(load_list=load_list, lproduct=lproduct, **kwargs)
+    kwargs_list = expandArgumentList(expand_list=load_list, lproduct=lproduct, **kwargs)
+    return executeBatch(load_fct, kwargs_list, executor=executor, nproc=nproc) # serial, if executor is None
+  return parallelBatchLoad
@@ -0,0 +1,519 @@
+'''
+Created on Oct 18, 2026
+
+A simple persistent on-disk cache for Ensembles returned by the load functions in clim.load; entries are
+keyed on the normalized load arguments and validated against the size and modification time of the
+source files, so that repeated calls do not have to touch the original NetCDF files; time-series states
+can be stored as well, so that entries can be refreshed incrementally when new years arrive. Also a
+per-session in-memory registry of ensemble members, so that members of overlapping ensembles are only loaded once,
+and an index of the variables in each filetype, so that only files with requested variables are opened.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import os, hashlib, json, time, threading, itertools, tempfile
+import cPickle as pickle
+import numpy as np
+from contextlib import contextmanager
+from warnings import warn
+try: import fcntl
+except ImportError: fcntl = None # no file locks (e.g. on Windows): only threads are synchronized
+# internal imports
+from geodata.base import Ensemble
+from geodata.misc import ArgumentError
+
+# some definitions
+default_folder = os.getenv('CLIM_CACHE', os.path.join(os.path.expanduser('~'),'.clim_cache'))
+default_size = 2**30 # 1 GB
+# arguments that are not part of the cache key (large dicts of meta data or objects)
+ignore_args = ('WRF_exps','CESM_exps','WRF_ens','CESM_ens','variable_list','cache','registry','store','profile',
+               'filetype_index','memory_budget')
+
+
+## helper functions to generate cache keys
+
+def normalizeArgument(arg):
+  ''' convert an argument into a hashable and reproducible representation '''
+  if isinstance(arg,dict):
+    return tuple((key,normalizeArgument(arg[key])) for key in sorted(arg.keys()))
+  elif isinstance(arg,(set,frozenset)):
+    return tuple(sorted(normalizeArgument(a) for a in arg))
+  elif isinstance(arg,(list,tuple)):
+    return tuple(normalizeArgument(a) for a in arg)
+  elif isinstance(arg,np.ndarray):
+    return normalizeArgument(arg.tolist())
+  elif isinstance(arg,np.generic):
+    return arg.item()
+  elif arg is None or isinstance(arg,(basestring,bool,int,long,float)):
+    return arg
+  elif hasattr(arg,'name'):
+    return (arg.__class__.__name__, arg.name) # e.g. experiment objects
+  else:
+    return repr(arg)
+
+def getCacheKey(fct_name, **kwargs):
+  ''' compute a content hash from a function name and (normalized) keyword arguments '''
+  args = normalizeArgument({key:value for key,value in kwargs.iteritems() if key not in ignore_args})
+  return hashlib.sha1(repr((fct_name,args))).hexdigest()
+
+def _resolveExp(name, WRF_exps=None, CESM_exps=None):
+  ''' return the experiment (Exp instance) for a name (or the name, if it is not an experiment) '''
+  for exps in (WRF_exps, CESM_exps):
+    if exps and isinstance(name,basestring) and name in exps: return exps[name]
+  return name
+
+def _expDefinition(name, WRF_exps=None, CESM_exps=None):
+  ''' return the attributes of an experiment (Exp instance or name of an experiment) '''
+  exp = _resolveExp(name, WRF_exps=WRF_exps, CESM_exps=CESM_exps)
+  return getattr(exp,'__dict__',exp)
+
+def ensembleDigest(names, WRF_exps=None, CESM_exps=None, WRF_ens=None, CESM_ens=None):
+  ''' a hash of the members of all ensemble names and of the experiment definitions of all datasets, since
+      the dicts of experiments and ensembles are not part of the cache key (see ignore_args) '''
+  if not isinstance(names,(list,tuple)): names = [names]
+  definitions = []
+  for name in names:
+    members = None
+    for ensembles in (WRF_ens, CESM_ens):
+      if ensembles and isinstance(name,basestring) and name in ensembles: members = ensembles[name]; break
+    expdefs = [_expDefinition(member, WRF_exps=WRF_exps, CESM_exps=CESM_exps) for member in members or [name]]
+    definitions.append((normalizeArgument(name), normalizeArgument(members), normalizeArgument(expdefs)))
+  return hashlib.sha1(repr(definitions)).hexdigest()
+
+def sourceFiles(ensemble):
+  ''' collect the source files of the datasets in an Ensemble (if they are known) '''
+  filelist = set()
+  for dataset in ensemble:
+    files = getattr(dataset,'filelist',None) or dataset.atts.get('filelist',None)
+    if isinstance(files,basestring): files = [files]
+    if files: filelist.update(files)
+  return sorted(filelist)
+
+def fileStats(filelist):
+  ''' return size and modification time of source files (files are not opened) '''
+  stats = []
+  for filepath in filelist:
+    if os.path.exists(filepath):
+      stat = os.stat(filepath)
+      stats.append((filepath, stat.st_size, stat.st_mtime))
+    else: stats.append((filepath, None, None))
+  return stats
+
+def inMemory(result):
+  ''' replace NetCDF-backed datasets with in-memory copies, so that results can be pickled '''
+  if isinstance(result,Ensemble):
+    members = [ds.copy(asNC=False) if hasattr(ds,'filelist') else ds for ds in result]
+    return Ensemble(*members, name=result.ens_name, title=result.ens_title, basetype=result.basetype)
+  elif isinstance(result,(list,tuple)):
+    return result.__class__(inMemory(res) for res in result)
+  elif hasattr(result,'filelist'): return result.copy(asNC=False)
+  else: return result
+
+def copyResult(result):
+  ''' return an independent copy of a load result (in-memory datasets with deep copies of all variables) '''
+  if isinstance(result,Ensemble):
+    members = [copyResult(ds) for ds in result]
+    return Ensemble(*members, name=result.ens_name, title=result.ens_title, basetype=result.basetype)
+  elif isinstance(result,(list,tuple)):
+    return result.__class__(copyResult(res) for res in result)
+  elif hasattr(result,'variables'):
+    result = inMemory(result)
+    dataset = result.copy(varlist=[])
+    for var in result.variables.itervalues(): dataset.addVariable(var.copy(deepcopy=True))
+    return dataset
+  else: return result
+
+
+## the cache class
+
+# process-wide locks for cache folders (shared by all cache instances that use the same folder)
+_folder_locks = dict()
+_folder_locks_lock = threading.Lock()
+
+def _folderLock(folder):
+  ''' return the process-wide lock for a cache folder '''
+  with _folder_locks_lock: return _folder_locks.setdefault(os.path.abspath(folder), threading.Lock())
+
+@contextmanager
+def _lockFolder(folder, lock_file):
+  ''' lock a folder against other threads (process lock) and other processes (file lock) '''
+  with _folderLock(folder):
+    with open(os.path.join(folder,lock_file),'a') as lockfile:
+      if fcntl is not None: fcntl.flock(lockfile.fileno(), fcntl.LOCK_EX)
+      try: yield
+      finally:
+        if fcntl is not None: fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+
+def atomicWrite(filepath, write_fct, mode='wb'):
+  ''' write a file through a unique temporary file in the same folder and rename it (atomically) '''
+  fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(filepath) or os.curdir, prefix='.tmp-')
+  try:
+    with os.fdopen(fd, mode) as f: write_fct(f)
+    os.rename(tmppath, filepath)
+  finally:
+    if os.path.exists(tmppath): os.remove(tmppath)
+
+def _validStats(sources):
+  ''' check if recorded file stats are complete and source files have not changed (see fileStats) '''
+  if not sources: return False # can not be validated
+  stats = fileStats([stat[0] for stat in sources])
+  return all(tuple(new) == tuple(old) for new,old in zip(stats,sources))
+
+class EnsembleCache(object):
+  ''' A persistent on-disk cache for Ensembles with size-bounded LRU eviction; the index is stored as a
+      JSON file in the cache folder and entries are stored as pickles of in-memory Ensembles; the index is 
+      only written when entries are added or removed (access times of retrieved entries are merged then), 
+      under a process lock and a file lock, and changes are merged with the index on disk, so that several
+      cache instances (threads or processes) can share a folder. '''
+  index_file = 'index.json'
+  lock_file = 'index.lock'
+
+  def __init__(self, folder=None, max_size=None):
+    ''' initialize cache folder and load index '''
+    self.folder = default_folder if folder is None else folder
+    self.max_size = default_size if max_size is None else max_size
+    if not os.path.exists(self.folder): os.makedirs(self.folder)
+    self._lock = _folderLock(self.folder)
+    self._atimes = dict() # access times that have not been written yet
+    self.index = self._readIndex()
+
+  def _readIndex(self):
+    ''' read index from disk (or return empty index) '''
+    filepath = os.path.join(self.folder,self.index_file)
+    if os.path.exists(filepath):
+      with open(filepath,'r') as f:
+        try: index = json.load(f)
+        except ValueError: index = dict() # corrupted index: start over
+    else: index = dict()
+    return index
+
+  def _lockIndex(self):
+    ''' lock the index against other threads and processes (see _lockFolder) '''
+    return _lockFolder(self.folder, self.lock_file)
+
+  def _updateIndex(self, entries=None, removed=None, max_size=None):
+    ''' merge new and removed entries and pending access times with the index on disk, evict least 
+        recently used entries and write the index (under the index lock); returns evicted keys '''
+    with self._lockIndex():
+      index = self._readIndex()
+      for key,atime in self._atimes.iteritems():
+        if key in index: index[key]['atime'] = max(atime, index[key]['atime'])
+      removed = [key for key in removed or () if index.pop(key,None) is not None]
+      if entries: index.update(entries)
+      evicted = self._evict(index, max_size=max_size)
+      for key in removed + evicted:
+        filepath = self._entryPath(key)
+        if os.path.exists(filepath): os.remove(filepath)
+      atomicWrite(os.path.join(self.folder,self.index_file), lambda f: json.dump(index, f), mode='w')
+      self.index = index; self._atimes = dict()
+    return evicted
+
+  def _evict(self, index, max_size=None):
+    ''' remove least recently used entries from an index until its size is below max_size '''
+    max_size = self.max_size if max_size is None else max_size
+    lru = sorted(index.iterkeys(), key=lambda key: index[key]['atime'])
+    total = sum(entry['size'] for entry in index.itervalues())
+    evicted = []
+    while total > max_size and lru:
+      key = lru.pop(0)
+      total -= index.pop(key)['size']; evicted.append(key)
+    return evicted
+
+  def _touch(self, key):
+    ''' update the access time of an entry (for LRU eviction; written with the next index update) '''
+    atime = time.time()
+    with self._lock: self._atimes[key] = atime
+    entry = self.index.get(key,None)
+    if entry is not None: entry['atime'] = atime
+
+  def _lookup(self, key):
+    ''' return the index entry for a key; the index is re-read, if the key was added by another instance '''
+    if key not in self.index: self.index = dict(self._readIndex(), **self.index)
+    return self.index.get(key,None)
+
+  def _entryPath(self, key):
+    return os.path.join(self.folder,key+'.pickle')
+
+  def __contains__(self, key):
+    return key in self.index
+
+  def __len__(self):
+    return len(self.index)
+
+  @property
+  def size(self):
+    ''' total size of all cache entries in bytes '''
+    return sum(entry['size'] for entry in self.index.values())
+
+  def isValid(self, key):
+    ''' check if an entry exists and its source files have not changed '''
+    entry = self._lookup(key)
+    if entry is None: return False
+    if not os.path.exists(self._entryPath(key)): return False
+    return _validStats(entry['sources'])
+
+  def get(self, key, default=None):
+    ''' retrieve an Ensemble from the cache; invalid entries are removed and default is returned '''
+    if not self.isValid(key):
+      if key in self.index: self.remove(key)
+      return default
+    try:
+      with open(self._entryPath(key),'rb') as f: ensemble = pickle.load(f)
+    except (IOError, EOFError): return default # removed by another instance
+    self._touch(key)
+    return ensemble
+
+  def put(self, key, ensemble, sources=None, stats=None, name=None):
+    ''' store an Ensemble (as in-memory copies) and record the file stats of its source files; stats should 
+        be collected from the raw members before they are read (see fileStats), since aggregated datasets 
+        do not know their source files; entries without source files can not be validated and are not stored '''
+    if not isinstance(ensemble,Ensemble): raise TypeError, ensemble
+    if stats is None: stats = fileStats(sourceFiles(ensemble) if sources is None else sources)
+    ensemble = inMemory(ensemble) # NetCDF-backed datasets can not be pickled
+    if not stats:
+      warn("No source files for cache entry '{}' - not cached.".format(name)); return ensemble
+    filepath = self._entryPath(key)
+    atomicWrite(filepath, lambda f: pickle.dump(ensemble, f, protocol=pickle.HIGHEST_PROTOCOL))
+    entry = dict(name=name, size=os.path.getsize(filepath), atime=time.time(), ctime=time.time(), 
+                 sources=stats)
+    self._updateIndex(entries={key:entry})
+    return ensemble
+
+  def getState(self, key):
+    ''' retrieve stored time-series states (not validated, since states are updated incrementally) '''
+    if self._lookup(key) is None: return None
+    try:
+      with open(self._entryPath(key),'rb') as f: states = pickle.load(f)
+    except (IOError, EOFError): return None
+    self._touch(key)
+    return states
+
+  def putState(self, key, states, sources=None, stats=None, name=None):
+    ''' store time-series states (see clim.incremental) and record the file stats of the source files '''
+    if stats is None: stats = fileStats(sources or [])
+    filepath = self._entryPath(key)
+    atomicWrite(filepath, lambda f: pickle.dump(states, f, protocol=pickle.HIGHEST_PROTOCOL))
+    entry = dict(name=name, size=os.path.getsize(filepath), atime=time.time(), ctime=time.time(), 
+                 sources=stats)
+    self._updateIndex(entries={key:entry})
+    return states
+
+  def remove(self, key):
+    ''' remove an entry from the cache '''
+    entry = self.index.get(key,None)
+    self._updateIndex(removed=[key])
+    return entry
+
+  def evict(self, max_size=None):
+    ''' remove least recently used entries until the cache size is below max_size '''
+    return self._updateIndex(max_size=max_size)
+
+  def clear(self):
+    ''' remove all entries from the cache '''
+    self._updateIndex(max_size=-1)
+
+  def info(self):
+    ''' return a list of cache entries (most recently used first) '''
+    entries = [dict(key=key, **entry) for key,entry in self.index.items()]
+    entries.sort(key=lambda entry: entry['atime'], reverse=True)
+    return entries
+
+  def __str__(self):
+    string = '{:s}: {:d} entries, {:.1f} of {:.1f} MB\n'.format(self.folder, len(self),
+                                                              self.size/1024.**2, self.max_size/1024.**2)
+    for entry in self.info():
+      string += '  {:s} {:s} ({:.1f} MB, {:s})\n'.format(entry['key'][:10], entry['name'] or '', entry['size']/1024.**2,
+                                                      time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['atime'])))
+    return string
+
+
+# helper to interpret cache arguments in load functions
+def getCache(cache):
+  ''' return a cache instance based on a cache argument (True, folder or EnsembleCache) '''
+  if cache is None or cache is False: return None
+  elif cache is True: return EnsembleCache()
+  elif isinstance(cache,basestring): return EnsembleCache(folder=cache)
+  elif isinstance(cache,EnsembleCache): return cache
+  else: raise ArgumentError, cache
+
+
+## in-memory registry for ensemble members
+
+def _nbytes(dataset):
+  ''' memory used by the loaded data of a dataset (in bytes) '''
+  return sum(var.data_array.nbytes for var in dataset.variables.itervalues() if var.data_array is not None)
+
+class MemberRegistry(object):
+  ''' A per-session registry of loaded ensemble members: every member (experiment and load arguments)
+      is loaded only once and shared between all Ensembles that contain it; members are identified by
+      their experiment (names and Exp instances of the same experiment are equivalent) and experiment
+      definition; shared data arrays are set to read-only (lreadonly=True), so that they can not be 
+      modified accidentally: in-place operations on shared members raise a ValueError and members have to
+      be copied (e.g. with var.copy(deepcopy=True)) before they are modified in place. '''
+
+  def __init__(self, lreadonly=True):
+    self.lreadonly = lreadonly
+    self.members = dict() # key: dataset
+    self.references = dict() # key: number of requests
+    self._lock = threading.Lock()
+    self._locks = dict() # one lock per member, so that members are not loaded twice by different threads
+
+  def __contains__(self, key):
+    return key in self.members
+
+  def __len__(self):
+    return len(self.members)
+
+  def load(self, load_fct, name, **kwargs):
+    ''' return the datasets of a member from the registry or load them with load_fct(names=[name], **kwargs) 
+        (a list, usually with one dataset) '''
+    exps = dict(WRF_exps=kwargs.get('WRF_exps',None), CESM_exps=kwargs.get('CESM_exps',None))
+    exp = _resolveExp(name, **exps)
+    key = getCacheKey('member', names=getattr(exp,'name',exp), definition=_expDefinition(exp, **exps), **kwargs)
+    with self._lock: lock = self._locks.setdefault(key, threading.Lock())
+    with lock:
+      if key not in self.members:
+        ensemble = load_fct(names=[name], **kwargs)
+        datasets = list(ensemble) if isinstance(ensemble,(Ensemble,list,tuple)) else [ensemble]
+        if self.lreadonly:
+          for dataset in datasets:
+            for var in dataset.variables.itervalues():
+              if isinstance(var.data_array,np.ndarray): var.data_array.setflags(write=False)
+        self.members[key] = datasets; self.references[key] = 0
+      self.references[key] += 1
+    return self.members[key]
+
+  def clear(self):
+    ''' release all members '''
+    with self._lock:
+      self.members.clear(); self.references.clear(); self._locks.clear()
+
+  def report(self):
+    ''' memory accounting: loaded bytes and bytes saved by sharing members between Ensembles '''
+    members = []
+    for key,datasets in self.members.iteritems():
+      nbytes = sum(_nbytes(dataset) for dataset in datasets)
+      members.append(dict(name=', '.join(dataset.name for dataset in datasets), bytes=nbytes, 
+                          references=self.references[key],
+                          saved=nbytes*(self.references[key]-1)))
+    return dict(members=members, loads=len(members), requests=sum(self.references.itervalues()),
+                bytes=sum(member['bytes'] for member in members), saved=sum(member['saved'] for member in members))
+
+  def __str__(self):
+    report = self.report()
+    string = 'Member registry: {:d} members loaded for {:d} requests; {:.1f} MB loaded, {:.1f} MB saved\n'.format(
+              report['loads'], report['requests'], report['bytes']/1024.**2, report['saved']/1024.**2)
+    for member in report['members']:
+      string += '  {:s}: {:d}x, {:.1f} MB\n'.format(member['name'], member['references'], member['bytes']/1024.**2)
+    return string
+
+# default registry for the current session
+session_registry = None
+
+def getRegistry(registry):
+  ''' return a registry based on a registry argument (True for the session registry or MemberRegistry) '''
+  global session_registry
+  if registry is None or registry is False: return None
+  elif registry is True:
+    if session_registry is None: session_registry = MemberRegistry()
+    return session_registry
+  elif isinstance(registry,MemberRegistry): return registry
+  else: raise ArgumentError, registry
+
+
+## on-disk index of variables in filetypes
+
+class FiletypeIndex(object):
+  ''' An index of the variables that are contained in the filetypes of each experiment (based on dataset
+      headers); entries are keyed on filetype, experiment, domain and mode (shape or station type) and are 
+      validated against the size and modification time of the source files; the index is stored as a JSON 
+      file, which is written atomically under a file lock and merged with the index on disk, and it is used
+      to select the minimal set of filetypes for a list of variables. '''
+  index_file = 'filetype_index.json'
+  lock_file = 'filetype_index.lock'
+
+  def __init__(self, filepath=None):
+    ''' load index from disk (if it exists) '''
+    self.filepath = os.path.join(default_folder,self.index_file) if filepath is None else filepath
+    self.folder = os.path.dirname(os.path.abspath(self.filepath))
+    self.index = self._readIndex() # key: dict(variables=..., sources=...)
+
+  def _readIndex(self):
+    ''' read index from disk (or return empty index) '''
+    if os.path.exists(self.filepath):
+      with open(self.filepath,'r') as f:
+        try: index = json.load(f)
+        except ValueError: index = dict() # corrupted index: start over
+    else: index = dict()
+    return index
+
+  @staticmethod
+  def entryKey(filetype, experiment, domain=None, mode=None):
+    ''' key of an index entry (a string, since keys are stored in JSON) '''
+    return '/'.join(str(arg) for arg in (filetype, getattr(experiment,'name',experiment), domain, mode))
+
+  def __len__(self):
+    return len(self.index)
+
+  def lookup(self, filetype, experiment, domain=None, mode=None):
+    ''' return the variables of a filetype (None if it is not indexed or source files have changed) '''
+    entry = self.index.get(self.entryKey(filetype, experiment, domain=domain, mode=mode),None)
+    if entry is None or not _validStats(entry['sources']): return None
+    return entry['variables']
+
+  def add(self, filetype, experiment, variables, sources, domain=None, mode=None, lwrite=True):
+    ''' add or replace the variables of a filetype with the file stats of its source files (see fileStats) 
+        and write the index '''
+    key = self.entryKey(filetype, experiment, domain=domain, mode=mode)
+    self.index[key] = dict(variables=sorted(variables), sources=[list(stat) for stat in sources])
+    if lwrite: self.write(keys=[key])
+
+  def write(self, keys=None):
+    ''' merge entries (all or the listed keys) with the index on disk and write it (under the index lock) '''
+    if not os.path.exists(self.folder): os.makedirs(self.folder)
+    keys = self.index.keys() if keys is None else keys
+    with _lockFolder(self.folder, self.lock_file):
+      index = self._readIndex()
+      index.update({key:self.index[key] for key in keys})
+      atomicWrite(self.filepath, lambda f: json.dump(index, f), mode='w')
+      self.index = index
+
+  def prune(self, variables, filetypes, experiments, domain=None, mode=None, params=None):
+    ''' return the smallest subset of filetypes (in original order) that contains all variables in all 
+        experiments (the union of the minimal subsets of each experiment); parameters (e.g. shape or station 
+        meta data) are ignored; filetypes that are not indexed for an experiment are always kept and if a 
+        variable is not found in any indexed filetype of an experiment, the filetypes are not pruned '''
+    if not filetypes or not experiments: return filetypes
+    params = set() if params is None else set(params)
+    required = set(var for var in variables if var not in params)
+    selected = set()
+    for experiment in experiments:
+      contents = dict()
+      for filetype in filetypes:
+        varlist = self.lookup(filetype, experiment, domain=domain, mode=mode)
+        if varlist is not None: contents[filetype] = set(varlist)
+      known = [filetype for filetype in filetypes if filetype in contents]
+      selected.update(filetype for filetype in filetypes if filetype not in contents) # unknown
+      if not all(any(var in contents[filetype] for filetype in known) for var in required): return filetypes
+      for n in xrange(len(known)+1): # exact minimal cover (there are only a few filetypes)
+        subset = next((subset for subset in itertools.combinations(known, n) 
+                       if required.issubset(set().union(*[contents[filetype] for filetype in subset]))),None)
+        if subset is not None: break
+      if not subset and not selected: subset = known[:1] # need at least one file for meta data
+      selected.update(subset)
+    return [filetype for filetype in filetypes if filetype in selected]
+
+  def __str__(self):
+    string = 'Filetype index ({:s}):\n'.format(self.filepath)
+    for key,entry in sorted(self.index.iteritems()):
+      string += '  {:s}: {:s}\n'.format(key, ', '.join(entry['variables']))
+    return string
+
+def getFiletypeIndex(filetype_index):
+  ''' return a FiletypeIndex based on an argument (True for the default index, a file path or an instance) '''
+  if filetype_index is None or filetype_index is False: return None
+  elif filetype_index is True: return FiletypeIndex()
+  elif isinstance(filetype_index,basestring): return FiletypeIndex(filepath=filetype_index)
+  elif isinstance(filetype_index,FiletypeIndex): return filetype_index
+  else: raise ArgumentError, filetype_index
@@ -0,0 +1,125 @@
+'''
+Created on Oct 18, 2026
+
+Out-of-core reduction of long station time-series: members are opened lazily and read along the station
+axis in blocks that fit into a memory budget; every block is aggregated with the same seasonal and
+climatological methods as in loadEnsembleTS (see clim.aggregation) and only the reduced blocks are kept,
+so that the full time-series never have to be held in memory.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import numpy as np
+# internal imports
+from geodata.base import Dataset, Variable, Axis
+from geodata.misc import ArgumentError, EmptyDatasetError
+from clim.aggregation import applyAggregation
+from clim.profiling import null_record
+
+# some definitions
+memory_units = dict(B=1, KB=1024, MB=1024**2, GB=1024**3)
+overhead_factor = 6 # temporary float64 arrays per sample during aggregation (block copy, seasonal samples, etc.)
+
+
+## helper functions
+
+def parseMemory(memory):
+  ''' convert a memory budget in bytes or a string with units (e.g. '2GB') into bytes '''
+  if isinstance(memory,basestring):
+    memory = memory.strip().upper()
+    for unit in ('KB','MB','GB','B'):
+      if memory.endswith(unit): return int(float(memory[:-len(unit)])*memory_units[unit])
+    return int(float(memory))
+  elif isinstance(memory,(int,long,float,np.number)): return int(memory)
+  else: raise TypeError, memory
+
+def blockSize(dataset, memory_budget, stnaxis='station', taxis='time'):
+  ''' number of stations that can be read and aggregated at once (one variable at a time) '''
+  nstn = len(dataset.axes[stnaxis])
+  nbytes = [np.prod(var.shape)//nstn * np.dtype(np.float64).itemsize * overhead_factor # per station
+            for var in dataset.variables.itervalues() if var.hasAxis(stnaxis) and var.hasAxis(taxis)]
+  if len(nbytes) == 0: return nstn
+  return max(1, int(parseMemory(memory_budget)//max(nbytes)))
+
+def stationBlocks(indices, nstn, nblock):
+  ''' split selected station indices into blocks that each fall into a range of nblock stations; returns a
+      list of (range start, range end, indices relative to start) '''
+  blocks = []
+  for i0 in xrange(0, nstn, nblock):
+    i1 = min(i0+nblock, nstn)
+    idx = indices[(indices >= i0) & (indices < i1)]
+    if len(idx) > 0: blocks.append((i0, i1, idx-i0))
+  return blocks
+
+def _concatBlocks(variables, axis, newax):
+  ''' concatenate reduced blocks (Variables) along the station axis and replace it with the full axis '''
+  first = variables[0]
+  arrays = [var.data_array for var in variables]
+  if any(isinstance(array,np.ma.MaskedArray) for array in arrays): data = np.ma.concatenate(arrays, axis=axis)
+  else: data = np.concatenate(arrays, axis=axis)
+  axes = list(first.axes); axes[axis] = newax
+  return Variable(name=first.name, units=first.units, axes=axes, data=data, atts=first.atts.copy())
+
+
+## out-of-core reduction
+
+def reduceStations(dataset, aggregations, season=None, indices=None, memory_budget=None, stnaxis='station',
+                   taxis='time', profile=None):
+  ''' aggregate the time-dependent variables of a lazily opened Dataset in blocks along the station axis and
+      return a list of in-memory Datasets (one per aggregation); only the stations in indices are kept
+      (default: all); blocks are aggregated with the methods of loadEnsembleTS, so that results are the same
+      as those of the aggregated Dataset '''
+  if profile is None: profile = null_record
+  if not dataset.hasAxis(stnaxis): raise ArgumentError, "Dataset '{:s}' has no station axis.".format(dataset.name)
+  stnax = dataset.axes[stnaxis]; nstn = len(stnax)
+  indices = np.arange(nstn) if indices is None else np.asarray(indices)
+  if len(indices) == 0: raise EmptyDatasetError, "No stations selected in dataset '{:s}'.".format(dataset.name)
+  nblock = nstn if memory_budget is None else blockSize(dataset, memory_budget, stnaxis=stnaxis, taxis=taxis)
+  blocks = stationBlocks(indices, nstn, nblock)
+  newax = Axis(name=stnax.name, units=stnax.units, coord=stnax.coord[indices], atts=stnax.atts.copy())
+  datasets = [Dataset(name=dataset.name, title=dataset.title, atts=dataset.atts.copy()) for _ in aggregations]
+  for var in dataset.variables.values(): # N.B.: variables are read one at a time
+    if var.hasAxis(taxis) and var.hasAxis(stnaxis):
+      istn = var.axisIndex(stnaxis)
+      reduced = [[] for _ in aggregations] # reduced blocks for every aggregation
+      for i0,i1,idx in blocks:
+        with profile.phase('io'):
+          block = var(**{stnaxis:(stnax.coord[i0],stnax.coord[i1-1])}).load() # slice lazily and read block
+          data = block.data_array.take(idx, axis=istn)
+          axes = list(block.axes)
+          axes[istn] = Axis(name=stnax.name, units=stnax.units, coord=stnax.coord[i0+idx], atts=stnax.atts.copy())
+          block = Variable(name=var.name, units=var.units, axes=axes, data=data, atts=var.atts.copy())
+        profile.addIO(nbytes=data.nbytes, nfiles=0)
+        with profile.phase('aggregation'):
+          for blocklist,aggregation in zip(reduced,aggregations):
+            blocklist.append(applyAggregation(block, aggregation, season=season, taxis=taxis))
+        del block, data
+      for blocklist,ds in zip(reduced,datasets):
+        ds.addVariable(_concatBlocks(blocklist, blocklist[0].axisIndex(stnaxis), newax))
+    elif var.hasAxis(taxis):
+      raise ArgumentError, "Variable '{:s}' has a time axis, but no station axis.".format(var.name)
+    else: # meta data are small
+      axes = list(var.axes)
+      with profile.phase('io'): data = var.load().data_array
+      if var.hasAxis(stnaxis): 
+        data = data.take(indices, axis=var.axisIndex(stnaxis)); axes[var.axisIndex(stnaxis)] = newax
+      newvar = Variable(name=var.name, units=var.units, axes=axes, data=data, atts=var.atts.copy())
+      for ds in datasets: ds.addVariable(newvar.copy())
+  return datasets
+
+def stackMembers(ensemble, taxes=('time','year'), name=None, title=None):
+  ''' stack members along a new leading 'ensemble' axis, like loadEnsembleTS with lensembleAxis: variables
+      with a time or year axis are stacked and time-independent meta data of the first member are copied '''
+  first = ensemble[0]
+  enax = Axis(name='ensemble', units='#', coord=np.arange(1,len(ensemble)+1),
+              atts=dict(members=', '.join(ds.name for ds in ensemble)))
+  dataset = Dataset(name=name or first.name, title=title or first.title, atts=first.atts.copy())
+  for var in first.variables.itervalues():
+    if any(var.hasAxis(tax) for tax in taxes):
+      if not all(var.name in ds for ds in ensemble): continue
+      data = np.stack([ds[var.name].load().data_array for ds in ensemble])
+      dataset.addVariable(Variable(name=var.name, units=var.units, axes=(enax,)+tuple(var.axes), data=data,
+                                   atts=var.atts.copy()))
+    else: dataset.addVariable(var.copy())
+  return dataset
@@ -0,0 +1,106 @@
+'''
+Created on Oct 18, 2026
+
+Incremental refresh of growing time-series: the monthly time-series of a dataset are stored along with the
+covered period and the source files, so that only new simulation years have to be read and appended; the
+stored time-series are aggregated with the same methods as in loadEnsembleTS (see clim.aggregation), so
+that results are the same as for a full reload.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import numpy as np
+# internal imports
+from geodata.base import Dataset, Variable, Axis
+from geodata.misc import DatasetError
+from clim.aggregation import applyAggregation
+
+
+## stored time-series of a dataset
+
+class SeriesState(object):
+  ''' The monthly time-series of all time-dependent variables of a dataset (complete years only), along with
+      the covered period and the source files; new years are appended and aggregations (for any season) are
+      computed from the stored time-series. '''
+
+  def __init__(self, name, taxis='time'):
+    self.name = name
+    self.taxis = taxis
+    self.data = dict() # data arrays by variable name
+    self.units = None # units of the time axis
+    self.coord = None # time coordinates of the stored time-series
+    self.sources = [] # file stats of source files (see clim.cache.fileStats)
+
+  @property
+  def end(self):
+    ''' last time coordinate that was stored '''
+    return None if self.coord is None else self.coord[-1]
+
+  @property
+  def nyears(self):
+    return 0 if self.coord is None else len(self.coord)//12
+
+  def isCompatible(self, dataset):
+    ''' check if the time axis of a (lazily opened) dataset starts with the covered period '''
+    if self.end is None: return True
+    tax = dataset.axes[self.taxis]
+    if tax.units != self.units or len(tax) == 0: return False
+    return tax.coord[0] == self.coord[0] and self.end in tax.coord # same start, so nothing is missing
+
+  def newPeriod(self, dataset):
+    ''' return the coordinate range of the complete years after the covered period (None if there are no
+        new complete years) '''
+    coord = dataset.axes[self.taxis].coord
+    i0 = 0 if self.end is None else np.searchsorted(coord, self.end, side='right')
+    nyears = (len(coord) - i0)//12
+    if nyears == 0: return None
+    return (coord[i0], coord[i0+nyears*12-1])
+
+  def update(self, dataset):
+    ''' append the time-series of a (loaded) dataset with the new complete years '''
+    tax = dataset.axes[self.taxis]
+    nyears = len(tax)//12
+    if nyears == 0 or len(tax) != nyears*12: raise DatasetError, "Update has to contain complete years."
+    variables = [var for var in dataset.variables.itervalues() if var.hasAxis(self.taxis)]
+    if self.end is None: self.units = tax.units
+    elif set(var.name for var in variables) != set(self.data.keys()):
+      raise DatasetError, "Variables of dataset '{:s}' have changed.".format(self.name)
+    for var in variables:
+      data = var.data_array
+      if var.name in self.data:
+        concatenate = np.ma.concatenate if isinstance(data,np.ma.MaskedArray) else np.concatenate
+        data = concatenate([self.data[var.name], data], axis=var.axisIndex(self.taxis))
+      self.data[var.name] = data
+    coord = np.asarray(tax.coord)
+    self.coord = coord if self.coord is None else np.concatenate([self.coord, coord])
+    return self
+
+  def dataset(self, dataset):
+    ''' create an in-memory Dataset with the stored time-series, using the axes and meta data of dataset '''
+    if self.end is None: raise DatasetError, "No data have been stored for '{:s}'.".format(self.name)
+    newds = Dataset(name=dataset.name, title=dataset.title, atts=dataset.atts.copy())
+    tax = None
+    for var in dataset.variables.itervalues():
+      if var.hasAxis(self.taxis):
+        if var.name not in self.data: continue
+        if tax is None:
+          oldax = var.getAxis(self.taxis)
+          tax = Axis(name=oldax.name, units=self.units, coord=self.coord, atts=oldax.atts.copy())
+        axes = list(var.axes); axes[var.axisIndex(self.taxis)] = tax
+        newds.addVariable(Variable(name=var.name, units=var.units, axes=axes, data=self.data[var.name],
+                                   atts=var.atts.copy()))
+      else: newds.addVariable(var.copy())
+    return newds
+
+  def aggregate(self, dataset, aggregations, seasons=None):
+    ''' aggregate the stored time-series for every season and aggregation (nested list of Datasets), using
+        the axes and meta data of dataset '''
+    seasons = [None] if seasons is None else seasons
+    series = self.dataset(dataset)
+    return [[applyAggregation(series, aggregation, season=season, taxis=self.taxis) for aggregation in aggregations]
+            for season in seasons]
+
+  def __str__(self):
+    period = '' if self.end is None else ' {:d} years'.format(self.nyears)
+    return "{:s}{:s}: {:d} variables".format(self.name, period, len(self.data))
@@ -0,0 +1,60 @@
+'''
+Created on Oct 18, 2026
+
+Lazy Ensemble members: the variables of a NetCDF-backed Dataset are only read from disk the first time they
+are retrieved, so that memory use and latency scale with the variables that are actually used (e.g. in a
+plot), rather than with the full variable list of an observational climatology.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import threading
+from collections import OrderedDict
+# internal imports
+from geodata.base import Dataset, Ensemble
+
+
+## lazy variables
+
+class LazyVariables(OrderedDict):
+  ''' An OrderedDict of (NetCDF-backed) variables that loads a variable the first time it is retrieved (the 
+      order of variables is preserved); iterating over values or items loads all variables. '''
+
+  def __init__(self, variables):
+    OrderedDict.__init__(self, variables)
+    self.loaded = set() # names of variables that have been loaded
+    self._lock = threading.Lock()
+
+  def _load(self, varname, var):
+    ''' load variable (only once) '''
+    if varname not in self.loaded:
+      with self._lock:
+        if varname not in self.loaded:
+          var.load(); self.loaded.add(varname)
+    return var
+
+  def __getitem__(self, varname):
+    # N.B.: values, items, itervalues and iteritems of OrderedDict also retrieve variables with __getitem__
+    return self._load(varname, OrderedDict.__getitem__(self, varname))
+
+  def get(self, varname, default=None):
+    return self[varname] if varname in self else default
+
+  def __reduce__(self):
+    ''' load all variables for pickling (the lock can not be pickled) '''
+    return self.__class__, (self.items(),), dict(loaded=set(self.iterkeys()))
+
+
+def lazyDataset(dataset):
+  ''' make variables of a Dataset load on first access (in-place); returns the dataset '''
+  if not isinstance(dataset,Dataset): raise TypeError, dataset
+  if not isinstance(dataset.variables,LazyVariables):
+    dataset.__dict__['variables'] = LazyVariables(dataset.variables)
+  return dataset
+
+def loadedVariables(ensemble):
+  ''' names of the variables that have been loaded in a (lazy) Dataset or Ensemble '''
+  if isinstance(ensemble,Ensemble): return [loadedVariables(dataset) for dataset in ensemble]
+  variables = ensemble.variables
+  return sorted(variables.loaded) if isinstance(variables,LazyVariables) else sorted(variables.iterkeys())
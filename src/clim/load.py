@@ -1,306 +1,978 @@
-'''
-Created on Feb 2, 2015
-
-Utility functions related to loading basin-averaged data to support hydrological analysis.
-
-@author: Andre R. Erler, GPL v3
-'''
-
-# internal imports
-from geodata.base import Ensemble, Dataset
-from utils.misc import defaultNamedtuple
-from datasets.common import loadEnsembleTS, BatchLoad, loadDataset, shp_params, stn_params
-from geodata.misc import ArgumentError, EmptyDatasetError
-from datasets.WSC import GageStationError, loadGageStation
-
-# some definitions
-VL = defaultNamedtuple('VarList', ('vars','files','label'))   
-EX = defaultNamedtuple('Experiments', ('name','exps','styles','master','title','reference','target'),
-                       defaults=dict(styles=['-','-.','--'], ))  
-
-# wet-day thresholds
-wetday_thresholds = [0.2,1,10,20]
-wetday_extensions = ['_{:03.0f}'.format(threshold*10) for threshold in wetday_thresholds]
-
-# dataset variables
-CRU_vars = ('T2','Tmin','Tmax','dTd','Q2','pet','precip','cldfrc','wetfrq','frzfrq')
-WSC_vars = ('runoff','sfroff','ugroff')
-
-
-# internal method for do slicing for Ensembles and Obs
-def _configSlices(slices=None, basins=None, provs=None, shapes=None, period=None):
-  ''' configure slicing based on basin/province/shape and period arguments '''
-  if slices is None: slices = dict()
-  if shapes is not None:
-    if not ( basins is None and provs  is None ): raise ArgumentError
-    slices['shape_name'] = shapes
-  if basins is not None: 
-    if not ( shapes is None and provs  is None ): raise ArgumentError
-    slices['shape_name'] = basins  
-  if provs  is not None: 
-    if not ( basins is None and shapes is None ): raise ArgumentError
-    slices['shape_name'] = provs
-  if period is not None:
-    if slices is None: slices = dict()
-    slices['years'] = period
-  return slices
-
-def _resolveVarlist(varlist=None, filetypes=None, params=None, variable_list=None):
-  # resolve variable list and filetype (no need to maintain order)
-  if isinstance(varlist,basestring): varlist = [varlist]
-  variables = set(params) # set required parameters
-  filetypes = set() if filetypes is None else set(filetypes)
-  for name in varlist: 
-    if name in variable_list: 
-      variables.update(variable_list[name].vars)
-      filetypes.update(variable_list[name].files)
-    else: variables.add(name) 
-  # return variables and filetypes as list
-  return list(variables), list(filetypes)
-
-# define new load fct. for observations
-@BatchLoad
-def loadShapeObservations(obs=None, seasons=None, basins=None, provs=None, shapes=None, varlist=None, slices=None,
-                          aggregation='mean', shapetype=None, period=None, variable_list=None, **kwargs):
-  ''' convenience function to load shape observations; the main function is to select sensible defaults 
-      based on 'varlist', if no 'obs' are specified '''
-  # prepare arguments
-  if shapetype is None: shapetype = 'shpavg' # really only one in use  
-  # resolve variable list (no need to maintain order)
-  if isinstance(varlist,basestring): varlist = [varlist]
-  variables = set(shp_params)
-  for name in varlist: 
-    if name in variable_list: variables.update(variable_list[name].vars)
-    else: variables.add(name)
-  variables = list(variables)
-  # figure out default datasets
-  if obs is None: obs = 'Observations'
-  lUnity = lCRU = lWSC = False
-  if obs[:3].lower() in ('obs','wsc'):    
-    if any(var in CRU_vars for var in variables): 
-      if aggregation == 'mean' and seasons is None: 
-        lUnity = True; obs = []
-    if basins and any([var in WSC_vars for var in variables]):
-      if aggregation.lower() in ('mean','std','sem','min','max') and seasons is None: 
-        lWSC = True; obs = []
-  if not isinstance(obs,(list,tuple)): obs = (obs,)
-  # configure slicing (extract basin/province/shape and period)
-  slices = _configSlices(slices=slices, basins=basins, provs=provs, shapes=shapes, period=period)
-  if slices is not None:
-    noyears = slices.copy(); noyears.pop('years',None) # slices for climatologies
-  # prepare and load ensemble of observations
-  obsens = Ensemble(name='obs',title='Observations', basetype=Dataset)
-  if len(obs) > 0: # regular operations with user-defined dataset
-    try:
-      ensemble = loadEnsembleTS(names=obs, season=seasons, aggregation=aggregation, slices=slices, 
-                                varlist=variables, shape=shapetype, ldataset=False, **kwargs)
-      for ens in ensemble: obsens += ens
-    except EmptyDatasetError: pass 
-  if lUnity: # load Unity data instead of averaging CRU data
-    if period is None: period = (1979,1994)
-    dataset = loadDataset(name='Unity', varlist=variables, mode='climatology', period=period, shape=shapetype)
-    if slices is not None: dataset = dataset(**noyears) # slice immediately
-    obsens += dataset.load() 
-  if lCRU: # this is basically regular operations with CRU as default
-    obsens += loadEnsembleTS(names='CRU', season=seasons, aggregation=aggregation, slices=slices, 
-                             varlist=variables, shape=shapetype, ldataset=True, **kwargs)    
-  if lWSC: # another special case: river hydrographs
-#     from datasets.WSC import loadGageStation, GageStationError
-    try:
-      dataset = loadGageStation(basin=basins, varlist=['runoff'], aggregation=aggregation, mode='climatology', filetype='monthly')
-      if slices is not None: dataset = dataset(**noyears) # slice immediately
-      obsens += dataset.load()
-    except GageStationError: 
-      pass # just ignore, if gage station if data is missing 
-  # return ensembles (will be wrapped in a list, if BatchLoad is used)
-  return obsens
-
-
-# define new load fct. for experiments (not intended for observations)
-@BatchLoad
-def loadShapeEnsemble(seasons=None, basins=None, provs=None, shapes=None, varlist=None, aggregation='mean', 
-                      slices=None, shapetype=None, filetypes=None, period=None, variable_list=None, 
-                      WRF_exps=None, CESM_exps=None, WRF_ens=None, CESM_ens=None, **kwargs):
-  ''' convenience function to load shape ensembles (in Ensemble container); kwargs are passed to loadEnsembleTS '''
-  # prepare arguments
-  if shapetype is None: shapetype = 'shpavg' # really only one in use  
-  variables, filetypes =  _resolveVarlist(varlist=varlist, filetypes=filetypes, 
-                                          params=shp_params, variable_list=variable_list)
-  # configure slicing (extract basin/province/shape and period)
-  slices = _configSlices(slices=slices, basins=basins, provs=provs, shapes=shapes, period=period)
-  # load ensemble (no iteration here)
-  shpens = loadEnsembleTS(season=seasons, slices=slices, varlist=variables, shape=shapetype, 
-                          aggregation=aggregation, filetypes=filetypes, WRF_exps=WRF_exps, CESM_exps=CESM_exps, 
-                          WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs)
-  # return ensembles (will be wrapped in a list, if BatchLoad is used)
-  return shpens
-
-
-# define new load fct. (batch args: load_list=['season','prov',], lproduct='outer')
-def loadStationEnsemble(seasons=None, provs=None, clusters=None, varlist=None, aggregation='mean', constraints=None, 
-                        filetypes=None, cluster_name=None, stationtype=None, load_list=None, lproduct='outer',
-                        WRF_exps=None, CESM_exps=None, WRF_ens=None, CESM_ens=None, 
-                        variable_list=None, default_constraints=None, **kwargs):
-  ''' convenience function to load station data for ensembles (in Ensemble container); kwargs are passed to loadEnsembleTS '''
-  load_list = [] if load_list is None else load_list[:] # use a copy, since the list may be modified
-  
-  # figure out varlist  
-  if isinstance(varlist,basestring) and not stationtype:
-      if varlist.lower().find('prec') >= 0: 
-        stationtype = 'ecprecip'
-      elif varlist.lower().find('temp') >= 0: 
-        stationtype = 'ectemp'
-      else: raise ArgumentError, varlist
-  if not isinstance(stationtype,basestring): raise ArgumentError, stationtype # not inferred
-  if clusters and not cluster_name: raise ArgumentError
-  params = stn_params  + [cluster_name] if cluster_name else stn_params # need to load cluster_name!
-  variables, filetypes =  _resolveVarlist(varlist=varlist, filetypes=filetypes, 
-                                          params=params, variable_list=variable_list)
-  # prepare arguments
-  if provs or clusters:
-    if constraints is None: constraints = default_constraints.copy()
-    constraint_list = []
-    if 'provs' in load_list and 'clusters' in load_list: 
-      raise ArgumentError, "Cannot expand 'provs' and 'clusters' at the same time."
-    # figure out proper handling of provinces
-    if provs:
-      if 'prov' not in load_list: 
-        constraints['prov'] = provs; provs = None
-      else:  
-        if len(constraint_list) > 0: raise ArgumentError, "Cannot expand multiple keyword-constraints at once."
-        for prov in provs:
-          tmp = constraints.copy()
-          tmp['prov'] = prov
-          constraint_list.append(tmp)
-        load_list[load_list.index('prov')] = 'constraints'
-        constraints = constraint_list; provs = None
-    # and analogously, handling of clusters!
-    if clusters:
-      if 'cluster' not in load_list: 
-        constraints['cluster'] = clusters; clusters = None
-      else:  
-        if len(constraint_list) > 0: raise ArgumentError, "Cannot expand multiple keyword-constraints at once."
-        for cluster in clusters:
-          tmp = constraints.copy()
-          tmp['cluster'] = cluster
-          if cluster_name: tmp['cluster_name'] = cluster_name # will be expanded next to cluster index
-          constraint_list.append(tmp)
-        load_list[load_list.index('cluster')] = 'constraints'
-        constraints = constraint_list; clusters = None  
-  # load ensemble (no iteration here)
-  stnens = loadEnsembleTS(season=seasons, prov=provs, station=stationtype, varlist=variables, 
-                          aggregation=aggregation, constraints=constraints, filetypes=filetypes, 
-                          WRF_exps=WRF_exps, CESM_exps=CESM_exps, WRF_ens=WRF_ens, CESM_ens=CESM_ens, 
-                          load_list=load_list, lproduct=lproduct, lcheckVar=False, **kwargs)
-  # return ensembles (will be wrapped in a list, if BatchLoad is used)
-  return stnens
-
-
-## abuse main section for testing
-if __name__ == '__main__':
-  
-  from projects.WesternCanada.WRF_experiments import WRF_exps, ensembles
-  from projects.WesternCanada.analysis_settings import exps_rc, variables_rc, loadShapeObservations  
-#   from projects.GreatLakes.WRF_experiments import WRF_exps, ensembles
-#   from projects.GreatLakes.analysis_settings import exps_rc, variables_rc, loadShapeObservations
-  # N.B.: importing Exp through WRF_experiments is necessary, otherwise some isinstance() calls fail
-
-#  test = 'obs_timeseries'
-#   test = 'basin_timeseries'
-  test = 'station_timeseries'
-#   test = 'province_climatology'
-  
-  
-  # test load function for basin ensemble time-series
-  if test == 'obs_timeseries':
-    
-    # some settings for tests
-    basins = ['GLB'] #; period = (1979,1994)
-    varlist = ['precip',]; aggregation = 'mean'
-
-    shpens = loadShapeObservations(obs='GPCC', basins=basins, varlist=varlist,
-                                   aggregation=aggregation, load_list=['basins','varlist'],)
-#                                    variable_list=variables_rc)
-    # print diagnostics
-    print shpens[0]; print ''
-    assert len(shpens) == len(basins) # len(seasons)
-    print shpens[0][0]
-    for i,basin in enumerate(basins): 
-      #for ds in shpens[i]: print ds.atts.shape_name
-      assert all(ds.atts.shape_name == basin for ds in shpens[i])
-  
-  
-  # test load function for basin ensemble time-series
-  elif test == 'basin_timeseries':
-    
-    # some settings for tests
-    exp = 'g-ens'; exps = exps_rc[exp].exps; #exps = ['Unity']
-    basins = ['GLB']; seasons = ['summer','winter']
-    varlist = ['precip']; aggregation = 'mean'; red = dict(s='mean')
-
-    shpens = loadShapeEnsemble(names=exps, basins=basins, seasons=seasons, varlist=varlist, 
-                               aggregation=aggregation, filetypes=None, reduction=red, 
-                               load_list=['basins','seasons',], lproduct='outer', domain=2,
-                               WRF_exps=WRF_exps, CESM_exps=None, WRF_ens=ensembles, CESM_ens=None,
-                               variable_list=variables_rc)
-    # print diagnostics
-    print shpens[0]; print ''
-    assert len(shpens) == len(basins)*len(seasons)
-    print shpens[0][0]
-    for i,basin in enumerate(basins):
-      i0 = i*len(seasons); ie = len(seasons)*(i+1)
-      assert all(all(ds.atts.shape_name == basin for ds in ens) for ens in shpens[i0:ie])
-      
-
-  # test load function for station ensemble
-  elif test == 'station_timeseries':
-      
-    # station selection criteria
-    constraints_rc = dict()
-    constraints_rc['min_len'] = 15 # for valid climatology
-    constraints_rc['lat'] = (45,55) 
-    constraints_rc['max_zerr'] = 100 # reduce sample size
-    constraints_rc['prov'] = ('ON')
-    constraints_rc['end_after'] = 1980
-  
-    # some settings for tests
-    provs = None; clusters = None; lensembleAxis = False; sample_axis = None; lflatten = False
-    exp = 'val'; exps = ['EC', 'erai-max', 'max-ctrl']; provs = ('BC','AB')
-#     exp = 'max-all'; exps = exps_rc[exp]; provs = ('BC','AB')
-#     exps = ['g-ctrl', 'g-ctrl-2050', 'g-ctrl-2100']; provs = ['ON']
-    seasons = ['summer']; lfit = True; lrescale = True; lbootstrap = False
-    lflatten = False; lensembleAxis = True
-    varlist = ['MaxPrecip_1d', 'MaxPrecip_5d','MaxPreccu_1d'][:1]; filetypes = ['hydro']
-    stnens = loadStationEnsemble(names=exps, provs=provs, clusters=clusters, varlist=varlist,  
-                                 seasons=seasons, master=None, stationtype='ecprecip',
-                                 domain=2, lensembleAxis=lensembleAxis, filetypes=filetypes,                                 
-                                 variable_list=variables_rc, default_constraints=constraints_rc,
-                                 WRF_exps=WRF_exps, CESM_exps=None, WRF_ens=ensembles, CESM_ens=None,
-                                 load_list=['season','provs'], lproduct='outer',)
-    # print diagnostics
-    print stnens[0][0]; print ''
-    assert len(stnens) == len(seasons)
-    print stnens[0][0]
-    print stnens[0][1].MaxPrecip_1d.mean()
-
-      
-  # test load function for province ensemble climatology
-  if test == 'province_climatology':
-    
-    # some settings for tests
-    exp = 'g-ens'; exps = exps_rc[exp].exps
-    basins = ['GLB','GRW'] 
-    varlists = ['precip','T2']; aggregation = 'mean'
-
-    shpens = loadShapeEnsemble(names=exps, basins=basins, varlist=varlists, aggregation=aggregation,
-                               period=(1979,1994), # this does not work properly with just a number...
-                               load_list=['basins','varlist'], lproduct='outer', filetypes=['srfc'],
-                               WRF_exps=WRF_exps, CESM_exps=None, WRF_ens=ensembles, CESM_ens=None,
-                               variable_list=variables_rc)
-    # print diagnostics
-    print shpens[0]; print ''
-    assert len(shpens) == len(basins)*len(varlists)
-    assert shpens[0][1].time.coord[0] == 1
-    for i,basin in enumerate(basins):
-      i0 = i*len(varlists); ie = len(varlists)*(i+1)
+'''
+Created on Feb 2, 2015
+
+Utility functions related to loading basin-averaged data to support hydrological analysis.
+
+@author: Andre R. Erler, GPL v3
+'''
+
+# external imports
+import itertools, functools
+import numpy as np
+from warnings import warn
+# internal imports
+from geodata.base import Ensemble, Dataset
+from utils.misc import defaultNamedtuple
+from datasets.common import loadEnsembleTS, BatchLoad, loadDataset, shp_params, stn_params, expandArgumentList
+from geodata.misc import ArgumentError, EmptyDatasetError, DatasetError
+from datasets.WSC import GageStationError, loadGageStation
+from clim.cache import getCache, getCacheKey, sourceFiles, fileStats, normalizeArgument, getRegistry, getFiletypeIndex, \
+                       ensembleDigest
+from clim.batch import ParallelBatchLoad, executeBatch, LoadPlan, PlanEntry
+from clim.stations import StationIndex
+from clim.store import openStore, storeFolder
+from clim.profiling import getProfile, cellLabel, null_record
+from clim.lazy import lazyDataset
+from clim.chunked import reduceStations, stackMembers
+from clim.aggregation import applyAggregation
+from clim.incremental import SeriesState
+
+# some definitions
+VL = defaultNamedtuple('VarList', ('vars','files','label'))   
+EX = defaultNamedtuple('Experiments', ('name','exps','styles','master','title','reference','target'),
+                       defaults=dict(styles=['-','-.','--'], ))  
+
+# wet-day thresholds
+wetday_thresholds = [0.2,1,10,20]
+wetday_extensions = ['_{:03.0f}'.format(threshold*10) for threshold in wetday_thresholds]
+
+# dataset variables
+CRU_vars = ('T2','Tmin','Tmax','dTd','Q2','pet','precip','cldfrc','wetfrq','frzfrq')
+WSC_vars = ('runoff','sfroff','ugroff')
+
+
+# internal method for do slicing for Ensembles and Obs
+def _configSlices(slices=None, basins=None, provs=None, shapes=None, period=None):
+  ''' configure slicing based on basin/province/shape and period arguments '''
+  if slices is None: slices = dict()
+  if shapes is not None:
+    if not ( basins is None and provs  is None ): raise ArgumentError
+    slices['shape_name'] = shapes
+  if basins is not None: 
+    if not ( shapes is None and provs  is None ): raise ArgumentError
+    slices['shape_name'] = basins  
+  if provs  is not None: 
+    if not ( basins is None and shapes is None ): raise ArgumentError
+    slices['shape_name'] = provs
+  if period is not None:
+    if slices is None: slices = dict()
+    slices['years'] = period
+  return slices
+
+# internal method to add missing filetypes to the filetype index
+def _indexFiletypes(ftindex, filetypes, names=None, domain=None, shape=None, station=None, WRF_exps=None, 
+                    WRF_ens=None, lensembleAxis=False, **kwargs):
+  ''' open the headers of all WRF members to index the variables in filetypes that are not indexed yet or
+      whose source files have changed (only WRF datasets are split into filetypes); returns the members '''
+  if not filetypes or not WRF_exps or not names: return []
+  mode = shape or station
+  members = [name for name in _expandNames(names, WRF_ens=WRF_ens, lensembleAxis=lensembleAxis)
+             if getattr(name,'name',name) in WRF_exps]
+  keys = []
+  for member in members:
+    for filetype in filetypes:
+      if ftindex.lookup(filetype, member, domain=domain, mode=mode) is not None: continue
+      try: dataset = _openDataset(name=member, filetypes=[filetype], domain=domain, shape=shape, 
+                                  station=station, WRF_exps=WRF_exps, WRF_ens=WRF_ens, **kwargs)
+      except (DatasetError, IOError): continue # leave unindexed, i.e. don't prune
+      ftindex.add(filetype, member, dataset.variables.keys(), fileStats(sourceFiles([dataset])), 
+                  domain=domain, mode=mode, lwrite=False)
+      keys.append(ftindex.entryKey(filetype, member, domain=domain, mode=mode))
+  if keys: ftindex.write(keys=keys)
+  return members
+
+def _resolveVarlist(varlist=None, filetypes=None, params=None, variable_list=None, ftindex=None, scanargs=None):
+  # resolve variable list and filetype (no need to maintain order)
+  if isinstance(varlist,basestring): varlist = [varlist]
+  variables = set(params) # set required parameters
+  filetypes = set() if filetypes is None else set(filetypes)
+  for name in varlist: 
+    if name in variable_list: 
+      variables.update(variable_list[name].vars)
+      filetypes.update(variable_list[name].files)
+    else: variables.add(name) 
+  variables = list(variables); filetypes = sorted(filetypes)
+  # only keep filetypes that are necessary to cover all variables (in all WRF members)
+  if ftindex is not None and scanargs is not None: 
+    members = _indexFiletypes(ftindex, filetypes, **scanargs)
+    filetypes = ftindex.prune(variables, filetypes, members, domain=scanargs.get('domain',None), 
+                              mode=scanargs.get('shape',None) or scanargs.get('station',None), params=params)
+  # return variables and filetypes as list
+  return variables, filetypes
+
+# internal method to prepare arguments for shape ensembles
+def _prepareShapeArgs(basins=None, provs=None, shapes=None, varlist=None, slices=None, shapetype=None, 
+                      filetypes=None, period=None, variable_list=None, filetype_index=None, scanargs=None):
+  ''' resolve variables and filetypes and configure slicing for shape ensembles; if a FiletypeIndex is
+      given, filetypes are pruned to the minimal set that contains all variables '''
+  if shapetype is None: shapetype = 'shpavg' # really only one in use  
+  if scanargs is not None: scanargs = dict(scanargs, shape=shapetype)
+  variables, filetypes =  _resolveVarlist(varlist=varlist, filetypes=filetypes, params=shp_params, 
+                                          variable_list=variable_list, scanargs=scanargs,
+                                          ftindex=getFiletypeIndex(filetype_index))
+  # configure slicing (extract basin/province/shape and period)
+  slices = _configSlices(slices=slices, basins=basins, provs=provs, shapes=shapes, period=period)
+  return variables, filetypes, slices, shapetype
+
+# internal method to push slices down to the read layer
+def _pushdownSlices(dataset, slices):
+  ''' translate 'years' and (single) 'shape_name' slices into coordinate slices of the time and shape axes,
+      based on the header of a lazily opened dataset, so that only the required time indices and shapes are
+      read from disk; slices that do not apply (e.g. years for climatologies) are dropped '''
+  if not slices: return dict()
+  slices = slices.copy()
+  years = slices.pop('years',None)
+  if years is not None and dataset.hasAxis('time'):
+    taxis = dataset.axes['time']
+    units = taxis.units.lower() if taxis.units else ''
+    if units.startswith('month') and 'since' in units: # climatologies have no reference date
+      if isinstance(years,(int,np.integer)): years = (years,years+1)
+      year0 = int(units.split('since')[1].strip()[:4])
+      coord = taxis.coord
+      i0,i1 = np.searchsorted(coord, [(years[0]-year0)*12, (years[1]-year0)*12]) # end is exclusive
+      if i1 <= i0: raise EmptyDatasetError, "No data in period {} for dataset {:s}".format(years, dataset.name)
+      slices['time'] = (coord[i0], coord[i1-1])
+  shape = slices.get('shape_name',None)
+  if isinstance(shape,basestring) and 'shape_name' in dataset and dataset.hasAxis('shape'):
+    names = np.asarray(dataset['shape_name'].load().data_array) # small variable
+    idx = np.flatnonzero(names == shape)
+    if len(idx) == 1: 
+      del slices['shape_name']
+      slices['shape'] = dataset.axes['shape'].coord[idx[0]]
+  return slices
+
+# internal method to open a dataset lazily (only the header is read)
+def _openDataset(name=None, filetypes=None, domain=None, mode='time-series', **kwargs):
+  ''' open dataset with loadDataset (does not load data) '''
+  return loadDataset(name=name, filetypes=filetypes, domains=domain, mode=mode, **kwargs)
+
+# internal method to collect the source files of all members before they are read
+def _sourceStats(names=None, WRF_ens=None, CESM_ens=None, lensembleAxis=False, **kwargs):
+  ''' open the headers of all members and return the size and modification time of their source files 
+      (see clim.cache.fileStats); the stats are taken before data are read and aggregated, since aggregated
+      datasets do not know their source files '''
+  stats = set()
+  for dsname in _expandNames(names, WRF_ens=WRF_ens, CESM_ens=CESM_ens, lensembleAxis=lensembleAxis):
+    dataset = _openDataset(name=dsname, WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs)
+    stats.update(fileStats(sourceFiles([dataset])))
+  return sorted(stats)
+
+# internal method to expand ensemble names into member names
+def _ensembleMembers(name, WRF_ens=None, CESM_ens=None):
+  ''' return the members of an ensemble name (or None, if name is not an ensemble) '''
+  if isinstance(name,basestring) and WRF_ens and name in WRF_ens: return list(WRF_ens[name])
+  elif isinstance(name,basestring) and CESM_ens and name in CESM_ens: return list(CESM_ens[name])
+  else: return None
+
+def _expandNames(names, WRF_ens=None, CESM_ens=None, lensembleAxis=False):
+  ''' replace ensemble names with the names of their members, if members are loaded with an ensemble axis;
+      otherwise ensemble names refer to single datasets (e.g. 'max-ens' is also the ensemble mean) '''
+  if not isinstance(names,(list,tuple)): names = [names]
+  if not lensembleAxis: return list(names)
+  members = []
+  for name in names: members.extend(_ensembleMembers(name, WRF_ens=WRF_ens, CESM_ens=CESM_ens) or [name])
+  return members
+
+# internal method to check if all members can be read from memory-mapped stores
+def _hasStores(names=None, shape=None, slices=None, varlist=None, domain=None, store=None, 
+               WRF_ens=None, CESM_ens=None, **kwargs):
+  ''' check if the time-series of all members are available in a ShapeStore '''
+  folder = storeFolder(store)
+  if shape != 'shpavg' or folder is None or not names: return False
+  return all(openStore(name, domain=domain, folder=folder, varlist=varlist, slices=slices) is not None
+             for name in _expandNames(names, WRF_ens=WRF_ens, CESM_ens=CESM_ens))
+
+# internal method to read time-series with slices pushed down to the read layer
+def _readEnsemble(names=None, slices=None, name=None, title=None, ldataset=False, store=None, 
+                  WRF_ens=None, CESM_ens=None, profile=None, **kwargs):
+  ''' open datasets lazily, apply pushed-down slices and load only the selected data; shape averages are 
+      read from memory-mapped stores, if they are requested and exist (store can be True or a folder) '''
+  names = _expandNames(names, WRF_ens=WRF_ens, CESM_ens=CESM_ens)
+  if ldataset and len(names) > 1: raise ArgumentError, "Can only return a single Dataset." 
+  if profile is None: profile = null_record
+  ensemble = Ensemble(name=name, title=title, basetype=Dataset)
+  for dsname in names:
+    record = profile.child(getattr(dsname,'name',dsname))
+    shpstore = None
+    if kwargs.get('shape',None) == 'shpavg' and storeFolder(store) is not None:
+      shpstore = openStore(dsname, domain=kwargs.get('domain',None), folder=storeFolder(store), 
+                           varlist=kwargs.get('varlist',None), slices=slices)
+    if shpstore is not None: # only read selected slices from memory map
+      with record.phase('io'): dataset = shpstore.read(varlist=kwargs.get('varlist',None), **(slices or dict()))
+      record.addIO(dataset, nfiles=1); ensemble += dataset
+      continue
+    with record.phase('io'): dataset = _openDataset(name=dsname, WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs)
+    with record.phase('slicing'):
+      dsslices = _pushdownSlices(dataset, slices)
+      if dsslices: dataset = dataset(**dsslices) # slice lazily
+    if len(dataset) == 0: raise EmptyDatasetError, dataset
+    with record.phase('io'): dataset = dataset.load()
+    record.addIO(dataset); ensemble += dataset
+  _fillParams(ensemble)
+  return ensemble[0] if ldataset else ensemble
+
+# internal method to complete meta data
+def _fillParams(ensemble):
+  ''' make sure all datasets have shape/station meta data (copied from other datasets) '''
+  for varname in shp_params + stn_params:
+    var = None
+    for ds in ensemble:
+      if varname in ds: var = ds[varname]; break
+    if var is not None:
+      for ds in ensemble:
+        if varname not in ds: ds.addVariable(var.copy())
+  return ensemble
+
+# internal method to update the stored time-series of members with new years
+def _refreshEnsemble(states=None, names=None, slices=None, WRF_ens=None, CESM_ens=None, profile=None, **kwargs):
+  ''' open members lazily and update their stored time-series (see clim.incremental): members whose source
+      files have not changed are not read, otherwise only complete years after the covered period are read;
+      returns the updated states (by member), a list of lazily opened members with loaded meta data and the
+      file stats of all source files '''
+  if profile is None: profile = null_record
+  states = dict() if states is None else states
+  newstates = dict(); members = []; stats = set()
+  for dsname in _expandNames(names, WRF_ens=WRF_ens, CESM_ens=CESM_ens):
+    key = getattr(dsname,'name',dsname)
+    record = profile.child(key)
+    with record.phase('io'): dataset = _openDataset(name=dsname, WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs)
+    sources = fileStats(sourceFiles([dataset])) # before slicing (sliced datasets are not file-backed)
+    stats.update(sources)
+    with record.phase('slicing'):
+      dsslices = _pushdownSlices(dataset, slices)
+      if dsslices: dataset = dataset(**dsslices) # slice lazily
+    if len(dataset) == 0: raise EmptyDatasetError, dataset
+    state = states.get(key,None)
+    if state is None or not state.isCompatible(dataset): state = SeriesState(key) # start over
+    # read only complete years after the covered period (if source files have changed)
+    period = None if state.sources == sources else state.newPeriod(dataset)
+    if period is not None:
+      with record.phase('io'): newdata = dataset(time=period).load()
+      record.addIO(newdata)
+      state.update(newdata); del newdata
+    state.sources = sources
+    with record.phase('io'):
+      for var in dataset.variables.values(): 
+        if not var.hasAxis('time'): var.load() # meta data (small)
+    members.append((dataset,state)); newstates[key] = state
+  _fillParams([dataset for dataset,state in members])
+  return newstates, members, sorted(stats)
+
+# arguments that the pushdown read path can handle (otherwise loadEnsembleTS is used)
+pushdown_args = ('names','name','title','varlist','shape','filetypes','domain','slices','ldataset','store',
+                 'WRF_exps','CESM_exps','WRF_ens','CESM_ens')
+
+# internal method to time a load function that does not record its own profile
+def _timedLoad(load_fct, profile, **kwargs):
+  ''' call load function and record time (as I/O) and loaded bytes and files '''
+  with profile.phase('io'): result = load_fct(**kwargs)
+  profile.addIO(result)
+  return result
+
+# internal method to load ensembles with shared members
+def _loadEnsembleTS(registry=None, lpushdown=False, profile=None, names=None, name=None, title=None, **kwargs):
+  ''' load an Ensemble with loadEnsembleTS; if a MemberRegistry is given, every member is loaded separately
+      (only once per session) and shared with other Ensembles that contain it (station selection with master
+      and lall is applied to the Ensemble; with lensembleAxis, members are registered separately and stacked
+      afterwards); if lpushdown is True and raw time-series are requested (no season or aggregation), slices 
+      are pushed down to the read layer; if a profile record is given, time spent loading is recorded '''
+  if lpushdown and kwargs.get('season',None) is None and kwargs.get('aggregation',None) is None:
+    lpushdown = all(key in pushdown_args+('season','aggregation') for key in kwargs)
+  else: lpushdown = False
+  if lpushdown: 
+    kwargs.pop('season',None); kwargs.pop('aggregation',None)
+  load_fct = _readEnsemble if lpushdown else loadEnsembleTS
+  if profile: # N.B.: pushdown reads record every dataset separately
+    if lpushdown: load_fct = functools.partial(_readEnsemble, profile=profile)
+    else: load_fct = functools.partial(_timedLoad, loadEnsembleTS, profile)
+  if registry is None: return load_fct(names=names, name=name, title=title, **kwargs)
+  if not isinstance(names,(list,tuple)): names = [names]
+  memberargs = {key:value for key,value in kwargs.iteritems() if key not in ('master','lall','lensembleAxis')}
+  members = []
+  for entry in names:
+    ensmembers = _ensembleMembers(entry, WRF_ens=kwargs.get('WRF_ens',None), CESM_ens=kwargs.get('CESM_ens',None))
+    if kwargs.get('lensembleAxis',False) and ensmembers: # register members before they are stacked
+      datasets = [dataset for member in ensmembers for dataset in registry.load(load_fct, member, **memberargs)]
+      members.append(stackMembers(datasets, name=getattr(entry,'name',entry)))
+    else: members.extend(registry.load(load_fct, entry, **memberargs))
+  return Ensemble(*members, name=name, title=title, basetype=Dataset)
+
+# internal method to aggregate time-series for several seasons and aggregations at once
+def _aggregateEnsemble(ensemble, aggregations, seasons=None):
+  ''' aggregate an Ensemble of time-series that was loaded once for every season and aggregation; the 
+      seasonal/climatological methods of loadEnsembleTS are used (seasonal<Aggregation>/clim<Aggregation>),
+      so that season definitions and degrees of freedom are the same; returns a nested list with one 
+      Ensemble per season and aggregation '''
+  seasons = [None] if seasons is None else seasons
+  enslists = []
+  for season in seasons:
+    enslist = []
+    for aggregation in aggregations:
+      ens = Ensemble(name=ensemble.ens_name, title=ensemble.ens_title, basetype=Dataset)
+      for dataset in ensemble: ens += applyAggregation(dataset, aggregation, season=season, taxis='time')
+      enslist.append(ens)
+    enslists.append(enslist)
+  return enslists
+
+# internal method to check if time-series can be loaded once for several seasons and aggregations
+def _singleRead(**kwargs):
+  ''' check that all load arguments can be applied before seasonal aggregation (e.g. not reduction) '''
+  return all(key in pushdown_args for key in kwargs)
+
+# internal method to expand an outer product where one argument is handled by the load function itself
+def _fanoutArgument(batch_fct, argname, load_list=None, **kwargs):
+  ''' expand the outer product of load_list like BatchLoad, but pass the full list of values of argname
+      (e.g. seasons) to each cell, so that time-series are only loaded once; the load function has to 
+      return a list of results for the values of argname; the original output order is restored '''
+  values = kwargs[argname]
+  iarg = load_list.index(argname)
+  reduced_list = [arg for arg in load_list if arg != argname]
+  if reduced_list: cells = batch_fct(load_list=reduced_list, lproduct='outer', **kwargs)
+  else: cells = [batch_fct(**kwargs)]
+  # reorder results to the outer product order of the original load_list
+  shape = [len(kwargs[arg]) if isinstance(kwargs.get(arg),(list,tuple)) else 1 for arg in reduced_list]
+  shape.insert(iarg, len(values))
+  results = []
+  for idx in itertools.product(*[xrange(n) for n in shape]):
+    icell = 0
+    for i,n in zip(idx[:iarg]+idx[iarg+1:], shape[:iarg]+shape[iarg+1:]): icell = icell*n + i
+    results.append(cells[icell][idx[iarg]])
+  return results
+
+# run an independent read (used with executeBatch)
+def _runTask(task=None):
+  ''' call a function without arguments '''
+  return task()
+
+# define new load fct. for observations
+@BatchLoad
+def _loadShapeObservations(obs=None, seasons=None, basins=None, provs=None, shapes=None, varlist=None, slices=None,
+                           aggregation='mean', shapetype=None, period=None, variable_list=None, lconcurrent=True, 
+                           llazy=False, profile=None, **kwargs):
+  ''' load shape observations for a single cell (see loadShapeObservations) '''
+  with getProfile(profile).child('cell', cellLabel(obs=obs, seasons=seasons, basins=basins, provs=provs, 
+                                                     shapes=shapes, varlist=varlist, aggregation=aggregation, 
+                                                     period=period)) as cell:
+    # prepare arguments
+    if shapetype is None: shapetype = 'shpavg' # really only one in use  
+    lmulti = isinstance(aggregation,(list,tuple))
+    aggregations = list(aggregation) if lmulti else [aggregation]
+    # resolve variable list (no need to maintain order)
+    if isinstance(varlist,basestring): varlist = [varlist]
+    variables = set(shp_params)
+    for name in varlist: 
+      if name in variable_list: variables.update(variable_list[name].vars)
+      else: variables.add(name)
+    variables = list(variables)
+    # figure out default datasets (depends on aggregation)
+    if obs is None: obs = 'Observations'
+    lCRU = False; lUnity = []; lWSC = []; obslists = []
+    for agg in aggregations:
+      obsagg = obs; lU = lW = False
+      if obs[:3].lower() in ('obs','wsc'):    
+        if any(var in CRU_vars for var in variables): 
+          if agg == 'mean' and seasons is None: 
+            lU = True; obsagg = []
+        if basins and any([var in WSC_vars for var in variables]):
+          if agg.lower() in ('mean','std','sem','min','max') and seasons is None: 
+            lW = True; obsagg = []
+      if not isinstance(obsagg,(list,tuple)): obsagg = (obsagg,)
+      obslists.append(obsagg); lUnity.append(lU); lWSC.append(lW)
+    # configure slicing (extract basin/province/shape and period)
+    slices = _configSlices(slices=slices, basins=basins, provs=provs, shapes=shapes, period=period)
+    # define independent reads (each returns a list of datasets for every aggregation)
+    tasks = []
+    regular = [n for n,obsagg in enumerate(obslists) if len(obsagg) > 0]
+    if len(regular) > 0: # regular operations with user-defined dataset
+      def loadRegular():
+        additions = [[] for _ in aggregations]
+        record = cell.child('obs')
+        try:
+          lsingle = _singleRead(**kwargs) # otherwise one load per aggregation
+          if lsingle and ( lmulti or _hasStores(names=obslists[regular[0]], shape=shapetype, slices=slices, 
+                                                varlist=variables, **kwargs) ): 
+            # load time-series only once (or from memory-mapped stores) and aggregate in one pass
+            ensemble = _loadEnsembleTS(names=obslists[regular[0]], season=None, aggregation=None, slices=slices, 
+                                       varlist=variables, shape=shapetype, ldataset=False, lpushdown=True, 
+                                       profile=record, **kwargs)
+            with record.phase('aggregation'):
+              enslist = _aggregateEnsemble(ensemble, [aggregations[n] for n in regular], seasons=[seasons])[0]
+          elif lmulti:
+            enslist = [_timedLoad(loadEnsembleTS, record, names=obslists[n], season=seasons, aggregation=aggregations[n], 
+                                  slices=slices, varlist=variables, shape=shapetype, ldataset=False, **kwargs) 
+                       for n in regular]
+          else:
+            enslist = [_timedLoad(loadEnsembleTS, record, names=obslists[0], season=seasons, aggregation=aggregation, 
+                                  slices=slices, varlist=variables, shape=shapetype, ldataset=False, **kwargs)]
+          for n,ensemble in zip(regular,enslist): additions[n].extend(ensemble)
+        except EmptyDatasetError: pass 
+        return additions
+      tasks.append(loadRegular)
+    if any(lUnity): # load Unity data instead of averaging CRU data
+      def loadUnity():
+        record = cell.child('Unity')
+        with record.phase('io'):
+          dataset = loadDataset(name='Unity', varlist=variables, mode='climatology', period=period or (1979,1994), 
+                                shape=shapetype)
+        with record.phase('slicing'):
+          dataset = dataset(**_pushdownSlices(dataset, slices)) # slice lazily (years don't apply to climatologies)
+        if llazy: dataset = lazyDataset(dataset) # variables are loaded on first access
+        else:
+          with record.phase('io'): dataset = dataset.load()
+          record.addIO(dataset)
+        return [[dataset] if lU else [] for lU in lUnity]
+      tasks.append(loadUnity)
+    if lCRU: # this is basically regular operations with CRU as default
+      def loadCRU():
+        record = cell.child('CRU')
+        return [[_timedLoad(loadEnsembleTS, record, names='CRU', season=seasons, aggregation=agg, slices=slices, 
+                            varlist=variables, shape=shapetype, ldataset=True, **kwargs)] for agg in aggregations]
+      tasks.append(loadCRU)
+    if any(lWSC): # another special case: river hydrographs (pre-computed climatologies)
+      def loadWSC():
+        additions = [[] for _ in aggregations]
+        record = cell.child('WSC')
+        for n,(agg,lW) in enumerate(zip(aggregations,lWSC)):
+          if lW:
+            try:
+              with record.phase('io'):
+                dataset = loadGageStation(basin=basins, varlist=['runoff'], aggregation=agg, mode='climatology', filetype='monthly')
+              with record.phase('slicing'): dataset = dataset(**_pushdownSlices(dataset, slices)) # slice lazily
+              if llazy: dataset = lazyDataset(dataset) # variables are loaded on first access
+              else:
+                with record.phase('io'): dataset = dataset.load()
+                record.addIO(dataset)
+              additions[n].append(dataset)
+            except GageStationError: 
+              pass # just ignore, if gage station if data is missing 
+        return additions
+      tasks.append(loadWSC)
+    # execute reads concurrently (I/O-bound) and merge results in the original order
+    executor = 'thread' if lconcurrent else 'serial'
+    results = executeBatch(_runTask, [dict(task=task) for task in tasks], executor=executor, nproc=len(tasks), 
+                           lunique=False) # I/O-bound: one thread per read
+    obsenses = [Ensemble(name='obs',title='Observations', basetype=Dataset) for _ in aggregations]
+    for additions in results:
+      for obsens,datasets in zip(obsenses,additions):
+        for dataset in datasets: obsens += dataset
+  # return ensembles (will be wrapped in a list, if BatchLoad is used)
+  return tuple(obsenses) if lmulti else obsenses[0]
+
+def loadShapeObservations(profile=None, **kwargs):
+  ''' convenience function to load shape observations; the main function is to select sensible defaults 
+      based on 'varlist', if no 'obs' are specified; if aggregation is a list, the time-series are only 
+      read once and a tuple of Ensembles is returned (one for each aggregation); with store=True (or a 
+      folder), time-series are read from memory-mapped stores, if they exist (see clim.store); the different 
+      observational datasets are read concurrently in a thread pool (unless lconcurrent=False); if llazy is 
+      True, the variables of the pre-computed climatologies (Unity and WSC) are only read when they are first
+      accessed (see clim.lazy); if a LoadProfile is given, time, bytes and files are recorded for every cell 
+      and dataset (see clim.profiling) '''
+  profile = getProfile(profile, name='loadShapeObservations')
+  if profile: kwargs['profile'] = profile
+  with profile: return _loadShapeObservations(**kwargs)
+
+
+# define new load fct. for experiments (not intended for observations)
+def _loadShapeEnsemble(seasons=None, basins=None, provs=None, shapes=None, varlist=None, aggregation='mean', 
+                       slices=None, shapetype=None, filetypes=None, period=None, variable_list=None, 
+                       WRF_exps=None, CESM_exps=None, WRF_ens=None, CESM_ens=None, cache=None, registry=None, 
+                       lpushdown=True, store=None, profile=None, filetype_index=None, lincremental=False, **kwargs):
+  ''' load a single shape ensemble; if seasons and/or aggregation are lists, time-series are only loaded 
+      once (with slices pushed down to the read layer, if possible) and a list of results (one per season) 
+      and/or tuples of Ensembles (one per aggregation) are returned; if memory-mapped stores are requested 
+      and exist for all members, time-series are read from the stores (store can be True or a folder); if 
+      lincremental is True, time-series are cached as well and only new years are read when files change '''
+  with getProfile(profile).child('cell', cellLabel(seasons=seasons, basins=basins, provs=provs, shapes=shapes, 
+                                                     varlist=varlist, aggregation=aggregation, period=period, 
+                                                     **kwargs)) as cell:
+    # prepare arguments
+    with cell.phase('arguments'):
+      scanargs = dict(names=kwargs.get('names',None), domain=kwargs.get('domain',None), WRF_exps=WRF_exps, 
+                      WRF_ens=WRF_ens, lensembleAxis=kwargs.get('lensembleAxis',False))
+      variables, filetypes, slices, shapetype = _prepareShapeArgs(basins=basins, provs=provs, shapes=shapes, 
+                                                                  varlist=varlist, slices=slices, shapetype=shapetype, 
+                                                                  filetypes=filetypes, period=period, 
+                                                                  variable_list=variable_list, 
+                                                                  filetype_index=filetype_index, scanargs=scanargs)
+    lfanout = isinstance(seasons,(list,tuple))
+    seasonlist = list(seasons) if lfanout else [seasons]
+    lmulti = isinstance(aggregation,(list,tuple))
+    aggregations = list(aggregation) if lmulti else [aggregation]
+    lraw = any(agg is None for agg in aggregations) # raw time-series are not aggregated after loading
+    # check cache (keyed on normalized arguments; one entry per season and aggregation)
+    cache = getCache(cache)
+    if cache is not None:
+      with cell.phase('cache'):
+        # N.B.: experiment and ensemble definitions are not part of the arguments, but they determine members 
+        digest = ensembleDigest(kwargs.get('names',None), WRF_exps=WRF_exps, CESM_exps=CESM_exps, WRF_ens=WRF_ens, 
+                                CESM_ens=CESM_ens)
+        keys = [[getCacheKey('loadShapeEnsemble', season=season, slices=slices, varlist=sorted(variables), 
+                             shape=shapetype, aggregation=agg, filetypes=sorted(filetypes), ensemble=digest, **kwargs) 
+                 for agg in aggregations] for season in seasonlist]
+        enslists = [[cache.get(key) for key in keylist] for keylist in keys]
+        if any(ens is None for enslist in enslists for ens in enslist): enslists = None
+    else: enslists = None
+    lsingle = _singleRead(**kwargs) and not lraw # otherwise every season and aggregation is loaded with loadEnsembleTS
+    if lincremental and ( cache is None or not lsingle ):
+      warn("Incremental refresh requires a cache and time-series that can be read directly - ignoring.")
+      lincremental = False
+    # record source files of all members before they are read (aggregated datasets don't know their sources)
+    stats = None
+    if cache is not None and enslists is None and not lincremental:
+      with cell.phase('cache'):
+        stats = _sourceStats(names=kwargs.get('names',None), shape=shapetype, filetypes=filetypes, 
+                             domain=kwargs.get('domain',None), lensembleAxis=kwargs.get('lensembleAxis',False), 
+                             WRF_exps=WRF_exps, CESM_exps=CESM_exps, WRF_ens=WRF_ens, CESM_ens=CESM_ens)
+    # load ensemble (no iteration here)
+    if enslists is not None: pass # everything was found in cache
+    elif lincremental:
+      # update cached time-series with new years (only changed members are read) and aggregate them
+      with cell.phase('cache'):
+        statekey = getCacheKey('loadShapeEnsemble.state', slices=slices, varlist=sorted(variables), shape=shapetype, 
+                               filetypes=sorted(filetypes), ensemble=digest, **kwargs)
+        states = cache.getState(statekey)
+      states, members, stats = _refreshEnsemble(states=states, slices=slices, varlist=variables, shape=shapetype, 
+                                                filetypes=filetypes, WRF_exps=WRF_exps, CESM_exps=CESM_exps, 
+                                                WRF_ens=WRF_ens, CESM_ens=CESM_ens, profile=cell, 
+                                                **{key:value for key,value in kwargs.iteritems() 
+                                                   if key not in ('name','title','ldataset','store')})
+      with cell.phase('aggregation'):
+        enslists = [[Ensemble(name=kwargs.get('name',None), title=kwargs.get('title',None), basetype=Dataset) 
+                     for _ in aggregations] for _ in seasonlist]
+        for dataset,state in members:
+          for enslist,datasets in zip(enslists,state.aggregate(dataset, aggregations, seasons=seasonlist)):
+            for ens,ds in zip(enslist,datasets): ens += ds
+      with cell.phase('cache'): cache.putState(statekey, states, stats=stats, name=kwargs.get('name',None))
+    elif lsingle and ( lfanout or lmulti or ( lpushdown and _hasStores(shape=shapetype, slices=slices, varlist=variables, 
+                                                                       store=store, WRF_ens=WRF_ens, CESM_ens=CESM_ens, 
+                                                                       **kwargs) ) ): 
+      # load time-series only once and aggregate for each season
+      shpens = _loadEnsembleTS(registry=getRegistry(registry), lpushdown=lpushdown, season=None, slices=slices, varlist=variables, shape=shapetype, 
+                              aggregation=None, filetypes=filetypes, WRF_exps=WRF_exps, store=store, profile=cell, 
+                              CESM_exps=CESM_exps, WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs)
+      with cell.phase('aggregation'): enslists = _aggregateEnsemble(shpens, aggregations, seasons=seasonlist)
+    elif lfanout or lmulti: # e.g. reduction is applied after aggregation: one load per season and aggregation
+      enslists = [[_loadEnsembleTS(registry=getRegistry(registry), season=season, slices=slices, varlist=variables, 
+                                   shape=shapetype, aggregation=agg, filetypes=filetypes, WRF_exps=WRF_exps, profile=cell, 
+                                   CESM_exps=CESM_exps, WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs) 
+                   for agg in aggregations] for season in seasonlist]
+    else: # N.B.: time spent in loadEnsembleTS is recorded as I/O (includes slicing and aggregation)
+      shpens = _loadEnsembleTS(registry=getRegistry(registry), season=seasons, slices=slices, varlist=variables, shape=shapetype, 
+                              aggregation=aggregation, filetypes=filetypes, WRF_exps=WRF_exps, profile=cell, 
+                              CESM_exps=CESM_exps, WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs)
+      enslists = [[shpens]]
+    if stats is not None:
+      with cell.phase('cache'):
+        for keylist,enslist in zip(keys,enslists):
+          for key,ens in zip(keylist,enslist): cache.put(key, ens, stats=stats, name=ens.ens_name)
+  # return ensembles
+  enslists = [tuple(enslist) if lmulti else enslist[0] for enslist in enslists]
+  return enslists if lfanout else enslists[0]
+_batchShapeEnsemble = ParallelBatchLoad(_loadShapeEnsemble)
+
+def loadShapeEnsemble(seasons=None, load_list=None, lproduct='outer', ldryrun=False, profile=None, **kwargs):
+  ''' convenience function to load shape ensembles (in Ensemble container); kwargs are passed to loadEnsembleTS;
+      if a cache is specified (True, a folder or an EnsembleCache instance), results are stored on disk and 
+      retrieved from there, as long as the source files have not changed; if aggregation is a list, the 
+      time-series are only read once and a tuple of Ensembles is returned (one for each aggregation); 
+      if 'seasons' are expanded in an outer product, all seasons are derived from a single load;
+      expanded cells can be loaded concurrently using executor='thread' or 'process' and nproc workers;
+      with registry=True (or a MemberRegistry), members are only loaded once and shared between Ensembles;
+      with store=True (or a folder), shape averages are read from memory-mapped stores (see clim.store), if
+      they exist for all members;
+      with filetype_index=True (or a FiletypeIndex), only filetypes that contain requested variables are read;
+      with lincremental=True (and a cache), the time-series of all members are cached and only complete years
+      that were added to the source files since the last call are read and appended (the archive has to be
+      append-only; results are the same as for a full reload);
+      if ldryrun is True, nothing is loaded and the LoadPlan is returned (see planShapeEnsemble);
+      if a LoadProfile is given, time, bytes and files are recorded (see clim.profiling) '''
+  if kwargs.get('registry',None) and kwargs.get('executor',None) == 'process':
+    warn("Members can not be shared between processes - ignoring registry."); kwargs['registry'] = None
+  if ldryrun: 
+    return planShapeEnsemble(seasons=seasons, load_list=load_list, lproduct=lproduct, **kwargs)
+  if profile and kwargs.get('executor',None) == 'process':
+    warn("Profiles can not be recorded in other processes - ignoring profile."); profile = None
+  profile = getProfile(profile, name='loadShapeEnsemble')
+  if profile: kwargs['profile'] = profile
+  with profile:
+    if load_list and 'seasons' in load_list and lproduct == 'outer' and isinstance(seasons,(list,tuple)):
+      return _fanoutArgument(_batchShapeEnsemble, 'seasons', seasons=seasons, load_list=load_list, **kwargs)
+    else:
+      return _batchShapeEnsemble(seasons=seasons, load_list=load_list, lproduct=lproduct, **kwargs)
+
+
+# arguments that the chunked station reduction can handle (otherwise loadEnsembleTS is used)
+chunked_args = ('names','name','title','varlist','station','filetypes','domain','slices','season','aggregation',
+                'prov','constraints','lensembleAxis','master','lall','lcheckVar','WRF_exps','CESM_exps','WRF_ens',
+                'CESM_ens')
+
+# internal method to reduce station time-series out-of-core
+def _loadStationChunked(names=None, name=None, title=None, season=None, aggregation=None, prov=None, 
+                        constraints=None, slices=None, lensembleAxis=False, master=None, lall=True, 
+                        lcheckVar=None, memory_budget=None, WRF_ens=None, CESM_ens=None, profile=None, **kwargs):
+  ''' open members lazily, select stations based on meta data and compute the seasonal reduction in blocks
+      of stations that fit into the memory budget (see clim.chunked) '''
+  if profile is None: profile = null_record
+  if not isinstance(names,(list,tuple)): names = [names]
+  if prov is not None: 
+    constraints = dict() if constraints is None else constraints.copy()
+    constraints['prov'] = prov
+  groups = [] # datasets for every name (members of ensembles, if loaded with an ensemble axis)
+  for entry in names:
+    members = []
+    for dsname in _expandNames(entry, WRF_ens=WRF_ens, CESM_ens=CESM_ens, lensembleAxis=lensembleAxis):
+      with profile.phase('io'): dataset = _openDataset(name=dsname, WRF_ens=WRF_ens, CESM_ens=CESM_ens, **kwargs)
+      with profile.phase('slicing'):
+        dsslices = _pushdownSlices(dataset, slices)
+        if dsslices: dataset = dataset(**dsslices) # slice lazily
+      members.append(dataset)
+    lstack = lensembleAxis and _ensembleMembers(entry, WRF_ens=WRF_ens, CESM_ens=CESM_ens) is not None
+    groups.append((getattr(entry,'name',entry), members, lstack))
+  # select stations based on meta data (only meta data are read)
+  indices = None
+  if constraints:
+    with profile.phase('slicing'):
+      datasets = [dataset for entry,members,lstack in groups for dataset in members]
+      indices = StationIndex(datasets, stnaxis='station', master=master, lall=lall).indices(constraints)
+  # reduce members block by block (members of ensembles are stacked along an ensemble axis)
+  ensemble = Ensemble(name=name, title=title, basetype=Dataset)
+  for entry,members,lstack in groups:
+    reduced = []
+    for dataset in members:
+      record = profile.child(dataset.name)
+      reduced.append(reduceStations(dataset, [aggregation], season=season, indices=indices, 
+                                    memory_budget=memory_budget, profile=record)[0])
+    if lstack: ensemble += stackMembers(reduced, name=entry)
+    else: ensemble += reduced[0]
+  return ensemble
+
+# load a single cell of a station ensemble batch (module-level, so that it can be pickled)
+def _loadStationCell(registry=None, profile=None, memory_budget=None, **kwargs):
+  ''' wrapper for loadEnsembleTS that can be used with a process pool; if a MemberRegistry is given, members
+      are loaded without constraints (only once) and stations are selected using a StationIndex; if a
+      memory_budget is given, seasonal reductions are computed out-of-core '''
+  with getProfile(profile).child('cell', cellLabel(**kwargs)) as cell:
+    if memory_budget is not None:
+      if kwargs.get('aggregation',None) is not None and all(key in chunked_args for key in kwargs):
+        ensemble = _loadStationChunked(memory_budget=memory_budget, profile=cell, **kwargs)
+        return ensemble
+      else: warn("Arguments are not supported by chunked reduction - loading time-series into memory.")
+    if registry is None: 
+      ensemble = _timedLoad(loadEnsembleTS, cell, **kwargs)
+      return ensemble
+    constraints = kwargs.pop('constraints',None)
+    ensemble = _loadEnsembleTS(registry=registry, constraints=None, profile=cell, **kwargs)
+    if constraints: 
+      with cell.phase('slicing'):
+        index = StationIndex(ensemble, stnaxis='station', master=kwargs.get('master',None), lall=kwargs.get('lall',True))
+        ensemble = index.selectEnsemble(ensemble, constraints)
+  return ensemble
+
+# load station ensembles once and apply (expanded) constraints using a station index
+def _loadStationIndexed(constraints=None, load_list=None, lproduct='outer', executor=None, nproc=None, **kwargs):
+  ''' load station ensembles without constraints and select stations with cached masks from a StationIndex; 
+      if constraints is a list, a list of Ensembles (one per constraint dict) is returned for each cell '''
+  lfanout = isinstance(constraints,(list,tuple))
+  constraint_list = constraints if lfanout else [constraints]
+  if load_list:
+    kwargs_list = expandArgumentList(expand_list=load_list, lproduct=lproduct, constraints=None, **kwargs)
+    enslist = executeBatch(_loadStationCell, kwargs_list, executor=executor, nproc=nproc)
+  else: enslist = [_loadStationCell(constraints=None, **kwargs)]
+  record = getProfile(kwargs.get('profile',None)).child('station index')
+  results = []
+  for ensemble in enslist:
+    with record.phase('slicing'):
+      index = StationIndex(ensemble, stnaxis='station', master=kwargs.get('master',None), lall=kwargs.get('lall',True))
+      cell = [index.selectEnsemble(ensemble, constraint) for constraint in constraint_list]
+    results.append(cell if lfanout else cell[0])
+  return results if load_list else results[0]
+
+# internal method to prepare arguments for station ensembles
+def _prepareStationArgs(seasons=None, provs=None, clusters=None, varlist=None, aggregation='mean', constraints=None, 
+                        filetypes=None, cluster_name=None, stationtype=None, load_list=None, 
+                        WRF_exps=None, CESM_exps=None, WRF_ens=None, CESM_ens=None, 
+                        variable_list=None, default_constraints=None, filetype_index=None, **kwargs):
+  ''' infer station type, resolve variables and expand province/cluster constraints; returns the modified 
+      load_list and the keyword arguments for loadEnsembleTS; if a FiletypeIndex is given, filetypes are 
+      pruned to the minimal set that contains all variables '''
+  load_list = [] if load_list is None else load_list[:] # use a copy, since the list may be modified
+  
+  # figure out varlist  
+  if isinstance(varlist,basestring) and not stationtype:
+      if varlist.lower().find('prec') >= 0: 
+        stationtype = 'ecprecip'
+      elif varlist.lower().find('temp') >= 0: 
+        stationtype = 'ectemp'
+      else: raise ArgumentError, varlist
+  if not isinstance(stationtype,basestring): raise ArgumentError, stationtype # not inferred
+  if clusters and not cluster_name: raise ArgumentError
+  params = stn_params  + [cluster_name] if cluster_name else stn_params # need to load cluster_name!
+  scanargs = dict(names=kwargs.get('names',None), domain=kwargs.get('domain',None), station=stationtype, 
+                  WRF_exps=WRF_exps, WRF_ens=WRF_ens, lensembleAxis=kwargs.get('lensembleAxis',False))
+  variables, filetypes =  _resolveVarlist(varlist=varlist, filetypes=filetypes, params=params, 
+                                          variable_list=variable_list, scanargs=scanargs,
+                                          ftindex=getFiletypeIndex(filetype_index))
+  # prepare arguments
+  if provs or clusters:
+    if constraints is None: constraints = default_constraints.copy()
+    constraint_list = []
+    if 'provs' in load_list and 'clusters' in load_list: 
+      raise ArgumentError, "Cannot expand 'provs' and 'clusters' at the same time."
+    # figure out proper handling of provinces
+    if provs:
+      if 'prov' not in load_list: 
+        constraints['prov'] = provs; provs = None
+      else:  
+        if len(constraint_list) > 0: raise ArgumentError, "Cannot expand multiple keyword-constraints at once."
+        for prov in provs:
+          tmp = constraints.copy()
+          tmp['prov'] = prov
+          constraint_list.append(tmp)
+        load_list[load_list.index('prov')] = 'constraints'
+        constraints = constraint_list; provs = None
+    # and analogously, handling of clusters!
+    if clusters:
+      if 'cluster' not in load_list: 
+        constraints['cluster'] = clusters; clusters = None
+      else:  
+        if len(constraint_list) > 0: raise ArgumentError, "Cannot expand multiple keyword-constraints at once."
+        for cluster in clusters:
+          tmp = constraints.copy()
+          tmp['cluster'] = cluster
+          if cluster_name: tmp['cluster_name'] = cluster_name # will be expanded next to cluster index
+          constraint_list.append(tmp)
+        load_list[load_list.index('cluster')] = 'constraints'
+        constraints = constraint_list; clusters = None  
+  # arguments for loadEnsembleTS
+  kwargs.update(season=seasons, prov=provs, station=stationtype, varlist=variables, aggregation=aggregation, 
+                constraints=constraints, filetypes=filetypes, WRF_exps=WRF_exps, CESM_exps=CESM_exps, 
+                WRF_ens=WRF_ens, CESM_ens=CESM_ens, lcheckVar=False)
+  return load_list, kwargs
+
+# define new load fct. (batch args: load_list=['season','prov',], lproduct='outer')
+def loadStationEnsemble(load_list=None, lproduct='outer', executor=None, nproc=None, lstationIndex=False, 
+                        registry=None, memory_budget=None, ldryrun=False, profile=None, **kwargs):
+  ''' convenience function to load station data for ensembles (in Ensemble container); kwargs are passed to loadEnsembleTS;
+      expanded cells can be loaded concurrently using executor='thread' or 'process' and nproc workers;
+      if lstationIndex is True, data are loaded once for all constraints and stations are selected with 
+      cached masks from a StationIndex; with registry=True (or a MemberRegistry), members are only loaded
+      once and shared between Ensembles; with filetype_index=True (or a FiletypeIndex), only filetypes 
+      that contain requested variables are read; with a memory_budget (bytes or e.g. '2GB'), members are
+      read in blocks of stations and seasonal reductions are computed block by block (results are the
+      same, but the full time-series are never held in memory); if ldryrun is True, the LoadPlan is returned 
+      instead; if a LoadProfile is given, time, bytes and files are recorded for every cell '''
+  if ldryrun:
+    return planStationEnsemble(load_list=load_list, lproduct=lproduct, lstationIndex=lstationIndex, **kwargs)
+  if profile and executor == 'process':
+    warn("Profiles can not be recorded in other processes - ignoring profile."); profile = None
+  profile = getProfile(profile, name='loadStationEnsemble')
+  with profile:
+    with profile.phase('arguments'): load_list, kwargs = _prepareStationArgs(load_list=load_list, **kwargs)
+    constraints = kwargs['constraints']
+    if registry and executor == 'process':
+      warn("Members can not be shared between processes - ignoring registry."); registry = None
+    if registry and memory_budget is not None:
+      warn("Members are not loaded with a memory budget - ignoring registry."); registry = None
+    registry = getRegistry(registry)
+    if registry is not None: kwargs['registry'] = registry
+    if memory_budget is not None: kwargs['memory_budget'] = memory_budget
+    if profile: kwargs['profile'] = profile
+    lcell = registry is not None or memory_budget is not None or bool(profile) # load through _loadStationCell
+    # load ensemble (no iteration here)
+    if lstationIndex and constraints and 'constraints' not in load_list:
+      stnens = _loadStationIndexed(load_list=load_list, lproduct=lproduct, executor=executor, nproc=nproc, **kwargs)
+    elif lstationIndex and constraints and lproduct == 'outer':
+      stnens = _fanoutArgument(_loadStationIndexed, 'constraints', load_list=load_list, executor=executor, 
+                               nproc=nproc, **kwargs)
+    elif load_list: # duplicate cells are only loaded once
+      kwargs_list = expandArgumentList(expand_list=load_list, lproduct=lproduct, **kwargs)
+      stnens = executeBatch(_loadStationCell, kwargs_list, executor=executor, nproc=nproc)
+    elif lcell: # N.B.: load_list is never None, so BatchLoad wraps single cells in a list as well
+      stnens = [_loadStationCell(**kwargs)]
+    else:
+      stnens = loadEnsembleTS(load_list=load_list, lproduct=lproduct, **kwargs)
+  # return ensembles (will be wrapped in a list, if BatchLoad is used)
+  return stnens
+
+
+## load plans (dry runs)
+
+# estimate files and bytes that will be read for a plan entry
+def _estimateDataset(name=None, filetype=None, domain=None, period=None, **kwargs):
+  ''' open dataset headers (no data is read) to estimate the number of files and bytes for a plan entry '''
+  try: dataset = _openDataset(name=name, filetypes=[filetype] if filetype else None, domain=domain, **kwargs)
+  except (DatasetError, IOError): return None, None
+  files = getattr(dataset,'filelist',None)
+  nfiles = len(files) if files else None
+  nbytes = sum(np.prod(var.shape)*var.dtype.itemsize for var in dataset.variables.itervalues())
+  if isinstance(period,(tuple,list)) and dataset.hasAxis('time'):
+    nbytes *= min(1., (period[1]-period[0])*12. / len(dataset.axes['time'])) # only part of the period is read
+  return nfiles, int(nbytes)
+
+# add all datasets that a cell (arguments for loadEnsembleTS) will open to a plan
+def _addPlanEntries(plan, cell, lestimate=False, lstationIndex=False):
+  ''' add PlanEntry tuples for a cell (loadEnsembleTS arguments) to a LoadPlan '''
+  names = cell.get('names',None)
+  if not isinstance(names,(list,tuple)): names = [names]
+  slices = cell.get('slices',None) or dict()
+  period = slices.get('years',cell.get('years',None))
+  if cell.get('shape',None): 
+    selection = (cell['shape'], normalizeArgument(slices.get('shape_name',None)))
+  else:
+    constraints = None if lstationIndex else cell.get('constraints',None) # index selects after loading
+    selection = (cell.get('station',None), normalizeArgument(cell.get('prov',None)), normalizeArgument(constraints))
+  WRF_exps = cell.get('WRF_exps',None) or dict(); WRF_ens = cell.get('WRF_ens',None) or dict()
+  for name in names:
+    # N.B.: only WRF datasets are split into different filetypes
+    lWRF = name in WRF_exps or name in WRF_ens
+    filetypes = sorted(cell.get('filetypes',None) or [None]) if lWRF else [None]
+    for filetype in filetypes:
+      entry = PlanEntry(name=name, filetype=filetype, domain=cell.get('domain',None), selection=selection,
+                        season=normalizeArgument(cell.get('season',None)), period=normalizeArgument(period))
+      if entry in plan.entries or not lestimate: nfiles = nbytes = None
+      else:
+        loadargs = {key:cell[key] for key in ('shape','station','varlist','WRF_exps','CESM_exps','WRF_ens','CESM_ens') 
+                    if cell.get(key,None) is not None}
+        nfiles, nbytes = _estimateDataset(name=name, filetype=filetype, domain=cell.get('domain',None), 
+                                          period=period, **loadargs)
+      plan.addEntry(entry, files=nfiles, nbytes=nbytes)
+
+def planShapeEnsemble(seasons=None, load_list=None, lproduct='outer', lestimate=False, **kwargs):
+  ''' return the expanded LoadPlan for a loadShapeEnsemble call, without loading any data; if lestimate is
+      True, dataset headers are opened to estimate the number of files and bytes '''
+  load_list = [] if load_list is None else load_list[:]
+  if 'seasons' in load_list and lproduct == 'outer' and isinstance(seasons,(list,tuple)):
+    load_list.remove('seasons') # seasons are derived from a single load
+  if load_list: kwargs_list = expandArgumentList(seasons=seasons, expand_list=load_list, lproduct=lproduct, **kwargs)
+  else: kwargs_list = [dict(seasons=seasons, **kwargs)]
+  plan = LoadPlan(kwargs_list)
+  for cell in plan.cells:
+    cell = cell.copy()
+    variables, filetypes, slices, shapetype = _prepareShapeArgs(**{key:cell.pop(key,None) for key in 
+                      ('basins','provs','shapes','varlist','slices','shapetype','filetypes','period','variable_list',
+                       'filetype_index')})
+    cell.update(season=cell.pop('seasons',None), varlist=variables, filetypes=filetypes, slices=slices, shape=shapetype)
+    _addPlanEntries(plan, cell, lestimate=lestimate)
+  return plan
+
+def planStationEnsemble(load_list=None, lproduct='outer', lestimate=False, lstationIndex=False, **kwargs):
+  ''' return the expanded LoadPlan for a loadStationEnsemble call, without loading any data; if lestimate is
+      True, dataset headers are opened to estimate the number of files and bytes '''
+  load_list, kwargs = _prepareStationArgs(load_list=load_list, **kwargs)
+  if lstationIndex and 'constraints' in load_list and lproduct == 'outer':
+    load_list.remove('constraints') # constraints are applied after loading
+  if load_list: kwargs_list = expandArgumentList(expand_list=load_list, lproduct=lproduct, **kwargs)
+  else: kwargs_list = [kwargs]
+  plan = LoadPlan(kwargs_list)
+  for cell in plan.cells: _addPlanEntries(plan, cell, lestimate=lestimate, lstationIndex=lstationIndex)
+  return plan
+
+
+## abuse main section for testing
+if __name__ == '__main__':
+  
+  from projects.WesternCanada.WRF_experiments import WRF_exps, ensembles
+  from projects.WesternCanada.analysis_settings import exps_rc, variables_rc, loadShapeObservations  
+#   from projects.GreatLakes.WRF_experiments import WRF_exps, ensembles
+#   from projects.GreatLakes.analysis_settings import exps_rc, variables_rc, loadShapeObservations
+  # N.B.: importing Exp through WRF_experiments is necessary, otherwise some isinstance() calls fail
+
+#  test = 'obs_timeseries'
+#   test = 'basin_timeseries'
+  test = 'station_timeseries'
+#   test = 'province_climatology'
+  
+  
+  # test load function for basin ensemble time-series
+  if test == 'obs_timeseries':
+    
+    # some settings for tests
+    basins = ['GLB'] #; period = (1979,1994)
+    varlist = ['precip',]; aggregation = 'mean'
+
+    shpens = loadShapeObservations(obs='GPCC', basins=basins, varlist=varlist,
+                                   aggregation=aggregation, load_list=['basins','varlist'],)
+#                                    variable_list=variables_rc)
+    # print diagnostics
+    print shpens[0]; print ''
+    assert len(shpens) == len(basins) # len(seasons)
+    print shpens[0][0]
+    for i,basin in enumerate(basins): 
+      #for ds in shpens[i]: print ds.atts.shape_name
+      assert all(ds.atts.shape_name == basin for ds in shpens[i])
+  
+  
+  # test load function for basin ensemble time-series
+  elif test == 'basin_timeseries':
+    
+    # some settings for tests
+    exp = 'g-ens'; exps = exps_rc[exp].exps; #exps = ['Unity']
+    basins = ['GLB']; seasons = ['summer','winter']
+    varlist = ['precip']; aggregation = 'mean'; red = dict(s='mean')
+
+    shpens = loadShapeEnsemble(names=exps, basins=basins, seasons=seasons, varlist=varlist, 
+                               aggregation=aggregation, filetypes=None, reduction=red, 
+                               load_list=['basins','seasons',], lproduct='outer', domain=2,
+                               WRF_exps=WRF_exps, CESM_exps=None, WRF_ens=ensembles, CESM_ens=None,
+                               variable_list=variables_rc)
+    # print diagnostics
+    print shpens[0]; print ''
+    assert len(shpens) == len(basins)*len(seasons)
+    print shpens[0][0]
+    for i,basin in enumerate(basins):
+      i0 = i*len(seasons); ie = len(seasons)*(i+1)
+      assert all(all(ds.atts.shape_name == basin for ds in ens) for ens in shpens[i0:ie])
+      
+
+  # test load function for station ensemble
+  elif test == 'station_timeseries':
+      
+    # station selection criteria
+    constraints_rc = dict()
+    constraints_rc['min_len'] = 15 # for valid climatology
+    constraints_rc['lat'] = (45,55) 
+    constraints_rc['max_zerr'] = 100 # reduce sample size
+    constraints_rc['prov'] = ('ON')
+    constraints_rc['end_after'] = 1980
+  
+    # some settings for tests
+    provs = None; clusters = None; lensembleAxis = False; sample_axis = None; lflatten = False
+    exp = 'val'; exps = ['EC', 'erai-max', 'max-ctrl']; provs = ('BC','AB')
+#     exp = 'max-all'; exps = exps_rc[exp]; provs = ('BC','AB')
+#     exps = ['g-ctrl', 'g-ctrl-2050', 'g-ctrl-2100']; provs = ['ON']
+    seasons = ['summer']; lfit = True; lrescale = True; lbootstrap = False
+    lflatten = False; lensembleAxis = True
+    varlist = ['MaxPrecip_1d', 'MaxPrecip_5d','MaxPreccu_1d'][:1]; filetypes = ['hydro']
+    stnens = loadStationEnsemble(names=exps, provs=provs, clusters=clusters, varlist=varlist,  
+                                 seasons=seasons, master=None, stationtype='ecprecip',
+                                 domain=2, lensembleAxis=lensembleAxis, filetypes=filetypes,                                 
+                                 variable_list=variables_rc, default_constraints=constraints_rc,
+                                 WRF_exps=WRF_exps, CESM_exps=None, WRF_ens=ensembles, CESM_ens=None,
+                                 load_list=['season','provs'], lproduct='outer',)
+    # print diagnostics
+    print stnens[0][0]; print ''
+    assert len(stnens) == len(seasons)
+    print stnens[0][0]
+    print stnens[0][1].MaxPrecip_1d.mean()
+
+      
+  # test load function for province ensemble climatology
+  if test == 'province_climatology':
+    
+    # some settings for tests
+    exp = 'g-ens'; exps = exps_rc[exp].exps
+    basins = ['GLB','GRW'] 
+    varlists = ['precip','T2']; aggregation = 'mean'
+
+    shpens = loadShapeEnsemble(names=exps, basins=basins, varlist=varlists, aggregation=aggregation,
+                               period=(1979,1994), # this does not work properly with just a number...
+                               load_list=['basins','varlist'], lproduct='outer', filetypes=['srfc'],
+                               WRF_exps=WRF_exps, CESM_exps=None, WRF_ens=ensembles, CESM_ens=None,
+                               variable_list=variables_rc)
+    # print diagnostics
+    print shpens[0]; print ''
+    assert len(shpens) == len(basins)*len(varlists)
+    assert shpens[0][1].time.coord[0] == 1
+    for i,basin in enumerate(basins):
+      i0 = i*len(varlists); ie = len(varlists)*(i+1)
       assert all(all(ds.atts.shape_name == basin for ds in ens) for ens in shpens[i0:ie])    
\ No newline at end of file
@@ -184,10 +184,9 @@ if __name__ == '__main__':
 #     period = 1979,2009
     # some settings for tests
     expens = None; experr = None; obsens = None; obserr = None
-    expens = loadShapeEnsemble(names=exps.exps, basins=basin, varlist=varlist, aggregation='mean',)
-    experr = loadShapeEnsemble(names=exps.exps, basins=basin, varlist=varlist, aggregation='std',)
-    obsens = loadShapeObservations(obs=obs, basins=basin, varlist=varlist, aggregation='mean', period=period)
-    obserr = loadShapeObservations(obs=obs, basins=basin, varlist=varlist, aggregation='std', period=period)
+    # N.B.: mean and std are computed from a single read
+    expens, experr = loadShapeEnsemble(names=exps.exps, basins=basin, varlist=varlist, aggregation=('mean','std'),)
+    obsens, obserr = loadShapeObservations(obs=obs, basins=basin, varlist=varlist, aggregation=('mean','std'), period=period)
     # print diagnostics
     print expens[0] if expens else obsens[0]; print ''
     
@@ -214,10 +213,8 @@ if __name__ == '__main__':
     # some settings for tests
     expens = None; experr = None; obsens = None; obserr = None
     kwargs = dict(basins=basins, varlist=varlists, load_list=['basins','varlist'], lproduct='outer')
-    expenses = loadShapeEnsemble(names=exps.exps, aggregation='mean', **kwargs)
-    experres = loadShapeEnsemble(names=exps.exps, aggregation='SEM', **kwargs)
-    obsenses = loadShapeObservations(obs=obs, aggregation='mean', period=None, **kwargs)
-    obserres = loadShapeObservations(obs=obs, aggregation='SEM', period=None, **kwargs)
+    expenses, experres = zip(*loadShapeEnsemble(names=exps.exps, aggregation=('mean','SEM'), **kwargs))
+    obsenses, obserres = zip(*loadShapeObservations(obs=obs, aggregation=('mean','SEM'), period=None, **kwargs))
     # print diagnostics
     print expenses[0] if expenses else obsenses[0]; print ''
     
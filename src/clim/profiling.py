@@ -0,0 +1,182 @@
+'''
+Created on Oct 18, 2026
+
+Opt-in instrumentation for the load functions in clim.load: a LoadProfile records wall time and memory use
+of a load call, and for every expanded batch cell and every dataset the time spent in the different phases
+(argument resolution, I/O, slicing, aggregation), as well as the bytes that were loaded and the number of
+files that were opened; the result is a nested report (dict) that can be logged or stored as JSON.
+Memory is measured as the bytes of loaded arrays and as the increase of the peak resident memory of the
+process while a record was active (the process peak itself is a lifetime high-water mark).
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import sys, time, json, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+# internal imports
+from geodata.base import Ensemble
+from geodata.misc import ArgumentError
+from clim.cache import normalizeArgument, sourceFiles, ignore_args
+
+# some definitions
+phase_list = ('arguments','cache','io','slicing','aggregation') # for reference; other phases are allowed
+label_args = ('names','name','obs','seasons','season','basins','provs','shapes','prov','cluster','constraints',
+              'varlist','aggregation','period','slices','station','shape','domain')
+
+
+## helper functions
+
+def peakMemory():
+  ''' peak resident memory of the current process in bytes (lifetime high-water mark; None, if not available) '''
+  try: import resource
+  except ImportError: return None
+  maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return maxrss if sys.platform == 'darwin' else maxrss*1024 # kB on Linux
+
+def loadedBytes(result):
+  ''' bytes of loaded data in a Dataset, Ensemble or list of those '''
+  if isinstance(result,(Ensemble,list,tuple)): return sum(loadedBytes(res) for res in result)
+  elif hasattr(result,'variables'):
+    return sum(var.data_array.nbytes for var in result.variables.itervalues()
+               if getattr(var,'data_array',None) is not None)
+  else: return 0
+
+def openedFiles(result):
+  ''' number of source files of a Dataset, Ensemble or list of those '''
+  if isinstance(result,(list,tuple)): return sum(openedFiles(res) for res in result)
+  elif isinstance(result,Ensemble): return len(sourceFiles(result))
+  elif hasattr(result,'variables'): return len(sourceFiles([result]))
+  else: return 0
+
+def cellLabel(**kwargs):
+  ''' a short, reproducible label for a batch cell, based on the most important arguments '''
+  return OrderedDict((key,normalizeArgument(kwargs[key])) for key in label_args
+                     if kwargs.get(key,None) is not None and key not in ignore_args)
+
+
+## profile records
+
+class ProfileRecord(object):
+  ''' A profile record for a load call, batch cell or dataset; phase times, bytes and files of child
+      records are included in the totals (phases of a record and its children do not overlap). '''
+
+  def __init__(self, name=None, label=None):
+    self.name = name
+    self.label = OrderedDict() if label is None else label
+    self.phases = OrderedDict() # time spent in phases
+    self.nbytes = 0; self.nfiles = 0
+    self.wall = None; self.process_peak = None; self.peak_increase = None
+    self._peak0 = None
+    self.children = []
+    self._start = None
+    self._lock = threading.Lock()
+
+  def __nonzero__(self): return True
+
+  def start(self):
+    ''' start wall clock and record the baseline of the process peak memory '''
+    self._start = time.time(); self._peak0 = peakMemory()
+    return self
+
+  def stop(self):
+    ''' stop wall clock and record the process peak memory and its increase since start (N.B.: the increase
+        includes allocations of concurrent records in other threads) '''
+    if self._start is not None: self.wall = time.time() - self._start
+    self.process_peak = peakMemory()
+    if self.process_peak is not None and self._peak0 is not None: 
+      self.peak_increase = self.process_peak - self._peak0
+    return self
+
+  def __enter__(self): return self.start()
+
+  def __exit__(self, *args): self.stop()
+
+  @contextmanager
+  def phase(self, name):
+    ''' context manager that adds the time spent inside to a phase '''
+    t0 = time.time()
+    try: yield self
+    finally:
+      with self._lock: self.phases[name] = self.phases.get(name,0.) + time.time() - t0
+
+  def child(self, name=None, label=None):
+    ''' create and register a child record (e.g. for a cell or dataset) '''
+    record = ProfileRecord(name=name, label=label)
+    with self._lock: self.children.append(record)
+    return record
+
+  def addIO(self, result=None, nbytes=None, nfiles=None):
+    ''' add loaded bytes and opened files (inferred from result, if not given) '''
+    if nbytes is None: nbytes = loadedBytes(result)
+    if nfiles is None: nfiles = openedFiles(result)
+    with self._lock: self.nbytes += nbytes; self.nfiles += nfiles
+
+  def totals(self):
+    ''' phases, bytes and files including all child records '''
+    phases = OrderedDict(self.phases); nbytes = self.nbytes; nfiles = self.nfiles
+    for child in self.children:
+      cphases, cbytes, cfiles = child.totals()
+      for key,value in cphases.iteritems(): phases[key] = phases.get(key,0.) + value
+      nbytes += cbytes; nfiles += cfiles
+    return phases, nbytes, nfiles
+
+  def report(self):
+    ''' return a nested dict with all measurements (suitable for JSON) '''
+    phases, nbytes, nfiles = self.totals()
+    report = OrderedDict(name=self.name)
+    if self.label: report['label'] = self.label
+    report.update(wall=self.wall, bytes=nbytes, files=nfiles, peak_increase=self.peak_increase, 
+                  process_peak=self.process_peak, phases=phases)
+    if self.children: report['children'] = [child.report() for child in self.children]
+    return report
+
+  def _format(self, indent=0):
+    phases, nbytes, nfiles = self.totals()
+    label = ', '.join('{:s}={}'.format(key,value) for key,value in self.label.iteritems())
+    wall = '' if self.wall is None else '{:.3f}s, '.format(self.wall)
+    string = '{:s}{:s}{:s}: {:s}{:.1f} MB, {:d} files'.format(' '*indent, self.name or '',
+                                                               ' ('+label+')' if label else '',
+                                                               wall, nbytes/1024.**2, nfiles)
+    if phases: string += '; ' + ', '.join('{:s} {:.3f}s'.format(key,value) for key,value in phases.iteritems())
+    string += '\n'
+    for child in self.children: string += child._format(indent=indent+2)
+    return string
+
+  def __str__(self): return self._format()
+
+
+class LoadProfile(ProfileRecord):
+  ''' The top-level profile record for a load call; cells and datasets are child records. '''
+
+  def dump(self, filepath):
+    ''' write report to a JSON file '''
+    with open(filepath,'w') as f: json.dump(self.report(), f, indent=2)
+
+
+class _NullRecord(object):
+  ''' a record that does nothing (used when profiling is disabled) '''
+  def __nonzero__(self): return False
+  def start(self): return self
+  def stop(self): return self
+  def __enter__(self): return self
+  def __exit__(self, *args): pass
+  @contextmanager
+  def phase(self, name): yield self
+  def child(self, name=None, label=None): return self
+  def addIO(self, result=None, nbytes=None, nfiles=None): pass
+
+null_record = _NullRecord()
+
+def getProfile(profile, name=None):
+  ''' return a profile record based on a profile argument (a LoadProfile or another ProfileRecord, or 
+      None/False to disable profiling); the profile is passed in by the caller, so that it can be inspected
+      after the load call '''
+  if profile is None or profile is False or profile is null_record: return null_record
+  elif profile is True: 
+    raise ArgumentError, "Pass a LoadProfile instance to record a profile (e.g. profile=LoadProfile())."
+  elif isinstance(profile,ProfileRecord):
+    if profile.name is None: profile.name = name
+    return profile
+  else: raise ArgumentError, profile
@@ -0,0 +1,134 @@
+'''
+Created on Oct 18, 2026
+
+An index of station meta data that computes boolean masks for station selection constraints only once
+(per constraint key and value); expanded constraint lists (e.g. one per province or cluster) are then
+answered by combining cached masks with bitwise operations, instead of rescanning all meta data.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import numpy as np
+# internal imports
+from geodata.base import Dataset, Ensemble, Variable, Axis
+from geodata.misc import ArgumentError, AxisError
+
+# station meta data variables that are used by the constraints
+constraint_vars = dict(min_len='stn_rec_len', lat='stn_lat', lon='stn_lon', max_zerr='zs_err',
+                       prov='stn_prov', end_after='stn_end_date', begin_before='stn_begin_date')
+# N.B.: the cluster variable is specified with the constraint ('cluster_name')
+
+
+## helper functions
+
+def _hashable(value):
+  ''' convert lists to tuples, so that constraint values can be used as dict keys '''
+  if isinstance(value,(list,tuple,np.ndarray)): return tuple(_hashable(val) for val in value)
+  else: return value
+
+def _dateThreshold(var, year):
+  ''' convert a year into the units of a station date variable (e.g. 'month since 1979-01-01') '''
+  units = var.units.lower() if var.units else ''
+  if units.startswith('month'):
+    year0 = int(units.split('since')[1].strip()[:4]) if 'since' in units else 1979
+    return (year - year0)*12
+  else: return year
+
+def takeStations(dataset, indices, stnaxis='station'):
+  ''' create a new Dataset with a subset of stations (by index); variables without station axis are copied '''
+  indices = np.asarray(indices)
+  newds = Dataset(name=dataset.name, title=dataset.title, atts=dataset.atts.copy())
+  newax = None
+  for var in dataset.variables.itervalues():
+    if var.hasAxis(stnaxis):
+      iax = var.axisIndex(stnaxis)
+      if newax is None:
+        oldax = var.getAxis(stnaxis)
+        newax = Axis(name=oldax.name, units=oldax.units, coord=oldax.coord[indices], atts=oldax.atts.copy())
+      axes = list(var.axes); axes[iax] = newax
+      newvar = Variable(name=var.name, units=var.units, axes=axes, data=var.data_array.take(indices, axis=iax),
+                        atts=var.atts.copy())
+      newds.addVariable(newvar)
+    else: newds.addVariable(var.copy())
+  return newds
+
+
+## the station index
+
+class StationIndex(object):
+  ''' An index of station meta data for an Ensemble (or Dataset) with a common station axis; boolean masks
+      for each constraint key and value are computed once and cached. If 'master' is specified, only the
+      meta data of the master dataset is used, otherwise (lall=True) stations have to satisfy the
+      constraints in all datasets that have the relevant meta data. '''
+
+  def __init__(self, ensemble, stnaxis='station', master=None, lall=True):
+    if isinstance(ensemble,Dataset): ensemble = [ensemble]
+    if master is not None:
+      if isinstance(master,basestring): master = [ds for ds in ensemble if ds.name == master]
+      elif isinstance(master,(int,np.integer)): master = [ensemble[master]]
+      else: raise TypeError, master
+      if len(master) != 1: raise ArgumentError, master
+      datasets = master
+    elif lall: datasets = list(ensemble)
+    else: datasets = list(ensemble)[:1]
+    # determine number of stations
+    nstns = set(len(ds.axes[stnaxis]) for ds in ensemble if ds.hasAxis(stnaxis))
+    if len(nstns) != 1: raise AxisError, "Station axes are not consistent: {}".format(nstns)
+    self.nstn = nstns.pop()
+    self.stnaxis = stnaxis
+    self.datasets = datasets
+    self.masks = dict() # cache for masks
+    self.meta = dict() # cache for meta data arrays
+
+  def _metaData(self, varname):
+    ''' return a list of meta data variables (one per dataset that has it) '''
+    if varname not in self.meta:
+      self.meta[varname] = [ds[varname].load() for ds in self.datasets if varname in ds]
+    return self.meta[varname]
+
+  def _computeMask(self, key, value, cluster_name=None):
+    ''' compute a boolean mask for a single constraint (not cached) '''
+    mask = np.ones((self.nstn,), dtype=np.bool)
+    varname = cluster_name if key == 'cluster' else constraint_vars.get(key,None)
+    if varname is None: raise ArgumentError, "Unknown station constraint: '{:s}'".format(key)
+    for var in self._metaData(varname):
+      data = var.data_array
+      if isinstance(data,np.ma.MaskedArray): data = data.filled(np.NaN if data.dtype.kind == 'f' else 0)
+      if key == 'min_len': mask &= data >= value
+      elif key == 'max_zerr': mask &= np.abs(data) <= value
+      elif key in ('lat','lon'): mask &= ( data >= value[0] ) & ( data <= value[1] )
+      elif key == 'end_after': mask &= data >= _dateThreshold(var, value)
+      elif key == 'begin_before': mask &= data <= _dateThreshold(var, value)
+      elif key in ('prov','cluster'): mask &= data == value
+    return mask
+
+  def mask(self, key, value, cluster_name=None):
+    ''' return the (cached) boolean mask for a constraint; lists of provinces or clusters are combined
+        from the individual masks with a logical or '''
+    if key in ('prov','cluster') and isinstance(value,(list,tuple,np.ndarray)):
+      return np.logical_or.reduce([self.mask(key, val, cluster_name=cluster_name) for val in value])
+    ckey = (key, _hashable(value), cluster_name if key == 'cluster' else None)
+    if ckey not in self.masks:
+      self.masks[ckey] = self._computeMask(key, value, cluster_name=cluster_name)
+    return self.masks[ckey]
+
+  def select(self, constraints):
+    ''' return the combined boolean mask for a constraint dict '''
+    constraints = constraints.copy()
+    cluster_name = constraints.pop('cluster_name',None)
+    mask = np.ones((self.nstn,), dtype=np.bool)
+    for key,value in constraints.iteritems():
+      if value is not None: mask &= self.mask(key, value, cluster_name=cluster_name)
+    return mask
+
+  def indices(self, constraints):
+    ''' return the indices of stations that satisfy the constraints '''
+    return np.flatnonzero(self.select(constraints))
+
+  def selectEnsemble(self, ensemble, constraints):
+    ''' apply constraints to an Ensemble and return a new Ensemble with the selected stations '''
+    indices = self.indices(constraints)
+    members = [takeStations(ds, indices, stnaxis=self.stnaxis) if ds.hasAxis(self.stnaxis) else ds
+               for ds in ensemble]
+    return Ensemble(*members, name=ensemble.ens_name, title=ensemble.ens_title, basetype=ensemble.basetype)
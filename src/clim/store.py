@@ -0,0 +1,224 @@
+'''
+Created on Oct 18, 2026
+
+A memory-mapped columnar store for shape-averaged ('shpavg') time-series: all time-dependent variables of
+an experiment (or observational dataset) are packed into a single array with axes (variable, shape, time),
+so that loading a basin for many experiments only requires a few memory-mapped slices instead of opening
+every NetCDF file; the small shape meta data and the axes are stored in a JSON header.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import os, json
+import numpy as np
+from warnings import warn
+# internal imports
+from geodata.base import Dataset, Variable, Axis
+from geodata.misc import ArgumentError, DatasetError, EmptyDatasetError
+from datasets.common import loadDataset, shp_params
+from clim.cache import fileStats, sourceFiles
+
+# some definitions
+default_folder = os.getenv('CLIM_STORE', os.path.join(os.path.expanduser('~'),'.clim_store'))
+data_file = 'shpavg.npy'
+meta_file = 'shpavg.json'
+store_slices = ('shape_name','years') # slices that can be applied by the store
+
+
+## helper functions
+
+def storeName(name, domain=None):
+  ''' name of the store folder for a dataset/experiment (and domain) '''
+  if not isinstance(name,basestring): name = name.name # experiment objects
+  return name if domain is None else '{:s}_d{:02d}'.format(name, domain)
+
+def _jsonAtts(atts):
+  ''' only keep attributes that can be stored in JSON '''
+  return {key:value for key,value in atts.iteritems() if isinstance(value,(basestring,int,long,float,bool))}
+
+def _jsonValues(array):
+  ''' convert a (small) array into a JSON list '''
+  if isinstance(array,np.ma.MaskedArray): array = array.filled(np.NaN if array.dtype.kind == 'f' else 0)
+  return np.asarray(array).tolist()
+
+
+## the store class
+
+class ShapeStore(object):
+  ''' A memory-mapped columnar store with axes (variable, shape, time) for the shape-averaged time-series of
+      a single dataset; the data array is only mapped into memory and slices are read when they are used. '''
+
+  def __init__(self, name, domain=None, folder=None):
+    ''' open store (read-only) '''
+    self.name = storeName(name, domain=domain)
+    self.folder = os.path.join(default_folder if folder is None else folder, self.name)
+    if not self.exists(name, domain=domain, folder=folder): raise IOError, "No store for '{:s}'.".format(self.name)
+    with open(os.path.join(self.folder,meta_file),'r') as f: self.meta = json.load(f)
+    self.data = np.load(os.path.join(self.folder,data_file), mmap_mode='r')
+    self.variables = [var['name'] for var in self.meta['variables']]
+    self.shapes = self.meta['params']['shape_name']['values']
+
+  @staticmethod
+  def exists(name, domain=None, folder=None):
+    ''' check if a store for this dataset exists '''
+    folder = os.path.join(default_folder if folder is None else folder, storeName(name, domain=domain))
+    return os.path.exists(os.path.join(folder,meta_file)) and os.path.exists(os.path.join(folder,data_file))
+
+  def isValid(self):
+    ''' check that the source files have not changed since the store was written '''
+    sources = self.meta.get('sources',[])
+    stats = fileStats([stat[0] for stat in sources])
+    return all(tuple(new) == tuple(old) for new,old in zip(stats,sources))
+
+  def hasVariables(self, varlist):
+    ''' check if all (time-dependent) variables are in the store; shape meta data are optional, like in 
+        loadDataset (e.g. 2D shape masks are not stored) '''
+    return all(var in self.variables or var in self.meta['params'] or var in shp_params for var in varlist)
+
+  def _shapeIndices(self, shape_name=None):
+    ''' indices of the selected shapes '''
+    if shape_name is None: return np.arange(len(self.shapes))
+    names = [shape_name] if isinstance(shape_name,basestring) else list(shape_name)
+    indices = [self.shapes.index(name) for name in names if name in self.shapes]
+    if len(indices) == 0: raise EmptyDatasetError, "No shapes {} in store '{:s}'.".format(names, self.name)
+    return np.asarray(indices)
+
+  def _timeSlice(self, years=None):
+    ''' time slice for a period (based on units 'month since YYYY-MM') '''
+    coord = np.asarray(self.meta['time']['coord'])
+    if years is None: return slice(0,len(coord))
+    if isinstance(years,(int,np.integer)): years = (years,years+1)
+    units = self.meta['time']['units'].lower()
+    year0 = int(units.split('since')[1].strip()[:4]) if 'since' in units else 0
+    i0,i1 = np.searchsorted(coord, [(years[0]-year0)*12, (years[1]-year0)*12])
+    if i1 <= i0: raise EmptyDatasetError, "No data in period {} in store '{:s}'.".format(years, self.name)
+    return slice(i0,i1)
+
+  def read(self, varlist=None, shape_name=None, years=None, **slices):
+    ''' read selected variables, shapes and years into an in-memory Dataset with axes (time, shape), like 
+        the original datasets (only the selected slices are read from disk) '''
+    if slices: raise ArgumentError, "Unsupported slices for store: {}".format(slices.keys())
+    if varlist is None: varlist = self.variables + self.meta['params'].keys()
+    ishp = self._shapeIndices(shape_name)
+    tslc = self._timeSlice(years)
+    # axes
+    meta = self.meta
+    shpcoord = np.asarray(meta['shape']['coord'])[ishp]
+    shpax = Axis(name='shape', units=meta['shape']['units'], coord=shpcoord, atts=meta['shape']['atts'])
+    tcoord = np.asarray(meta['time']['coord'])[tslc]
+    tax = Axis(name='time', units=meta['time']['units'], coord=tcoord, atts=meta['time']['atts'])
+    # variables
+    dataset = Dataset(name=meta['name'], title=meta['title'], atts=meta['atts'].copy())
+    for ivar,var in enumerate(meta['variables']):
+      if var['name'] in varlist:
+        data = self.data[ivar,ishp,tslc] # fancy indexing on the memory map only reads the selection
+        data = np.ascontiguousarray(data.T, dtype=var['dtype']) # same axis order as the NetCDF files
+        dataset.addVariable(Variable(name=var['name'], units=var['units'], axes=(tax,shpax), data=data,
+                                     atts=var['atts']))
+    for varname,param in meta['params'].iteritems():
+      if varname in varlist:
+        values = np.asarray(param['values'])[ishp]
+        dataset.addVariable(Variable(name=varname, units=param['units'], axes=(shpax,), data=values,
+                                     atts=param['atts']))
+    return dataset
+
+  def __str__(self):
+    return '{:s}: {:d} variables, {:d} shapes, {:d} time steps ({:.1f} MB)'.format(
+             self.name, len(self.variables), len(self.shapes), self.data.shape[2], self.data.nbytes/1024.**2)
+
+
+# helper to determine the store folder in load functions
+def storeFolder(store):
+  ''' return the store folder based on a store argument (True for the default folder or a folder); stores 
+      are only used if they are requested, so None and False disable stores '''
+  if store is None or store is False: return None
+  elif store is True: return default_folder
+  elif isinstance(store,basestring): return store
+  else: raise ArgumentError, store
+
+# helper to open stores in load functions
+def openStore(name, domain=None, folder=None, varlist=None, slices=None):
+  ''' return a ShapeStore, if it exists, is valid and can serve the variables and slices, otherwise None '''
+  if folder is False: return None
+  if slices and not all(key in store_slices for key in slices): return None
+  if not ShapeStore.exists(name, domain=domain, folder=folder): return None
+  store = ShapeStore(name, domain=domain, folder=folder)
+  if not store.isValid():
+    warn("Source files of store '{:s}' have changed - please re-export.".format(store.name)); return None
+  if varlist is not None and not store.hasVariables(varlist): return None
+  return store
+
+
+## export/ingest
+
+def exportStore(name, varlist=None, domain=None, filetypes=None, folder=None, shape='shpavg', lprint=True,
+                **kwargs):
+  ''' load the shape-averaged time-series of a dataset and pack all time-dependent variables into a
+      memory-mapped columnar store; kwargs are passed to loadDataset '''
+  dataset = loadDataset(name=name, varlist=varlist, domains=domain, filetypes=filetypes, shape=shape,
+                        mode='time-series', **kwargs)
+  if not dataset.hasAxis('shape') or not dataset.hasAxis('time'):
+    raise DatasetError, "Dataset '{:s}' does not have shape and time axes.".format(dataset.name)
+  sources = sourceFiles([dataset])
+  dataset = dataset.load()
+  shpax = dataset.axes['shape']; tax = dataset.axes['time']
+  # collect variables
+  variables = []; params = dict(); columns = []
+  for var in dataset.variables.itervalues():
+    axes = set(ax.name for ax in var.axes)
+    if axes == set(('shape','time')):
+      data = var.data_array
+      if var.axisIndex('shape') > var.axisIndex('time'): data = data.T
+      if isinstance(data,np.ma.MaskedArray): data = data.astype(np.float64).filled(np.NaN)
+      columns.append(data)
+      variables.append(dict(name=var.name, units=var.units, atts=_jsonAtts(var.atts), dtype=str(data.dtype)))
+    elif axes == set(('shape',)):
+      params[var.name] = dict(units=var.units, atts=_jsonAtts(var.atts), values=_jsonValues(var.data_array))
+    elif lprint: warn("Skipping variable '{:s}' with axes {}.".format(var.name, tuple(axes)))
+  if 'shape_name' not in params: raise DatasetError, "Dataset '{:s}' does not have shape names.".format(dataset.name)
+  if len(columns) == 0: raise EmptyDatasetError, "No time-series in dataset '{:s}'.".format(dataset.name)
+  dtype = np.result_type(*columns)
+  # write data and header (atomically)
+  root = folder
+  folder = os.path.join(default_folder if root is None else root, storeName(name, domain=domain))
+  if not os.path.exists(folder): os.makedirs(folder)
+  filepath = os.path.join(folder,data_file)
+  with open(filepath+'.tmp','wb') as f: np.save(f, np.stack(columns).astype(dtype))
+  os.rename(filepath+'.tmp', filepath)
+  meta = dict(name=dataset.name, title=dataset.title, atts=_jsonAtts(dataset.atts), variables=variables,
+              params=params, sources=fileStats(sources),
+              shape=dict(units=shpax.units, atts=_jsonAtts(shpax.atts), coord=_jsonValues(shpax.coord)),
+              time=dict(units=tax.units, atts=_jsonAtts(tax.atts), coord=_jsonValues(tax.coord)))
+  filepath = os.path.join(folder,meta_file)
+  with open(filepath+'.tmp','w') as f: json.dump(meta, f)
+  os.rename(filepath+'.tmp', filepath)
+  return ShapeStore(name, domain=domain, folder=root)
+
+def exportStores(names, WRF_ens=None, CESM_ens=None, **kwargs):
+  ''' export stores for a list of datasets/experiments (ensemble names are expanded); datasets that can not
+      be loaded are skipped with a warning '''
+  if isinstance(names,basestring): names = [names]
+  members = []
+  for name in names:
+    if WRF_ens and name in WRF_ens: members.extend(WRF_ens[name])
+    elif CESM_ens and name in CESM_ens: members.extend(CESM_ens[name])
+    else: members.append(name)
+  stores = []
+  for name in members:
+    try: stores.append(exportStore(name, **kwargs))
+    except (DatasetError, IOError) as err: warn("Skipping '{:s}': {}".format(storeName(name), err))
+  return stores
+
+
+if __name__ == '__main__':
+
+  from projects.WesternCanada.WRF_experiments import WRF_exps, WRF_ens
+
+  # settings for export
+  names = ['max-ens','max-ens-2050','max-ens-2100']
+  domain = 2; filetypes = ['hydro','srfc','lsm']
+
+  # export shape-averaged time-series of all members
+  stores = exportStores(names, WRF_ens=WRF_ens, WRF_exps=WRF_exps, domain=domain, filetypes=filetypes)
+  print('\n{:d} stores written to {:s}'.format(len(stores), default_folder))
@@ -0,0 +1,91 @@
+'''
+Created on Oct 18, 2026
+
+A persistent on-disk cache for fitted distribution parameters (see eva.fitting): entries are keyed on a
+content hash of the sample array and all arguments that affect the fit (distribution, sample axis, fit
+arguments, bootstrap and cross-validation settings and random seeds) and stored as compressed NumPy
+archives with size-bounded LRU eviction, so that repeated fits of identical samples can be skipped; fit
+states (parameters and sample fingerprints by location) can be stored as well, for incremental refits.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import os, hashlib, time
+import numpy as np
+# internal imports
+from geodata.misc import ArgumentError
+from clim.cache import EnsembleCache, getCacheKey, default_folder, atomicWrite
+
+# some definitions
+default_fit_folder = os.path.join(default_folder,'fits')
+# arguments that do not affect fit results (results do not depend on the number of workers)
+fit_ignore_args = ('nproc','executor','cache')
+
+
+## helper functions to generate cache keys
+
+def sampleFingerprint(data):
+  ''' content hash of a sample array (shape, values and mask; masked values are treated like NaN) '''
+  data = np.asanyarray(data)
+  if isinstance(data,np.ma.MaskedArray): data = data.astype(np.float64).filled(np.NaN)
+  fingerprint = hashlib.sha1(repr((data.shape, data.dtype.str)))
+  fingerprint.update(np.ascontiguousarray(data).tobytes())
+  return fingerprint.hexdigest()
+
+def getFitKey(fct_name, data, **kwargs):
+  ''' compute a cache key from a fit function name, a sample array and the fit arguments '''
+  kwargs = {key:value for key,value in kwargs.iteritems() if key not in fit_ignore_args}
+  return getCacheKey(fct_name, fingerprint=sampleFingerprint(data), **kwargs)
+
+def getStateKey(dataset, varname, **kwargs):
+  ''' compute a cache key for the fit state of a variable (independent of the samples, for incremental refits) '''
+  kwargs = {key:value for key,value in kwargs.iteritems() if key not in fit_ignore_args}
+  return getCacheKey('fitState', dataset=dataset, varname=varname, **kwargs)
+
+
+## the cache class
+
+class FitCache(EnsembleCache):
+  ''' A persistent on-disk cache for fitted parameter arrays with size-bounded LRU eviction; entries are
+      stored as compressed NumPy archives (one per fitted variable) and do not depend on source files. '''
+
+  def __init__(self, folder=None, max_size=None):
+    super(FitCache,self).__init__(folder=default_fit_folder if folder is None else folder, max_size=max_size)
+
+  def _entryPath(self, key):
+    return os.path.join(self.folder,key+'.npz')
+
+  def isValid(self, key):
+    ''' check if an entry exists (fitted parameters are keyed on the samples, not on source files) '''
+    return self._lookup(key) is not None and os.path.exists(self._entryPath(key))
+
+  def get(self, key, default=None):
+    ''' retrieve a dict of arrays from the cache (or return default) '''
+    if not self.isValid(key):
+      if key in self.index: self.remove(key)
+      return default
+    try:
+      with np.load(self._entryPath(key)) as archive: arrays = {name:archive[name] for name in archive.files}
+    except (IOError, EOFError): return default # removed by another instance
+    self._touch(key) # update access time for LRU eviction
+    return arrays
+
+  def put(self, key, arrays, name=None):
+    ''' store a dict of arrays (e.g. parameters, including a bootstrap axis) '''
+    if not isinstance(arrays,dict): raise TypeError, arrays
+    filepath = self._entryPath(key)
+    atomicWrite(filepath, lambda f: np.savez_compressed(f, **arrays))
+    entry = dict(name=name, size=os.path.getsize(filepath), atime=time.time(), ctime=time.time(), sources=[])
+    self._updateIndex(entries={key:entry})
+    return arrays
+
+
+# helper to interpret cache arguments in fit functions
+def getFitCache(cache):
+  ''' return a fit cache instance based on a cache argument (True, folder or FitCache) '''
+  if cache is None or cache is False: return None
+  elif cache is True: return FitCache()
+  elif isinstance(cache,basestring): return FitCache(folder=cache)
+  elif isinstance(cache,FitCache): return cache
+  else: raise ArgumentError, cache
@@ -0,0 +1,662 @@
+'''
+Created on Oct 18, 2026
+
+A batched fitting engine for extreme value analysis: distributions are fitted to all stations (or other
+locations) at once, using vectorized NumPy objective and gradient evaluations across the batch axes and
+a batched quasi-Newton optimizer, instead of one scalar optimization per location; alternatively,
+parameters can be estimated in closed form from sample L-moments (which also serve as starting values
+for maximum likelihood); fits can be bootstrapped and cross-validated in parallel; parameters follow the
+conventions of scipy.stats (shape parameters first, then location and scale).
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import zlib, hashlib, threading
+from warnings import warn
+import numpy as np
+import scipy.stats as ss
+from scipy.special import smirnov, gammaln
+# internal imports
+from geodata.base import Dataset, Ensemble, Variable, Axis
+from geodata.misc import ArgumentError, AxisError
+from geodata.stats import VarRV
+from datasets.common import stn_params, shp_params
+from clim.batch import executeBatch, getNproc
+from eva.cache import getFitKey, getStateKey
+
+# some definitions
+dist_aliases = dict(gev='genextreme', genextreme='genextreme', gumbel='gumbel_r', gumbel_r='gumbel_r',
+                    norm='norm', normal='norm', pearson3='pearson3', pe3='pearson3')
+dist_params = dict(genextreme=3, gumbel_r=2, norm=2, pearson3=3) # number of parameters
+method_list = ('mle','lmoments')
+mle_dists = ('genextreme','gumbel_r','norm') # distributions with maximum likelihood estimators
+euler_gamma = 0.5772156649015329
+min_shape = 1e-7 # the GEV shape parameter is kept away from zero (Gumbel limit)
+default_dist = 'gev' # suggested distribution for batched fits (see distName)
+cv_suffix = '_cv' # suffix for cross-validation variables
+bootstrap_args = ('lbootstrap','nbs','seed','indices','salt') # not used for cross-validation
+
+
+## helper functions
+
+def distName(dist):
+  ''' return the scipy.stats name of a distribution that can be fitted in batches '''
+  if dist is None: raise ArgumentError, "A distribution is required for batched fits (e.g. '{:s}').".format(default_dist)
+  elif not isinstance(dist,basestring): raise TypeError, dist
+  if dist.lower() not in dist_aliases: raise ArgumentError, "No batched fit for distribution '{:s}'.".format(dist)
+  return dist_aliases[dist.lower()]
+
+def _prepareSamples(samples, axis=-1):
+  ''' move sample axis to the end and convert to float with NaN for invalid values '''
+  if isinstance(samples,np.ma.MaskedArray): samples = samples.astype(np.float64).filled(np.NaN)
+  else: samples = np.asarray(samples, dtype=np.float64)
+  samples = np.rollaxis(samples, axis, samples.ndim)
+  shape = samples.shape[:-1]
+  samples = samples.reshape((-1,samples.shape[-1])) # batch, sample
+  valid = np.isfinite(samples)
+  return np.where(valid, samples, 0.), valid.astype(np.float64), shape
+
+def _standardize(x, w):
+  ''' weighted mean and standard deviation of each sample and standardized samples '''
+  n = np.maximum(w.sum(axis=1), 1.)
+  mean = (w*x).sum(axis=1)/n
+  std = np.sqrt((w*(x-mean[:,np.newaxis])**2).sum(axis=1)/n)
+  std = np.where(std > 0, std, 1.)
+  return (x-mean[:,np.newaxis])/std[:,np.newaxis]*w, mean, std
+
+
+## L-moments (closed form estimators)
+
+def sampleLMoments(x, w):
+  ''' first three sample L-moments (l1, l2 and the L-skewness t3) based on unbiased probability weighted
+      moments of the sorted valid samples (batch along first axis, samples along second axis) '''
+  n = w.sum(axis=1)[:,np.newaxis]
+  xs = np.sort(np.where(w > 0, x, np.inf), axis=1) # invalid values are sorted to the end
+  j = np.arange(x.shape[1], dtype=np.float64)[np.newaxis,:] # rank - 1
+  lvalid = j < n
+  xs = np.where(lvalid, xs, 0.)
+  b0 = xs.sum(axis=1)/n[:,0]
+  b1 = ( xs*np.where(lvalid, j/np.maximum(n-1,1), 0.) ).sum(axis=1)/n[:,0]
+  b2 = ( xs*np.where(lvalid, j*(j-1)/np.maximum((n-1)*(n-2),1), 0.) ).sum(axis=1)/n[:,0]
+  l1 = b0; l2 = 2*b1 - b0; l3 = 6*b2 - 6*b1 + b0
+  t3 = l3/np.where(l2 > 0, l2, np.NaN)
+  return l1, l2, t3
+
+def _lmomNorm(l1, l2, t3):
+  return np.stack([l1, l2*np.sqrt(np.pi)], axis=1)
+
+def _lmomGumbel(l1, l2, t3):
+  scale = l2/np.log(2.)
+  return np.stack([l1 - euler_gamma*scale, scale], axis=1)
+
+def _lmomGEV(l1, l2, t3):
+  ''' GEV parameters from L-moments (Hosking et al., 1985); the shape parameter k of Hosking is identical
+      to the shape parameter c of scipy.stats.genextreme '''
+  z = 2./(3.+t3) - np.log(2.)/np.log(3.)
+  c = 7.8590*z + 2.9554*z**2
+  c = np.where(np.abs(c) < min_shape, np.where(c < 0, -min_shape, min_shape), c)
+  gamma = np.exp(gammaln(1.+np.maximum(c,-0.999)))
+  scale = l2*c/((1.-2.**(-c))*gamma)
+  loc = l1 - scale*(1.-gamma)/c
+  return np.stack([c, loc, scale], axis=1)
+
+def _lmomPearson3(l1, l2, t3):
+  ''' Pearson type III parameters (skewness, mean and standard deviation, like scipy.stats.pearson3) from
+      L-moments, using the rational approximations of Hosking and Wallis (1997) '''
+  at3 = np.abs(t3)
+  tm = np.where(at3 >= 1./3., 1.-at3, 3.*np.pi*t3**2)
+  alpha_hi = tm*(0.36067 + tm*(-0.59567 + tm*0.25361))/(1. + tm*(-2.78861 + tm*(2.56096 - tm*0.77045)))
+  alpha_lo = (1. + 0.2906*tm)/(tm*(1. + tm*(0.1882 + 0.0442*tm)))
+  alpha = np.where(at3 >= 1./3., alpha_hi, np.where(tm > 0, alpha_lo, np.inf))
+  skew = np.where(np.isfinite(alpha), 2.*np.sign(t3)/np.sqrt(alpha), 0.)
+  ratio = np.exp(gammaln(np.minimum(alpha,1e8)) - gammaln(np.minimum(alpha,1e8)+0.5))
+  scale = np.where(np.isfinite(alpha), l2*np.sqrt(np.pi)*np.sqrt(alpha)*ratio, l2*np.sqrt(np.pi))
+  return np.stack([skew, l1, scale], axis=1)
+
+lmoment_estimators = dict(genextreme=_lmomGEV, gumbel_r=_lmomGumbel, norm=_lmomNorm, pearson3=_lmomPearson3)
+
+def _fitLMoments(dist, x, w):
+  ''' parameter estimates based on sample L-moments (closed form, no iterations) '''
+  with np.errstate(invalid='ignore', divide='ignore'):
+    return lmoment_estimators[dist](*sampleLMoments(x, w))
+
+
+## negative log-likelihoods and gradients (batch along first axis, samples along second axis)
+
+def _gumbelNLL(theta, x, w):
+  ''' negative log-likelihood and gradient of the Gumbel distribution for theta = (loc, log(scale)) '''
+  loc = theta[:,0:1]; logscale = theta[:,1:2]
+  z = (x - loc)/np.exp(logscale)
+  ez = np.exp(-z)
+  nll = ( w*(logscale + z + ez) ).sum(axis=1)
+  grad = np.empty_like(theta)
+  grad[:,0] = ( w*(ez - 1.) ).sum(axis=1)/np.exp(logscale[:,0])
+  grad[:,1] = ( w*(1. - z*(1. - ez)) ).sum(axis=1)
+  return nll, grad
+
+def _gevNLL(theta, x, w):
+  ''' negative log-likelihood and gradient of the GEV distribution (scipy.stats.genextreme) for
+      theta = (c, loc, log(scale)); outside of the support the likelihood is infinite '''
+  c = theta[:,0:1]; loc = theta[:,1:2]; logscale = theta[:,2:3]
+  c = np.where(np.abs(c) < min_shape, np.where(c < 0, -min_shape, min_shape), c)
+  z = (x - loc)/np.exp(logscale)
+  t = 1. - c*z
+  lsupport = np.all((t > 0) | (w == 0), axis=1)
+  t = np.where((t > 0) & (w > 0), t, 1.)
+  y = np.log(t)
+  u = np.exp(y/c)
+  nll = ( w*(logscale + (1. - 1./c)*y + u) ).sum(axis=1)
+  dt = ( (1. - 1./c) + u/c )/t # derivative of sample NLL w.r.t. t
+  grad = np.empty_like(theta)
+  grad[:,0] = ( w*( y/c**2 - (1. - 1./c)*z/t - u*(y/c**2 + z/(c*t)) ) ).sum(axis=1)
+  grad[:,1] = ( w*dt*c ).sum(axis=1)/np.exp(logscale[:,0])
+  grad[:,2] = ( w*(1. + dt*c*z) ).sum(axis=1)
+  nll = np.where(lsupport, nll, np.inf)
+  return nll, grad
+
+
+## batched quasi-Newton optimizer
+
+def minimizeBatch(fct, theta0, maxiter=200, gtol=1e-6, maxls=30):
+  ''' minimize independent objectives for a batch of parameter vectors with BFGS; fct(theta, index) returns 
+      the objectives and gradients (batch, nparams) for the parameter vectors theta of the batch elements 
+      in index; returns parameters, objectives and a convergence flag (batch) '''
+  theta = np.array(theta0, dtype=np.float64)
+  nbatch, npar = theta.shape
+  with np.errstate(over='ignore', invalid='ignore', divide='ignore'): # trial steps can leave the support
+    return _minimizeBatch(fct, theta, nbatch, npar, maxiter=maxiter, gtol=gtol, maxls=maxls)
+
+def _minimizeBatch(fct, theta, nbatch, npar, maxiter=200, gtol=1e-6, maxls=30):
+  ''' implementation of minimizeBatch (floating point errors are handled by caller) '''
+  f, g = fct(theta, np.arange(nbatch))
+  H = np.tile(np.eye(npar), (nbatch,1,1)) # inverse Hessian approximations
+  active = np.isfinite(f)
+  converged = np.zeros(nbatch, dtype=np.bool)
+  for _ in xrange(maxiter):
+    converged |= active & ( np.abs(g).max(axis=1) < gtol )
+    active &= ~converged
+    if not np.any(active): break
+    ia = np.flatnonzero(active)
+    p = -np.einsum('bij,bj->bi', H[ia], g[ia])
+    slope = (p*g[ia]).sum(axis=1)
+    lreset = slope >= 0 # not a descent direction: reset to steepest descent
+    if np.any(lreset):
+      H[ia[lreset]] = np.eye(npar); p[lreset] = -g[ia[lreset]]; slope[lreset] = -(g[ia[lreset]]**2).sum(axis=1)
+    # backtracking line search (Armijo condition) for all active parameter vectors at once
+    alpha = np.ones(len(ia))
+    fnew = np.empty(len(ia)); gnew = np.empty((len(ia),npar))
+    todo = np.arange(len(ia))
+    for _ in xrange(maxls):
+      ft, gt = fct(theta[ia[todo]] + alpha[todo,np.newaxis]*p[todo], ia[todo])
+      ok = np.isfinite(ft) & ( ft <= f[ia[todo]] + 1e-4*alpha[todo]*slope[todo] )
+      fnew[todo[ok]] = ft[ok]; gnew[todo[ok]] = gt[ok]
+      todo = todo[~ok]; alpha[todo] *= 0.5
+      if len(todo) == 0: break
+    lfail = np.zeros(len(ia), dtype=np.bool); lfail[todo] = True
+    converged[ia[lfail]] = True # no further progress possible
+    ok = ~lfail; io = ia[ok]
+    s = alpha[ok,np.newaxis]*p[ok]; yg = gnew[ok] - g[io]
+    theta[io] += s; f[io] = fnew[ok]; g[io] = gnew[ok]
+    # BFGS update of inverse Hessian (skipped, if curvature condition is violated)
+    sy = (s*yg).sum(axis=1)
+    lupd = sy > 1e-12
+    if np.any(lupd):
+      s = s[lupd]; yg = yg[lupd]; rho = 1./sy[lupd]; iu = io[lupd]
+      I = np.eye(npar)[np.newaxis]
+      A = I - rho[:,np.newaxis,np.newaxis]*np.einsum('bi,bj->bij', s, yg)
+      H[iu] = np.einsum('bij,bjk,blk->bil', A, H[iu], A) + rho[:,np.newaxis,np.newaxis]*np.einsum('bi,bj->bij', s, s)
+  converged |= active & ( np.abs(g).max(axis=1) < gtol )
+  return theta, f, converged
+
+
+## batched fitting
+
+def _fitNorm(x, w):
+  ''' maximum likelihood estimate of the normal distribution (closed form) '''
+  n = np.maximum(w.sum(axis=1), 1.)
+  loc = (w*x).sum(axis=1)/n
+  scale = np.sqrt((w*(x-loc[:,np.newaxis])**2).sum(axis=1)/n)
+  return np.stack([loc,scale], axis=1)
+
+def _warmStart(theta0, params0, ntheta):
+  ''' replace starting points with previous parameters (where available; scale parameter as logarithm) '''
+  if params0 is not None:
+    lwarm = np.all(np.isfinite(params0), axis=1) & (params0[:,-1] > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+      theta0[lwarm] = np.concatenate([params0[lwarm,:ntheta-1], np.log(params0[lwarm,-1:])], axis=1)
+  return theta0
+
+def _fitGumbel(x, w, params0=None, **kwargs):
+  ''' maximum likelihood estimate of the Gumbel distribution (on standardized samples, starting from the 
+      L-moment estimate or from previous parameters) '''
+  lmom = _fitLMoments('gumbel_r', x, w) # L-moment estimate as starting point
+  theta0 = np.stack([lmom[:,0], np.log(np.maximum(lmom[:,1],1e-3))], axis=1)
+  theta0 = _warmStart(theta0, params0, 2)
+  theta, nll, converged = minimizeBatch(lambda theta, idx: _gumbelNLL(theta, x[idx], w[idx]), theta0, **kwargs)
+  params = np.stack([theta[:,0], np.exp(theta[:,1])], axis=1)
+  return params, converged
+
+def _fitGEV(x, w, params0=None, **kwargs):
+  ''' maximum likelihood estimate of the GEV distribution (on standardized samples, starting from previous
+      parameters or the L-moment estimate, or from the Gumbel fit, if the starting point is not inside the
+      support) '''
+  lmom = _fitLMoments('genextreme', x, w)
+  theta0 = np.stack([lmom[:,0], lmom[:,1], np.log(np.abs(lmom[:,2]))], axis=1)
+  theta0 = _warmStart(theta0, params0, 3)
+  with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+    lstart = np.isfinite(_gevNLL(theta0, x, w)[0]) & np.all(np.isfinite(theta0), axis=1)
+  if not np.all(lstart):
+    ig = np.flatnonzero(~lstart)
+    gumbel, gconverged = _fitGumbel(x[ig], w[ig], **kwargs)
+    theta0[ig] = np.stack([np.full(len(ig), 0.1), gumbel[:,0], np.log(gumbel[:,1])], axis=1)
+    # make sure the initial guess is inside the support
+    z = ( x[ig] - theta0[ig,1:2] )/np.exp(theta0[ig,2:3])
+    zmax = np.where(w[ig] > 0, z, -np.inf).max(axis=1)
+    theta0[ig,0] = np.where(zmax > 0, np.minimum(0.1, 0.5/np.maximum(zmax,1e-3)), 0.1)
+  theta, nll, converged = minimizeBatch(lambda theta, idx: _gevNLL(theta, x[idx], w[idx]), theta0, **kwargs)
+  params = np.stack([theta[:,0], theta[:,1], np.exp(theta[:,2])], axis=1)
+  return params, converged
+
+def fitBatch(samples, dist='gev', axis=-1, method='mle', nmin=None, lconverged=False, params0=None, **kwargs):
+  ''' fit a distribution to the samples along axis for all other indices at once, using maximum likelihood
+      (method='mle') or L-moments (method='lmoments'); returns an array of parameters with the parameter 
+      axis in place of the sample axis (last); invalid values (NaN or masked) are ignored and parameters 
+      are NaN, if there are fewer than nmin valid samples; previous parameters (params0, parameter axis 
+      last, NaN for no warm start) are used as starting points for maximum likelihood; kwargs are passed 
+      to the optimizer (see minimizeBatch) '''
+  dist = distName(dist)
+  if method not in method_list: raise ArgumentError, "Unknown fit method '{}'.".format(method)
+  if method == 'mle' and dist not in mle_dists: 
+    raise ArgumentError, "No batched maximum likelihood fit for '{:s}' - use L-moments.".format(dist)
+  npar = dist_params[dist]
+  if nmin is None: nmin = npar + 1
+  x, w, shape = _prepareSamples(samples, axis=axis)
+  lvalid = w.sum(axis=1) >= nmin
+  params = np.full((x.shape[0],npar), np.NaN)
+  converged = np.zeros(x.shape[0], dtype=np.bool)
+  if np.any(lvalid):
+    xs, mean, std = _standardize(x[lvalid], w[lvalid]) # fit standardized samples
+    if params0 is not None: # standardize starting points
+      params0 = np.asarray(params0, dtype=np.float64).reshape((-1,npar))[lvalid].copy()
+      params0[:,-2] = (params0[:,-2] - mean)/std; params0[:,-1] = params0[:,-1]/std
+      kwargs['params0'] = params0
+    if method == 'lmoments': 
+      sparams = _fitLMoments(dist, xs, w[lvalid]); sconverged = np.all(np.isfinite(sparams), axis=1)
+    elif dist == 'norm': sparams = _fitNorm(xs, w[lvalid]); sconverged = True
+    elif dist == 'gumbel_r': sparams, sconverged = _fitGumbel(xs, w[lvalid], **kwargs)
+    elif dist == 'genextreme': sparams, sconverged = _fitGEV(xs, w[lvalid], **kwargs)
+    # transform back: shape is invariant, location and scale are rescaled
+    sparams[:,-2] = mean + std*sparams[:,-2]
+    sparams[:,-1] = std*sparams[:,-1]
+    params[lvalid] = sparams; converged[lvalid] = sconverged
+  params = params.reshape(shape+(npar,))
+  return (params, converged.reshape(shape)) if lconverged else params
+
+
+## parallel bootstrap
+
+def bootstrapIndices(nsamples, replicates, seed, salt=None):
+  ''' resampling indices for bootstrap replicates (one row per replicate); every replicate has its own 
+      random stream that is derived from the seed, the replicate number and an optional salt (e.g. for
+      different variables), so that indices do not depend on how replicates are distributed among workers '''
+  key = [seed] if salt is None else [seed,salt]
+  return np.stack([np.random.RandomState(key+[rep]).randint(0, nsamples, nsamples) for rep in replicates])
+
+def streamSalt(*names):
+  ''' a reproducible salt for independent random streams (e.g. based on dataset and variable name) '''
+  return zlib.crc32('/'.join(str(name) for name in names)) & 0x7fffffff
+
+
+class BootstrapIndices(object):
+  ''' A cache of bootstrap resampling index matrices with shape (nbs, n): one matrix is generated for every
+      sample size n and shared by all variables, members and datasets with that sample size, so that paired
+      comparisons (e.g. reference and target) use the same resamples '''
+
+  def __init__(self, nbs=100, seed=None):
+    self.nbs = nbs
+    self.seed = np.random.randint(2**31-1) if seed is None else seed
+    self.matrices = dict()
+    self._lock = threading.Lock()
+
+  def __call__(self, nsamples):
+    ''' return the index matrix for a sample size (generated on first use) '''
+    with self._lock:
+      if nsamples not in self.matrices:
+        self.matrices[nsamples] = bootstrapIndices(nsamples, xrange(1,self.nbs+1), self.seed)
+      return self.matrices[nsamples]
+
+
+def _bootstrapReplicates(samples=None, indices=None, fitargs=None):
+  ''' fit a block of bootstrap replicates (module-level, so that it can be used with a process pool); all
+      locations are resampled with the same indices in one gather and all replicates are fitted as one batch '''
+  resampled = samples[:,indices] # shape: (batch, replicates, samples)
+  params = fitBatch(resampled, axis=-1, **fitargs)
+  return np.swapaxes(params, 0, 1) # replicates first
+
+def bootstrapBatch(samples, dist='gev', axis=-1, nbs=100, seed=None, indices=None, salt=None, nproc=None, 
+                   executor='process', **kwargs):
+  ''' fit a distribution to the samples along axis and to nbs bootstrap replicates; if nproc is given, 
+      replicates are fitted in parallel (nproc workers, using the clim.batch executor), otherwise serially; 
+      results are bit-identical for any number of workers; resampling indices are taken from shared 
+      BootstrapIndices, if given, otherwise they are generated from seed and salt; returns parameters with 
+      a leading bootstrap axis (the first element is the fit to the original samples) and the parameter 
+      axis last; kwargs are passed to fitBatch '''
+  if indices is None and seed is None: raise ArgumentError, "A seed is required for reproducible bootstrap replicates."
+  if indices is not None and indices.nbs != nbs: raise ArgumentError, "Shared indices have {:d} replicates.".format(indices.nbs)
+  if isinstance(samples,np.ma.MaskedArray): samples = samples.astype(np.float64).filled(np.NaN)
+  samples = np.rollaxis(np.asarray(samples, dtype=np.float64), axis, np.ndim(samples))
+  shape = samples.shape[:-1]
+  samples = samples.reshape((-1,samples.shape[-1]))
+  fitargs = dict(kwargs, dist=dist)
+  params = [fitBatch(samples, axis=-1, **fitargs)[np.newaxis]]
+  if nbs > 0:
+    nsamples = samples.shape[1]
+    if indices is None: matrix = bootstrapIndices(nsamples, xrange(1,nbs+1), seed, salt=salt)
+    else: matrix = indices(nsamples)
+    nproc = 1 if nproc is None else getNproc(nproc, ncells=nbs) # no worker pool, unless requested
+    chunks = np.array_split(np.arange(nbs), nproc) # contiguous blocks of replicates
+    kwargs_list = [dict(samples=samples, indices=matrix[chunk], fitargs=fitargs) for chunk in chunks]
+    params += executeBatch(_bootstrapReplicates, kwargs_list, executor=executor if nproc > 1 else 'serial', 
+                           nproc=nproc, lunique=False)
+  params = np.concatenate(params, axis=0)
+  return params.reshape((nbs+1,)+shape+(params.shape[-1],))
+
+
+## parallel cross-validation
+
+def crossvalMasks(nsamples, ncv=0.2, seed=None):
+  ''' holdout masks for k-fold cross-validation with shape (nfolds, nsamples); ncv is the fraction of samples
+      that is held out in each fold (nfolds = 1/ncv) or the number of folds (if ncv > 1); samples are assigned
+      to folds in random order (reproducible with seed) '''
+  nfolds = int(ncv) if ncv > 1 else int(np.round(1./ncv))
+  if nfolds < 2 or nfolds > nsamples: 
+    raise ArgumentError, "Invalid number of folds for {:d} samples: {:d}".format(nsamples,nfolds)
+  order = np.random.RandomState(seed).permutation(nsamples)
+  masks = np.zeros((nfolds,nsamples), dtype=np.bool)
+  masks[np.arange(nsamples)%nfolds,order] = True
+  return masks
+
+
+class CrossvalMasks(object):
+  ''' A cache of cross-validation holdout masks with shape (nfolds, n): masks are generated once for every 
+      sample size n and shared by all variables, members and datasets with that sample size '''
+
+  def __init__(self, ncv=0.2, seed=None):
+    self.ncv = ncv
+    self.seed = np.random.randint(2**31-1) if seed is None else seed
+    self.masks = dict()
+    self._lock = threading.Lock()
+
+  def __call__(self, nsamples):
+    ''' return the holdout masks for a sample size (generated on first use) '''
+    with self._lock:
+      if nsamples not in self.masks: self.masks[nsamples] = crossvalMasks(nsamples, ncv=self.ncv, seed=self.seed)
+      return self.masks[nsamples]
+
+
+def kstestBatch(samples, params, dist='gev', axis=-1):
+  ''' one-sample Kolmogorov-Smirnov test of samples along axis against distributions with the given parameters
+      (parameter axis last) for all other indices at once; invalid values are ignored and p-values are 
+      computed like scipy.stats.kstest (mode='approx') '''
+  dist = distName(dist)
+  x, w, shape = _prepareSamples(samples, axis=axis)
+  params = np.asarray(params, dtype=np.float64).reshape((-1,dist_params[dist]))
+  if params.shape[0] != x.shape[0]: raise ArgumentError, "Shapes of samples and parameters do not match."
+  with np.errstate(invalid='ignore'):
+    cdf = getattr(ss,dist).cdf(x, *[params[:,i:i+1] for i in xrange(params.shape[1])])
+  cdf = np.sort(np.where(w > 0, cdf, np.inf), axis=1) # invalid values are sorted to the end
+  n = w.sum(axis=1)
+  j = np.arange(x.shape[1], dtype=np.float64)[np.newaxis,:]
+  lvalid = j < n[:,np.newaxis]
+  nn = np.maximum(n, 1.)[:,np.newaxis]
+  dplus = np.where(lvalid, (j+1)/nn - cdf, -np.inf).max(axis=1)
+  dminus = np.where(lvalid, cdf - j/nn, -np.inf).max(axis=1)
+  d = np.maximum(dplus, dminus)
+  with np.errstate(invalid='ignore'):
+    ptwo = ss.kstwobign.sf(d*np.sqrt(n))
+    pone = 2*smirnov(n.astype(np.int), d)
+    pval = np.where((n > 2666) | (ptwo > 0.8 - n*0.3/1000), ptwo, pone)
+  pval = np.where((n > 0) & np.isfinite(d), np.clip(pval, 0, 1), np.NaN)
+  return pval.reshape(shape)
+
+def _crossvalFolds(samples=None, masks=None, fitargs=None):
+  ''' fit and test a block of cross-validation folds (module-level, so that it can be used with a process 
+      pool); all folds are fitted as one batch, with the holdout samples masked as invalid '''
+  training = np.where(masks[np.newaxis,:,:], np.NaN, samples[:,np.newaxis,:]) # shape: (batch, folds, samples)
+  holdout = np.where(masks[np.newaxis,:,:], samples[:,np.newaxis,:], np.NaN)
+  params = fitBatch(training, axis=-1, **fitargs)
+  pval = kstestBatch(holdout, params, dist=fitargs['dist'], axis=-1)
+  return np.concatenate([params, pval[...,np.newaxis]], axis=-1)
+
+def crossvalBatch(samples, dist='gev', axis=-1, ncv=0.2, seed=None, masks=None, nproc=None, executor='process', 
+                  **kwargs):
+  ''' k-fold cross-validation of distribution fits to the samples along axis: every fold is fitted to the 
+      remaining samples and tested against its holdout samples (Kolmogorov-Smirnov); holdout masks are taken
+      from shared CrossvalMasks, if given, otherwise they are generated from ncv and seed; if nproc is given,
+      folds are fitted in parallel (nproc workers, using the clim.batch executor), otherwise serially; returns
+      fold-wise parameters and p-values in one array with a fold axis and a last axis with the parameters 
+      followed by the p-value '''
+  if masks is None and seed is None: raise ArgumentError, "A seed is required for reproducible holdout masks."
+  if isinstance(samples,np.ma.MaskedArray): samples = samples.astype(np.float64).filled(np.NaN)
+  samples = np.rollaxis(np.asarray(samples, dtype=np.float64), axis, np.ndim(samples))
+  shape = samples.shape[:-1]
+  samples = samples.reshape((-1,samples.shape[-1]))
+  matrix = crossvalMasks(samples.shape[1], ncv=ncv, seed=seed) if masks is None else masks(samples.shape[1])
+  nfolds = matrix.shape[0]
+  fitargs = dict(kwargs, dist=dist)
+  nproc = 1 if nproc is None else getNproc(nproc, ncells=nfolds) # no worker pool, unless requested
+  chunks = np.array_split(np.arange(nfolds), nproc) # contiguous blocks of folds
+  kwargs_list = [dict(samples=samples, masks=matrix[chunk], fitargs=fitargs) for chunk in chunks]
+  results = executeBatch(_crossvalFolds, kwargs_list, executor=executor if nproc > 1 else 'serial', 
+                         nproc=nproc, lunique=False)
+  results = np.concatenate(results, axis=1)
+  return results.reshape(shape+results.shape[1:])
+
+
+## fitting Datasets and Ensembles
+
+def paramsAxis(npar):
+  ''' a parameter axis for distribution variables '''
+  return Axis(name='params_#{:d}'.format(npar), units='', coord=np.arange(npar))
+
+def bootstrapAxis(nbs):
+  ''' a bootstrap axis (the first element is the fit to the original samples) '''
+  return Axis(name='bootstrap', units='', coord=np.arange(nbs+1))
+
+def foldAxis(nfolds):
+  ''' a cross-validation fold axis '''
+  return Axis(name='fold', units='', coord=np.arange(1,nfolds+1))
+
+def crossvalAxis(npar):
+  ''' an axis for cross-validation results (distribution parameters, followed by the p-value) '''
+  return Axis(name='crossval_#{:d}'.format(npar+1), units='', coord=np.arange(npar+1), 
+              atts=dict(long_name='Parameters and p-value'))
+
+def fitVariable(var, dist='gev', sample_axis=None, lflatten=False, lbootstrap=False, nbs=100, seed=None, 
+                indices=None, salt=None, nproc=None, cache=None, **kwargs):
+  ''' fit a distribution to the samples of a variable for all locations at once and return a VarRV; if
+      lbootstrap is True, a leading bootstrap axis with nbs replicates is added (see bootstrapBatch); if a
+      FitCache is given, parameters are retrieved from or stored in the cache (see eva.cache) '''
+  dist = distName(dist)
+  data = var.data_array
+  if lflatten: data = data.ravel(); iax = 0 # a single fit for all samples
+  else: iax = var.axisIndex(sample_axis)
+  params = None
+  if cache is not None:
+    rngargs = dict(nbs=nbs, seed=seed if indices is None else indices.seed, salt=salt if indices is None else None, 
+                   lshared=indices is not None) if lbootstrap else dict()
+    key = getFitKey('fitVariable', data, dist=dist, axis=iax, lbootstrap=lbootstrap, **dict(kwargs, **rngargs))
+    params = cache.get(key, dict()).get('params', None)
+  if params is not None: pass # found in cache
+  elif lbootstrap: params = bootstrapBatch(data, dist=dist, axis=iax, nbs=nbs, seed=seed, indices=indices, salt=salt,
+                                           nproc=nproc, **kwargs)
+  else: params = fitBatch(data, dist=dist, axis=iax, **kwargs)
+  if cache is not None and key not in cache: cache.put(key, dict(params=params), name=var.name)
+  axes = () if lflatten else tuple(ax for i,ax in enumerate(var.axes) if i != iax)
+  axes += (paramsAxis(params.shape[-1]),)
+  if lbootstrap: axes = (bootstrapAxis(nbs),) + axes
+  atts = var.atts.copy(); atts['sample_axis'] = 'flat' if lflatten else sample_axis
+  if lbootstrap: 
+    atts['bootstrap_seed'] = seed if indices is None else indices.seed
+    atts['bootstrap_shared'] = indices is not None
+  return VarRV(name=var.name, units=var.units, axes=axes, params=params, dist=dist, atts=atts)
+
+def crossvalVariable(var, dist='gev', sample_axis=None, lflatten=False, ncv=0.2, seed=None, masks=None, 
+                     nproc=None, cache=None, **kwargs):
+  ''' cross-validate distribution fits to the samples of a variable for all locations at once and return a 
+      Variable with fold-wise parameters and p-values (see crossvalBatch); results can be cached like fits '''
+  dist = distName(dist)
+  data = var.data_array
+  if lflatten: data = data.ravel(); iax = 0
+  else: iax = var.axisIndex(sample_axis)
+  results = None
+  if cache is not None:
+    rngargs = dict(ncv=ncv, seed=seed) if masks is None else dict(ncv=masks.ncv, seed=masks.seed)
+    key = getFitKey('crossvalVariable', data, dist=dist, axis=iax, **dict(kwargs, **rngargs))
+    results = cache.get(key, dict()).get('crossval', None)
+  if results is None: 
+    results = crossvalBatch(data, dist=dist, axis=iax, ncv=ncv, seed=seed, masks=masks, nproc=nproc, **kwargs)
+    if cache is not None: cache.put(key, dict(crossval=results), name=var.name+cv_suffix)
+  axes = () if lflatten else tuple(ax for i,ax in enumerate(var.axes) if i != iax)
+  axes += (foldAxis(results.shape[-2]), crossvalAxis(dist_params[dist]))
+  atts = var.atts.copy(); atts['sample_axis'] = 'flat' if lflatten else sample_axis
+  atts['dist'] = dist; atts['crossval_seed'] = seed if masks is None else masks.seed
+  return Variable(name=var.name+cv_suffix, units='', axes=axes, data=results, atts=atts)
+
+def sampleFingerprints(samples):
+  ''' fingerprints of the valid samples at each location (batch along first axis, samples along second axis);
+      the positions of invalid values do not matter, since they are ignored in fits '''
+  return np.array([hashlib.sha1(row[np.isfinite(row)].tobytes()).hexdigest() for row in samples])
+
+def locationIDs(axes):
+  ''' identifiers for all locations (combinations of coordinates along the location axes, in C-order) '''
+  ids = np.array(['flat' if len(axes) == 0 else ''])
+  for ax in axes:
+    coord = np.asarray(ax.coord).astype(np.str_)
+    ids = np.char.add(np.char.add(ids[:,np.newaxis], '|'), coord[np.newaxis,:]).ravel()
+  return ids
+
+def refitVariable(var, state=None, dist='gev', sample_axis=None, lflatten=False, method='mle', nproc=None, 
+                  cache=None, **kwargs):
+  ''' refit a distribution to the samples of a variable incrementally, based on the state of a previous fit:
+      locations with unchanged valid samples reuse their previous parameters (skipped), locations with 
+      changed samples are warm-started from their previous parameters (maximum likelihood only) and new 
+      locations are fitted from scratch (recomputed); returns the VarRV, the new state and the counts '''
+  dist = distName(dist)
+  data = var.data_array
+  if lflatten: data = data.ravel(); iax = 0; locaxes = ()
+  else: 
+    iax = var.axisIndex(sample_axis)
+    locaxes = tuple(ax for i,ax in enumerate(var.axes) if i != iax)
+  if isinstance(data,np.ma.MaskedArray): data = data.astype(np.float64).filled(np.NaN)
+  samples = np.rollaxis(np.asarray(data, dtype=np.float64), iax, np.ndim(data))
+  shape = samples.shape[:-1]
+  samples = samples.reshape((-1,samples.shape[-1]))
+  fingerprints = sampleFingerprints(samples); locations = locationIDs(locaxes)
+  npar = dist_params[dist]; lwarm = method == 'mle' and dist != 'norm' # closed form otherwise
+  params = np.full((len(locations),npar), np.NaN); params0 = np.full((len(locations),npar), np.NaN)
+  status = np.full(len(locations), 2, dtype=np.int8) # 0: skipped, 1: warm-started, 2: recomputed
+  if state is not None:
+    previous = {location:j for j,location in enumerate(state['locations'])}
+    for i,location in enumerate(locations):
+      j = previous.get(location, None)
+      if j is None: continue # new location
+      elif state['fingerprints'][j] == fingerprints[i]: params[i] = state['params'][j]; status[i] = 0
+      elif lwarm and np.all(np.isfinite(state['params'][j])): params0[i] = state['params'][j]; status[i] = 1
+  ifit = np.flatnonzero(status > 0)
+  if len(ifit) > 0:
+    params[ifit] = fitBatch(samples[ifit], dist=dist, axis=-1, method=method, 
+                            params0=params0[ifit] if lwarm else None, **kwargs)
+  counts = tuple(int(np.sum(status == i)) for i in xrange(3)) # skipped, warm-started, recomputed
+  axes = locaxes + (paramsAxis(npar),)
+  atts = var.atts.copy(); atts['sample_axis'] = 'flat' if lflatten else sample_axis
+  atts['refit_skipped'], atts['refit_warm'], atts['refit_recomputed'] = counts
+  fitvar = VarRV(name=var.name, units=var.units, axes=axes, params=params.reshape(shape+(npar,)), dist=dist, 
+                 atts=atts)
+  return fitvar, dict(locations=locations, fingerprints=fingerprints, params=params), counts
+
+
+class RefitReport(object):
+  ''' A report of incremental refits: the number of locations that were skipped (unchanged samples), 
+      warm-started (changed samples) or fully recomputed (new locations), by dataset and variable '''
+
+  def __init__(self):
+    self.entries = []
+
+  def add(self, dataset, varname, skipped=0, warm=0, recomputed=0):
+    self.entries.append(dict(dataset=dataset, variable=varname, skipped=skipped, warm=warm, recomputed=recomputed))
+
+  def report(self):
+    ''' totals and entries by dataset and variable '''
+    totals = {key:sum(entry[key] for entry in self.entries) for key in ('skipped','warm','recomputed')}
+    return dict(entries=self.entries, **totals)
+
+  def __str__(self):
+    report = self.report()
+    string = 'Incremental refit: {:d} skipped, {:d} warm-started, {:d} recomputed\n'.format(
+              report['skipped'], report['warm'], report['recomputed'])
+    for entry in self.entries:
+      string += '  {:s}/{:s}: {:d} skipped, {:d} warm-started, {:d} recomputed\n'.format(entry['dataset'], 
+                 entry['variable'], entry['skipped'], entry['warm'], entry['recomputed'])
+    return string
+
+
+def fitDataset(dataset, dist='gev', sample_axis=None, lflatten=False, lcrossval=False, ncv=0.2, cv_seed=None, 
+               masks=None, lincremental=False, report=None, cell=None, **kwargs):
+  ''' fit distributions to all variables of a Dataset that have a sample axis; other variables and station or
+      shape meta data are copied, unless samples are flattened; if lcrossval is True, fold-wise 
+      cross-validation results are added for every fitted variable (with suffix '_cv'); with lincremental,
+      previous fits are retrieved from the FitCache (cache) and only changed locations are refitted (see 
+      refitVariable; counts are added to a RefitReport, if given); fit states are keyed on the dataset and
+      variable name and on the cell arguments (e.g. season or province), since the same dataset can be 
+      loaded in different cells '''
+  cache = kwargs.get('cache', None)
+  if lincremental and cache is None: raise ArgumentError, "Incremental refits require a FitCache."
+  fitds = Dataset(name=dataset.name, title=dataset.title, atts=dataset.atts.copy())
+  for var in dataset.variables.itervalues():
+    if var.name in stn_params or var.name in shp_params: lsample = False
+    elif lflatten: lsample = var.ndim > 0
+    else: lsample = var.hasAxis(sample_axis)
+    lsample = lsample and np.issubdtype(var.dtype, np.number)
+    fitargs = {key:value for key,value in kwargs.iteritems() if key not in bootstrap_args}
+    if lsample and lincremental:
+      statekey = getStateKey(dataset.name, var.name, dist=distName(dist), sample_axis=sample_axis, 
+                             lflatten=lflatten, cell=cell, **fitargs)
+      fitvar, state, counts = refitVariable(var, state=cache.get(statekey), dist=dist, sample_axis=sample_axis,
+                                            lflatten=lflatten, **fitargs)
+      if counts[0] < len(state['locations']): cache.put(statekey, state, name=dataset.name+'/'+var.name)
+      if report is not None: report.add(dataset.name, var.name, *counts)
+      fitds.addVariable(fitvar)
+    elif lsample:
+      salt = streamSalt(dataset.name, var.name) # independent resamples, unless indices are shared
+      fitds.addVariable(fitVariable(var, dist=dist, sample_axis=sample_axis, lflatten=lflatten, salt=salt, **kwargs))
+    elif not lflatten: fitds.addVariable(var.copy())
+    if lsample and lcrossval: 
+      fitds.addVariable(crossvalVariable(var, dist=dist, sample_axis=sample_axis, lflatten=lflatten, ncv=ncv,
+                                         seed=cv_seed, masks=masks, **fitargs))
+  return fitds
+
+def fitEnsemble(ensemble, dist='gev', sample_axis=None, lflatten=False, lbootstrap=False, seed=None, indices=None, 
+                lcrossval=False, ncv=0.2, masks=None, lincremental=False, **kwargs):
+  ''' fit distributions to all members of an Ensemble with the batched engine (see fitDataset); if no seed is
+      given for bootstrap replicates, a seed is drawn (and stored in the 'bootstrap_seed' attribute); if
+      BootstrapIndices are given, all variables and members with the same sample size share resamples,
+      otherwise every variable and member is resampled independently; with a FitCache (cache), fits of 
+      identical samples and settings are not repeated (see eva.cache); cross-validation holdout masks are
+      shared by all variables and members with the same sample size (drawn, unless CrossvalMasks are given);
+      with lincremental (and a FitCache), only changed locations are refitted (warm-started, without bootstrap) '''
+  if not lflatten and sample_axis is None: raise AxisError, "A sample axis is required."
+  if lincremental:
+    if kwargs.get('cache',None) is None or lbootstrap: 
+      warn("Incremental refits require a FitCache and no bootstrap - ignoring.")
+    else: kwargs['lincremental'] = lincremental
+  if lbootstrap:
+    if seed is None and indices is None: seed = np.random.randint(2**31-1)
+    kwargs.update(lbootstrap=lbootstrap, seed=seed, indices=indices)
+  if lcrossval:
+    if masks is None: masks = CrossvalMasks(ncv=ncv)
+    kwargs.update(lcrossval=lcrossval, ncv=ncv, masks=masks)
+  members = [fitDataset(dataset, dist=dist, sample_axis=sample_axis, lflatten=lflatten, **kwargs) 
+             for dataset in ensemble]
+  return Ensemble(*members, name=ensemble.ens_name, title=ensemble.ens_title, basetype=Dataset)
@@ -15,6 +15,7 @@ from geodata.misc import ArgumentError, AxisError, DatasetError
 from geodata.stats import ks_2samp, VarRV
 from plotting.figure import show # don't import getFigAx directly, to avoid recursion
 from plotting.axes import checkVarlist
+from eva.fitting import cv_suffix
 
 def stationInfo(stnds, varname, name, titlestr=None, alttitle=None, lflatten=False, lmon=False,):
   ''' helper to generate an axes title with station info '''
@@ -55,7 +56,8 @@ def _rescaleSample(smpl, loc, bs_axis=None):
 def generateStatistics(varname, ens, fit, scl=None, reference=None, mode='Ratio', plot_labels=None, 
                        nsamples=None, bootstrap_axis='bootstrap', lflatten=False, sample_axis='time', 
                        lcrossval=True):
-  ''' Perform K-S test and compute ratio of means; return results in formatted string. '''
+  ''' Perform K-S test and compute ratio of means; return results in formatted string; if fit contains 
+      cross-validation results from the batched engine (suffix '_cv'), the fold-wise p-values are used. '''
   # some average diagnosics
   idkey = 'dataset_name' if ens.basetype is Dataset else 'name'  
   varlist = Ensemble(*[ds[varname] for ds in ens if ds is not None and varname in ds], idkey=idkey)
@@ -81,6 +83,8 @@ def generateStatistics(varname, ens, fit, scl=None, reference=None, mode='Ratio'
   # goodness of fit, reported on plot panels
   if fit:
     fitlist = Ensemble(*[ds[varname] for ds in fit if ds is not None and varname in ds], idkey=idkey)
+    cvlist = [ds[varname+cv_suffix] if varname+cv_suffix in ds else None 
+              for ds in fit if ds is not None and varname in ds] # pre-computed cross-validation
     if any(fitlist.hasAxis(bootstrap_axis)): fitlist = fitlist(**{bootstrap_axis:0, 'lcheckAxis':False})
     if not all(fitlist[0].ndim==ndim for ndim in fitlist.ndim):
       new_axes = fitlist[np.argmax(fitlist.ndim)].axes
@@ -97,9 +101,12 @@ def generateStatistics(varname, ens, fit, scl=None, reference=None, mode='Ratio'
       string = '{:s}  Fit  {:s}\n'.format(headline,mode.title())
       namestr = '{{:>{:d}s}}  {{:s}}  '.format(max(lhead,lnames))
       iref = iref0; reflist = reflist0[:] # copy list
-      for i,dist,var,name,mvar in zip(xrange(len(fitlist)),fitlist,varlist,names,mvars):
+      for i,dist,var,name,mvar,cvvar in zip(xrange(len(fitlist)),fitlist,varlist,names,mvars,cvlist):
         if isinstance(dist,VarRV) or not scl:
-          if isinstance(dist,VarRV):
+          if lcrossval and cvvar is not None:
+            pval = cvvar.data_array[...,-1] # fold-wise p-values
+            pval = '{:3.2f}'.format(float(np.nanmedian(pval)))
+          elif isinstance(dist,VarRV):
             pval = dist.fittest(var, nsamples=nsamples, asVar=False, lcrossval=lcrossval) #lflatten=lflatten, axis_idx=var.axisIndex(sample_axis, lcheck=False))
 #             print var.name, pval, pval.mean().__class__.__name__, '{:s}'.format(pval.mean())
 #             pval = '{:3.2f}'.format(float(pval.mean())) # mean is only necessary to convert to scalar
@@ -0,0 +1,105 @@
+'''
+Created on Oct 18, 2026
+
+Lightweight views of rescaled distribution variables: a view shares the parameters of a fitted VarRV and
+only stores the rescaling factors; rescaled parameters are created once, when the distribution is first
+evaluated (e.g. pdf, cdf or ppf), and can be released again, so that rescaled ensembles do not hold a second
+copy of all (bootstrap) parameters, unless they are actually used.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import numpy as np
+# internal imports
+from geodata.stats import VarRV
+
+
+# attributes that are stored in the view itself (and passed on to the rescaled copy)
+view_attrs = ('atts','dataset')
+
+
+## rescaled distribution view
+
+class RescaledVarRV(object):
+  ''' A view of a fitted VarRV with rescaled location (and scale) parameters; meta data are taken from the
+      original variable and all other attributes and methods are those of a rescaled copy (see
+      VarRV.rescale), which is created when it is first accessed and kept until it is released; in-place 
+      operations (e.g. replaceAxis) modify the rescaled copy, after which the view behaves like the copy;
+      views pass isinstance checks for VarRV. '''
+  # attributes that do not depend on parameter values
+  meta_attrs = ('name','units','axes','shape','ndim','dtype','hasAxis','axisIndex','getAxis','dataset',
+                'dataset_name')
+
+  def __init__(self, var, loc=1., scale=None):
+    if not isinstance(var,VarRV): raise TypeError, var
+    if isinstance(var,RescaledVarRV): # combine factors, instead of nesting views
+      loc = var.loc*loc; scale = var.scale if scale is None else scale if var.scale is None else var.scale*scale
+      var = var.var
+    atts = var.atts.copy() # N.B.: scale factors are stored in the same attributes as by rescaleDistributions
+    atts.update(loc_factor=loc, scale_factor=1 if scale is None else scale, shape_factor=1)
+    self.__dict__.update(var=var, loc=loc, scale=scale, atts=atts, rescaled=None)
+
+  @property
+  def __class__(self):
+    ''' pretend to be the class of the original variable (for isinstance checks) '''
+    return self.var.__class__
+
+  @property
+  def lmaterialized(self):
+    ''' whether the rescaled copy currently exists '''
+    return self.rescaled is not None
+
+  def materialize(self):
+    ''' return the VarRV with rescaled parameters (created once; shares the attributes of the view) '''
+    if self.rescaled is None:
+      if self.scale is None: rescaled = self.var.rescale(loc=self.loc)
+      else: rescaled = self.var.rescale(loc=self.loc, scale=self.scale)
+      rescaled.atts = self.atts # N.B.: changes to attributes are shared between view and copy
+      if 'dataset' in self.__dict__: rescaled.dataset = self.__dict__['dataset']
+      self.__dict__['rescaled'] = rescaled
+    return self.rescaled
+
+  def release(self):
+    ''' release the rescaled copy (it will be created again when needed); N.B.: in-place modifications of
+        the copy are lost, so views should only be released before they are modified '''
+    self.__dict__['rescaled'] = None
+
+  def __getattr__(self, attr):
+    ''' meta data are retrieved from the original variable (or the rescaled copy, once it exists),
+        everything else from the rescaled copy '''
+    if attr.startswith('__'): raise AttributeError, attr # no special methods
+    elif attr in self.meta_attrs and self.rescaled is None: return getattr(self.var, attr)
+    else: return getattr(self.materialize(), attr)
+
+  def __setattr__(self, attr, value):
+    ''' attributes are set on the rescaled copy, so that they are not lost or shared with the original; the
+        attributes and the pointer to the parent dataset (set by addVariable) belong to the view '''
+    if attr in view_attrs: self.__dict__[attr] = value
+    if attr not in view_attrs or self.rescaled is not None: setattr(self.materialize(), attr, value)
+
+  def __call__(self, *args, **kwargs):
+    return self.materialize()(*args, **kwargs)
+
+  def __getitem__(self, idx):
+    return self.materialize()[idx]
+
+  def __reduce__(self):
+    if self.rescaled is not None: return self.rescaled.__reduce_ex__(2) # preserve modifications
+    else: return (RescaledVarRV, (self.var, self.loc, self.scale))
+
+  def __reduce_ex__(self, protocol):
+    return self.__reduce__() # N.B.: the default uses __class__ and would return a VarRV
+
+  @property
+  def nbytes(self):
+    ''' memory held by the view itself (scale factors and the rescaled copy, if it exists) '''
+    nbytes = sum(np.asarray(factor).nbytes for factor in (self.loc,self.scale) if factor is not None)
+    if self.rescaled is not None: nbytes += self.rescaled.nbytes
+    return nbytes
+
+  def __str__(self):
+    return 'Rescaled view of {:s}'.format(str(self.var))
+
+  def __repr__(self):
+    return '<RescaledVarRV of {!r}>'.format(self.var)
@@ -0,0 +1,10 @@
+'''
+Created on 2026-10-18 
+
+A package with equivalence tests for the fast load and fit paths in clim and eva: results of the new paths
+are compared to the original loadEnsembleTS/BatchLoad/fitDist results on small synthetic fixtures.
+
+Usage: python -m unittest discover -s src/tests -t src
+
+@author: agent, GPL v3
+'''
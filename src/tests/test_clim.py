@@ -0,0 +1,399 @@
+'''
+Created on Oct 18, 2026
+
+Equivalence tests for the load paths in clim.load: every fast path (shared members, single-read fan-out, 
+deduplicated batch loads, ...) is compared to the original loadEnsembleTS/BatchLoad result for one small 
+cell of the synthetic archive in benchmarks.fixtures.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import os, unittest, tempfile, shutil
+import numpy as np
+# internal imports
+from clim.load import loadShapeEnsemble, loadStationEnsemble, loadShapeObservations, planShapeEnsemble
+from clim.cache import MemberRegistry, EnsembleCache, FiletypeIndex, fileStats
+from clim.store import exportStores
+from clim.lazy import lazyDataset, loadedVariables
+from clim.profiling import LoadProfile
+from geodata.misc import ArgumentError, DatasetError
+from benchmarks.fixtures import SyntheticArchive, provinces, wrf_filetypes
+
+
+class ArchiveTest(unittest.TestCase):
+  ''' base class that writes a small synthetic archive and serves it to the load functions '''
+  size = 'small' # see benchmarks.fixtures.fixture_sizes
+
+  @classmethod
+  def setUpClass(cls):
+    cls.folder = tempfile.mkdtemp()
+    cls.archive = SyntheticArchive(cls.folder, size=cls.size)
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls.folder)
+
+  def setUp(self):
+    self.patch = self.archive.patch()
+    self.patch.__enter__()
+
+  def tearDown(self):
+    self.patch.__exit__(None, None, None)
+
+  def assertEnsembleEqual(self, ensemble, reference, varlist=None):
+    ''' compare the data of all (or the listed) variables in two Ensembles '''
+    self.assertEqual([ds.name for ds in ensemble], [ds.name for ds in reference])
+    for dataset,refds in zip(ensemble,reference):
+      for varname in varlist or refds.variables.keys():
+        data = dataset[varname].data_array; refdata = refds[varname].data_array
+        if np.issubdtype(refdata.dtype, np.number): np.testing.assert_allclose(data, refdata, rtol=1e-6)
+        else: np.testing.assert_array_equal(data, refdata)
+
+
+class RegistryTest(ArchiveTest):
+  ''' shared members (MemberRegistry) vs. loadEnsembleTS '''
+
+  def testSharedMembers(self):
+    registry = MemberRegistry()
+    kwargs = dict(basins=['B00'], varlist=['precip'], aggregation='mean', seasons='summer', variable_list=dict())
+    names = self.archive.members
+    reference = loadShapeEnsemble(names=names, **kwargs)
+    first = loadShapeEnsemble(names=names[:2], registry=registry, **kwargs)
+    second = loadShapeEnsemble(names=names, registry=registry, **kwargs)
+    self.assertEnsembleEqual(second, reference, varlist=['precip'])
+    self.assertIs(first[0], second[0]) # loaded only once
+    self.assertEqual(registry.report()['loads'], len(names))
+
+  def testEnsembleAxis(self):
+    registry = MemberRegistry()
+    members = self.archive.members
+    kwargs = dict(basins=['B00'], varlist=['precip'], aggregation='mean', seasons='summer', variable_list=dict(),
+                  WRF_ens={'wrf-ens':members[:2]}, lensembleAxis=True)
+    reference = loadShapeEnsemble(names=['wrf-ens'], **kwargs)
+    loadShapeEnsemble(names=members[:2], registry=registry, **kwargs) # members without ensemble axis
+    stacked = loadShapeEnsemble(names=['wrf-ens'], registry=registry, **kwargs)
+    self.assertTrue(stacked[0]['precip'].hasAxis('ensemble'))
+    self.assertEnsembleEqual(stacked, reference, varlist=['precip'])
+    self.assertEqual(registry.report()['loads'], 2) # members are shared with the stacked ensemble
+
+  def testReadOnlyMembers(self):
+    registry = MemberRegistry(lreadonly=True)
+    ensemble = loadShapeEnsemble(names=self.archive.members[:1], basins=['B00'], varlist=['precip'], 
+                                 aggregation='mean', seasons='summer', variable_list=dict(), registry=registry)
+    with self.assertRaises(ValueError): ensemble[0]['precip'].data_array[:] = 0 # shared arrays are read-only
+    copy = ensemble[0]['precip'].copy(deepcopy=True) # modify copies instead
+    copy.data_array[:] = 0
+
+
+class FanoutTest(ArchiveTest):
+  ''' seasons and aggregations from a single read vs. one loadEnsembleTS call per season and aggregation '''
+  seasons = ['summer','winter']; aggregations = ['mean','std']
+
+  def compareFanout(self, **kwargs):
+    kwargs.update(names=self.archive.members, basins=['B00'], varlist=['precip','T2'], variable_list=dict())
+    fanout = loadShapeEnsemble(seasons=self.seasons, aggregation=self.aggregations, **kwargs)
+    for season,enslist in zip(self.seasons,fanout):
+      for aggregation,ensemble in zip(self.aggregations,enslist):
+        reference = loadShapeEnsemble(seasons=season, aggregation=aggregation, **kwargs)
+        self.assertEnsembleEqual(ensemble, reference, varlist=['precip','T2'])
+
+  def testFanout(self):
+    self.compareFanout()
+
+  def testFanoutReduction(self):
+    self.compareFanout(reduction=dict(shape='mean')) # reductions are applied after aggregation
+
+  def testFanoutSeries(self):
+    self.aggregations = [None] # raw time-series are loaded for every season
+    self.compareFanout()
+
+
+class PushdownTest(ArchiveTest):
+  ''' period slices pushed down to the read layer (lpushdown) vs. slicing after loading '''
+  kwargs = dict(basins=['B01'], varlist=['precip','T2'], seasons=['summer','winter'], aggregation='mean', 
+                variable_list=dict())
+
+  def loadBytes(self, **kwargs):
+    ''' load members and return the Ensembles and the number of bytes that were read '''
+    profile = LoadProfile()
+    enslist = loadShapeEnsemble(names=self.archive.members, profile=profile, **dict(self.kwargs, **kwargs))
+    return enslist, profile.report()['bytes']
+
+  def testPeriod(self):
+    pushdown, nbytes = self.loadBytes(period=(1980,1982), lpushdown=True)
+    reference, nref = self.loadBytes(period=(1980,1982), lpushdown=False)
+    for ensemble,refens in zip(pushdown,reference):
+      self.assertEnsembleEqual(ensemble, refens, varlist=['precip','T2'])
+    full, nfull = self.loadBytes(lpushdown=True)
+    self.assertLess(nbytes, nfull*0.5) # only two of five years were read
+
+
+class BatchTest(ArchiveTest):
+  ''' deduplicated batch loads (executeBatch) vs. one loadEnsembleTS call per cell (BatchLoad) '''
+
+  def compareBatch(self, **kwargs):
+    kwargs.update(names=self.archive.members, varlist=['precip'], aggregation='mean', seasons='summer', 
+                  variable_list=dict())
+    basins = ['B00','B01','B00'] # with a duplicate cell
+    enslist = loadShapeEnsemble(basins=basins, load_list=['basins'], **kwargs)
+    self.assertEqual(len(enslist), len(basins))
+    for basin,ensemble in zip(basins,enslist):
+      self.assertEnsembleEqual(ensemble, loadShapeEnsemble(basins=basin, **kwargs), varlist=['precip'])
+    # duplicate cells receive independent copies
+    self.assertIsNot(enslist[0][0], enslist[2][0])
+    enslist[2][0]['precip'].data_array[:] = 0
+    self.assertEnsembleEqual(enslist[0], loadShapeEnsemble(basins='B00', **kwargs), varlist=['precip'])
+
+  def testSerial(self):
+    self.compareBatch()
+
+  def testThreads(self):
+    self.compareBatch(executor='thread', nproc=2)
+
+
+class StationIndexTest(ArchiveTest):
+  ''' station selection with cached masks (lstationIndex) vs. loadEnsembleTS constraints '''
+
+  def testProvinces(self):
+    kwargs = dict(names=self.archive.names, varlist=['precip'], stationtype='ecprecip', seasons=['summer','winter'],
+                  aggregation='mean', provs=provinces[:3], default_constraints=dict(min_len=1, lat=(40,65)),
+                  load_list=['season','prov'], variable_list=dict())
+    reference = loadStationEnsemble(**kwargs)
+    indexed = loadStationEnsemble(lstationIndex=True, **kwargs)
+    self.assertEqual(len(indexed), len(reference))
+    for ensemble,refens in zip(indexed,reference): # order: season, then province
+      self.assertEqual(len(ensemble[0].axes['station']), len(refens[0].axes['station']))
+      self.assertEnsembleEqual(ensemble, refens, varlist=['precip','stn_prov'])
+
+
+class PlanTest(ArchiveTest):
+  ''' load plans (ldryrun) do not load any data and merge duplicate cells '''
+  kwargs = dict(basins=['B00','B01','B00'], seasons=['summer','winter'], load_list=['basins','seasons'], 
+                varlist=['precip'], aggregation='mean', variable_list=dict())
+
+  def testDryRun(self):
+    nopen = self.archive.nopen
+    plan = loadShapeEnsemble(names=self.archive.members, ldryrun=True, **self.kwargs)
+    self.assertEqual(self.archive.nopen, nopen) # nothing was opened
+    self.assertEqual((plan.ncells,plan.nunique), (3,2)) # seasons are derived from a single load
+    self.assertEqual(len(plan.entries), 2*len(self.archive.members))
+    counts = [info['count'] for entry,info in plan.entries.iteritems() if entry.selection[1] == 'B00']
+    self.assertEqual(counts, [2]*len(self.archive.members))
+    self.assertEqual(len(plan.expand(range(plan.nunique))), plan.ncells)
+
+  def testEstimate(self):
+    plan = planShapeEnsemble(names=self.archive.members, lestimate=True, **self.kwargs)
+    nfiles = sum(len(self.archive.filelist(name, 'shpavg')) for name in self.archive.members)
+    self.assertEqual(plan.nfiles, 2*nfiles) # two basins
+    self.assertGreater(plan.nbytes, 0)
+
+
+class ObservationTest(ArchiveTest):
+  ''' concurrent observation reads (lconcurrent) vs. serial reads '''
+  kwargs = dict(obs='EC', basins=['B00'], varlist=['precip','T2'], seasons='summer', variable_list=dict())
+
+  def testConcurrent(self):
+    aggregations = ('mean','std')
+    concurrent = loadShapeObservations(aggregation=aggregations, lconcurrent=True, **self.kwargs)
+    serial = loadShapeObservations(aggregation=aggregations, lconcurrent=False, **self.kwargs)
+    self.assertEqual(len(concurrent), len(aggregations))
+    for aggregation,ensemble,refens in zip(aggregations,concurrent,serial):
+      self.assertEnsembleEqual(ensemble, refens, varlist=['precip','T2'])
+      reference = loadShapeObservations(aggregation=aggregation, lconcurrent=False, **self.kwargs)
+      self.assertEnsembleEqual(ensemble, reference, varlist=['precip','T2'])
+
+  def testFailedRead(self):
+    with self.assertRaises(DatasetError): 
+      loadShapeObservations(aggregation='mean', lconcurrent=True, **dict(self.kwargs, obs='missing'))
+
+
+class CacheTest(ArchiveTest):
+  ''' cached results (EnsembleCache) vs. loadEnsembleTS, and invalidation when source files change '''
+
+  def testSourceChange(self):
+    cache = EnsembleCache(folder=os.path.join(self.folder,'cache'))
+    kwargs = dict(names=self.archive.members, basins=['B00'], varlist=['precip'], aggregation='mean', 
+                  seasons='summer', variable_list=dict())
+    reference = loadShapeEnsemble(**kwargs)
+    loadShapeEnsemble(cache=cache, **kwargs)
+    self.assertEqual(len(cache), 1)
+    nopen = self.archive.nopen
+    self.assertEnsembleEqual(loadShapeEnsemble(cache=cache, **kwargs), reference, varlist=['precip'])
+    self.assertEqual(self.archive.nopen, nopen) # cache hit: no files were opened
+    filepath = self.archive.filelist(self.archive.members[0], 'shpavg')[0]
+    mtime = os.path.getmtime(filepath) + 10
+    os.utime(filepath, (mtime, mtime)) # touch a source file
+    self.assertEnsembleEqual(loadShapeEnsemble(cache=cache, **kwargs), reference, varlist=['precip'])
+    self.assertGreater(self.archive.nopen, nopen) # cache miss: members were loaded again
+
+
+class FiletypeIndexTest(unittest.TestCase):
+  ''' pruning of filetypes per experiment, invalidation when source files change and merging on disk '''
+
+  def setUp(self):
+    self.folder = tempfile.mkdtemp()
+    self.filepath = os.path.join(self.folder,'filetype_index.json')
+    self.sources = dict()
+    for exp in ('wrf-00','wrf-01'):
+      for filetype in ('srfc','hydro','xtrm'):
+        filepath = os.path.join(self.folder,'{:s}_{:s}.nc'.format(exp,filetype))
+        open(filepath,'w').close(); self.sources[(exp,filetype)] = fileStats([filepath])
+
+  def tearDown(self):
+    shutil.rmtree(self.folder)
+
+  def addEntries(self, ftindex, contents):
+    for (exp,filetype),variables in contents.iteritems():
+      ftindex.add(filetype, exp, variables, self.sources[(exp,filetype)], domain=2, mode='shpavg')
+
+  def testPrune(self):
+    ftindex = FiletypeIndex(filepath=self.filepath)
+    self.addEntries(ftindex, {('wrf-00','srfc'):['T2','precip'], ('wrf-00','hydro'):['precip','runoff'], 
+                              ('wrf-00','xtrm'):['MaxPrecip_1d'], ('wrf-01','srfc'):['T2'], 
+                              ('wrf-01','hydro'):['precip','runoff'], ('wrf-01','xtrm'):['MaxPrecip_1d']})
+    filetypes = ['hydro','srfc','xtrm']
+    prune = lambda variables, exps, **kwargs: ftindex.prune(variables, filetypes, exps, domain=2, mode='shpavg', **kwargs)
+    self.assertEqual(prune(['T2','precip'], ['wrf-00']), ['srfc'])
+    self.assertEqual(prune(['T2','precip'], ['wrf-00','wrf-01']), ['hydro','srfc']) # union of minimal covers
+    self.assertEqual(prune(['T2','shape_name'], ['wrf-01'], params=['shape_name']), ['srfc'])
+    self.assertEqual(prune(['T2','snow'], ['wrf-00']), filetypes) # unknown variable: no pruning
+    self.assertEqual(ftindex.prune(['T2'], filetypes, ['wrf-00'], domain=1, mode='shpavg'), filetypes) # other domain
+    filepath = self.sources[('wrf-00','srfc')][0][0]
+    mtime = os.path.getmtime(filepath) + 10
+    os.utime(filepath, (mtime, mtime)) # touch a source file
+    self.assertIsNone(ftindex.lookup('srfc', 'wrf-00', domain=2, mode='shpavg'))
+    self.assertEqual(prune(['precip'], ['wrf-00']), ['hydro','srfc']) # changed filetype is kept
+
+  def testMerge(self):
+    ftindex = FiletypeIndex(filepath=self.filepath); other = FiletypeIndex(filepath=self.filepath)
+    self.addEntries(ftindex, {('wrf-00','srfc'):['T2']})
+    self.addEntries(other, {('wrf-01','srfc'):['T2']})
+    self.assertEqual(len(FiletypeIndex(filepath=self.filepath)), 2)
+    self.assertEqual([filename for filename in os.listdir(self.folder) if filename.startswith('.tmp')], [])
+
+
+class FiletypePruningTest(ArchiveTest):
+  ''' WRF members with pruned filetypes (filetype_index) vs. all filetypes '''
+
+  def loadFiles(self, varlist, **kwargs):
+    ''' load WRF members and return the Ensemble and the number of files that were opened '''
+    nfiles = self.archive.nfiles
+    ensemble = loadShapeEnsemble(names=self.archive.WRF_exps.keys(), basins=['B00'], varlist=varlist, 
+                                 aggregation='mean', seasons='summer', filetypes=wrf_filetypes.keys(), 
+                                 WRF_exps=self.archive.WRF_exps, variable_list=dict(), **kwargs)
+    return ensemble, self.archive.nfiles - nfiles
+
+  def testPrune(self):
+    ftindex = FiletypeIndex(filepath=os.path.join(self.folder,'filetype_index.json'))
+    nmembers = len(self.archive.WRF_exps)
+    for varlist,nfiles in ((['T2','precip'],1), (['precip','runoff'],1), (['T2','runoff'],2)):
+      reference, nall = self.loadFiles(varlist)
+      self.assertEqual(nall, nmembers*len(wrf_filetypes))
+      self.loadFiles(varlist, filetype_index=ftindex) # index filetypes on first use
+      ensemble, npruned = self.loadFiles(varlist, filetype_index=ftindex)
+      self.assertEqual(npruned, nmembers*nfiles) # minimal covers: srfc, hydro, srfc+hydro (or lsm)
+      self.assertEnsembleEqual(ensemble, reference, varlist=varlist)
+
+
+class StoreTest(ArchiveTest):
+  ''' shape averages from memory-mapped stores (only if requested) vs. loadEnsembleTS '''
+
+  def testStores(self):
+    folder = os.path.join(self.folder,'stores')
+    stores = exportStores(self.archive.members, folder=folder, lprint=False)
+    self.assertEqual(len(stores), len(self.archive.members))
+    dataset = stores[0].read(varlist=['precip'], shape_name='B01', years=(1980,1982))
+    self.assertEqual(tuple(ax.name for ax in dataset['precip'].axes), ('time','shape'))
+    self.assertEqual(dataset['precip'].shape, (24,1))
+    kwargs = dict(names=self.archive.members, basins=['B01'], varlist=['precip'], aggregation='mean', 
+                  seasons='summer', variable_list=dict())
+    nopen = self.archive.nopen
+    reference = loadShapeEnsemble(**kwargs) # stores are not used by default
+    self.assertGreater(self.archive.nopen, nopen)
+    nopen = self.archive.nopen
+    self.assertEnsembleEqual(loadShapeEnsemble(store=folder, **kwargs), reference, varlist=['precip'])
+    self.assertEqual(self.archive.nopen, nopen) # no files were opened
+
+
+class LazyTest(ArchiveTest):
+  ''' lazy members load variables on first access and keep the order of variables '''
+
+  def testFirstAccess(self):
+    dataset = self.archive.loadDataset(name=self.archive.obs_name, shape='shpavg')
+    varnames = dataset.variables.keys()
+    dataset = lazyDataset(dataset)
+    self.assertEqual(dataset.variables.keys(), varnames)
+    self.assertEqual(loadedVariables(dataset), [])
+    self.assertIsNotNone(dataset['precip'].data_array)
+    self.assertEqual(loadedVariables(dataset), ['precip'])
+    self.assertEqual([var.name for var in dataset.variables.values()], varnames) # loads all variables
+    self.assertEqual(loadedVariables(dataset), sorted(varnames))
+
+
+class ProfileTest(ArchiveTest):
+  ''' profiles are passed in by the caller and are stopped even if a load fails '''
+  kwargs = dict(varlist=['precip'], stationtype='ecprecip', seasons='summer', aggregation='mean', 
+                provs=provinces[:2], default_constraints=dict(min_len=1), variable_list=dict())
+
+  def testStationEnsemble(self):
+    profile = LoadProfile()
+    stnens = loadStationEnsemble(names=self.archive.members, profile=profile, **self.kwargs)
+    self.assertEnsembleEqual(stnens[0], loadStationEnsemble(names=self.archive.members, **self.kwargs)[0], 
+                             varlist=['precip'])
+    report = profile.report()
+    self.assertEqual(report['name'], 'loadStationEnsemble')
+    self.assertIsNotNone(report['wall'])
+    self.assertEqual(len(report['children']), 1) # one cell
+    self.assertGreater(report['bytes'], 0)
+    with self.assertRaises(ArgumentError): loadStationEnsemble(names=self.archive.members, profile=True, **self.kwargs)
+
+  def testFailedLoad(self):
+    profile = LoadProfile()
+    with self.assertRaises(DatasetError): 
+      loadStationEnsemble(names=['missing'], profile=profile, **self.kwargs)
+    self.assertIsNotNone(profile.wall)
+    self.assertIsNotNone(profile.children[0].wall)
+
+
+class ChunkedTest(ArchiveTest):
+  ''' out-of-core station reductions (memory_budget) vs. loadEnsembleTS '''
+  varlist = ['precip','MaxPrecip_1d']
+
+  def compareChunked(self, **kwargs):
+    kwargs.update(names=self.archive.names, varlist=self.varlist, stationtype='ecprecip', provs=provinces[:2],
+                  default_constraints=dict(min_len=1, lat=(40,65)), variable_list=dict())
+    reference = loadStationEnsemble(**kwargs)[0]
+    chunked = loadStationEnsemble(memory_budget='10KB', **kwargs)[0] # a few stations per block
+    self.assertEnsembleEqual(chunked, reference, varlist=self.varlist)
+
+  def testSeasonal(self):
+    for aggregation in ('mean','std','max'):
+      self.compareChunked(seasons='winter', aggregation=aggregation) # winter includes December of the year before
+
+  def testClimatology(self):
+    self.compareChunked(seasons=None, aggregation='std')
+
+
+class IncrementalTest(ArchiveTest):
+  ''' incremental refresh of cached time-series (lincremental) vs. a full reload '''
+
+  def testRefresh(self):
+    size = self.archive.size
+    archive = SyntheticArchive(os.path.join(self.folder,'incremental'), size=size._replace(nyears=size.nyears-2))
+    cache = EnsembleCache(folder=os.path.join(self.folder,'incremental','cache'))
+    kwargs = dict(names=archive.members, basins=['B00'], varlist=['precip'], seasons=['summer','winter'], 
+                  aggregation=['mean','std'], variable_list=dict())
+    with archive.patch():
+      loadShapeEnsemble(cache=cache, lincremental=True, **kwargs)
+      archive.size = size; archive.write() # append two years (precip is the same for the covered period)
+      refreshed = loadShapeEnsemble(cache=cache, lincremental=True, **kwargs)
+      reference = loadShapeEnsemble(**kwargs)
+    self.assertEqual(len(refreshed), len(reference))
+    for ensembles,refensembles in zip(refreshed,reference):
+      for ensemble,refens in zip(ensembles,refensembles):
+        self.assertEnsembleEqual(ensemble, refens, varlist=['precip'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,237 @@
+'''
+Created on Oct 18, 2026
+
+Equivalence tests for the fit paths in eva.load: rescaled views and batched fits are compared to rescaled 
+copies and per-location fitDist results for one small cell of the synthetic archive in benchmarks.fixtures.
+
+@author: agent, GPL v3
+'''
+
+# external imports
+import unittest, tempfile, shutil
+import numpy as np
+import scipy.stats as ss
+# internal imports
+from geodata.misc import ArgumentError
+from eva.load import loadStationFit, rescaleDistributions, addDistFit
+from eva.rescaled import RescaledVarRV
+from eva.cache import FitCache
+import eva.fitting
+from eva.fitting import RefitReport, fitBatch, bootstrapBatch, BootstrapIndices, CrossvalMasks, streamSalt
+from tests.test_clim import ArchiveTest
+from benchmarks.fixtures import provinces, FixtureSize
+
+# some definitions
+default_constraints = dict(min_len=1, lat=(40,65), max_zerr=300, end_after=1980)
+
+
+class FitTest(ArchiveTest):
+  ''' base class that fits one cell (season and province) of the synthetic station archive '''
+  size = FixtureSize(nstations=20, nyears=40, nbasins=2, nmembers=2) # enough samples for well-posed fits
+
+  def loadFit(self, dist='gev', **kwargs):
+    ''' return the station Ensemble and the fitted Ensemble of the only cell '''
+    stnens, fitens = loadStationFit(dist=dist, names=self.archive.names, provs=provinces[0], varlist=['MaxPrecip_1d'], 
+                                    stationtype='ecprecip', seasons='summer', aggregation='max', lfit=True, 
+                                    variable_list=dict(), default_constraints=default_constraints, **kwargs)
+    return stnens[0], fitens[0] # N.B.: results are always wrapped in a list (one per cell)
+
+
+class RescaledTest(FitTest):
+  ''' rescaled views (lview=True) vs. rescaled copies '''
+
+  def setUp(self):
+    super(RescaledTest,self).setUp()
+    stnens, self.fitens = self.loadFit(lflatten=True)
+
+  def testViews(self):
+    reference = rescaleDistributions(self.fitens, reference=self.archive.obs_name, lview=False)
+    views = rescaleDistributions(self.fitens, reference=self.archive.obs_name, lview=True)
+    for dataset,refds in zip(views,reference):
+      view = dataset['MaxPrecip_1d']; refvar = refds['MaxPrecip_1d']
+      self.assertIsInstance(view, RescaledVarRV) 
+      self.assertFalse(view.lmaterialized) # parameters are only rescaled when needed
+      np.testing.assert_allclose(view.ppf(0.9), refvar.ppf(0.9), rtol=1e-6)
+      np.testing.assert_allclose(view.data_array, refvar.data_array, rtol=1e-6)
+
+  def testModification(self):
+    views = rescaleDistributions(self.fitens, reference=self.archive.obs_name, lview=True)
+    view = views[1]['MaxPrecip_1d']; original = self.fitens[1]['MaxPrecip_1d']
+    data = original.data_array.copy()
+    view.data_array[:] = 0 # modifies the rescaled copy, which is kept 
+    np.testing.assert_array_equal(view.data_array, 0)
+    np.testing.assert_array_equal(original.data_array, data)
+
+
+class BatchScaleTest(FitTest):
+  ''' scale factors for all datasets at once (lbatch=True) vs. one dataset at a time '''
+
+  def setUp(self):
+    super(BatchScaleTest,self).setUp()
+    stnens, self.fitens = self.loadFit(lflatten=False, sample_axis='year', lbatch=True)
+
+  def testScaleFactors(self):
+    for kwargs in (dict(), dict(lscale=True), dict(lglobal=True), dict(target=self.archive.members[0])):
+      reference = rescaleDistributions(self.fitens, reference=self.archive.obs_name, lbatch=False, **kwargs)
+      batch = rescaleDistributions(self.fitens, reference=self.archive.obs_name, lbatch=True, **kwargs)
+      for dataset,refds in zip(batch,reference):
+        np.testing.assert_allclose(dataset['MaxPrecip_1d'].data_array, refds['MaxPrecip_1d'].data_array, rtol=1e-6)
+
+
+class BatchFitTest(FitTest):
+  ''' batched fits (lbatch=True) vs. per-location fits with fitDist '''
+  kwargs = dict(lflatten=False, sample_axis='year')
+
+  def assertFitEqual(self, fitens, reference, rtol=1e-2):
+    ''' compare fitted parameters (up to the tolerance of the optimizer) '''
+    for dataset,refds in zip(fitens,reference):
+      np.testing.assert_allclose(dataset['MaxPrecip_1d'].data_array, refds['MaxPrecip_1d'].data_array, 
+                                 rtol=rtol, atol=1e-6)
+
+  def testBatch(self):
+    stnens, reference = self.loadFit(lbatch=False, **self.kwargs)
+    stnens, fitens = self.loadFit(lbatch=True, **self.kwargs)
+    self.assertFitEqual(fitens, reference)
+
+  def testExplicitBatch(self):
+    with self.assertRaises(ArgumentError): self.loadFit(dist=None, lbatch=True, **self.kwargs) # no default
+    with self.assertRaises(ArgumentError): self.loadFit(method='lmoments', **self.kwargs) # requires lbatch
+
+
+class BootstrapTest(FitTest):
+  ''' bootstrap replicates are bit-identical for any number of worker processes '''
+  kwargs = dict(lflatten=False, sample_axis='year', lbatch=True, lbootstrap=True, nbs=12, bs_seed=42)
+
+  def testWorkers(self):
+    stnens, serial = self.loadFit(bs_nproc=1, **self.kwargs)
+    stnens, parallel = self.loadFit(bs_nproc=4, **self.kwargs)
+    for dataset,refds in zip(parallel,serial):
+      self.assertEqual(dataset['MaxPrecip_1d'].shape[0], self.kwargs['nbs']+1) # leading bootstrap axis
+      np.testing.assert_array_equal(dataset['MaxPrecip_1d'].data_array, refds['MaxPrecip_1d'].data_array)
+
+
+class CrossvalTest(FitTest):
+  ''' cross-validation folds partition the samples and results do not depend on the number of workers '''
+  kwargs = dict(lflatten=False, sample_axis='year', lbatch=True, lcrossval=True, ncv=0.2, bs_seed=3)
+
+  def testMasks(self):
+    masks = CrossvalMasks(ncv=0.2, seed=3)
+    matrix = masks(40)
+    self.assertEqual(matrix.shape, (5,40))
+    np.testing.assert_array_equal(matrix.sum(axis=0), 1) # every sample is held out exactly once
+    self.assertIs(masks(40), matrix) # shared by all variables with the same sample size
+
+  def testWorkers(self):
+    stnens, serial = self.loadFit(bs_nproc=1, **self.kwargs)
+    stnens, parallel = self.loadFit(bs_nproc=4, **self.kwargs)
+    for dataset,refds in zip(parallel,serial):
+      np.testing.assert_array_equal(dataset['MaxPrecip_1d_cv'].data_array, refds['MaxPrecip_1d_cv'].data_array)
+
+
+class CachedFitTest(FitTest):
+  ''' base class for batched fits with a temporary FitCache '''
+  kwargs = dict(lflatten=False, sample_axis='year', lbatch=True)
+
+  def setUp(self):
+    super(CachedFitTest,self).setUp()
+    self.cache = FitCache(folder=tempfile.mkdtemp())
+
+  def tearDown(self):
+    shutil.rmtree(self.cache.folder)
+    super(CachedFitTest,self).tearDown()
+
+
+class FitCacheTest(CachedFitTest):
+  ''' fits of identical samples are retrieved from a FitCache '''
+
+  def countFits(self, **kwargs):
+    ''' fit and count the calls of the batched engine '''
+    calls = []; fitBatch = eva.fitting.fitBatch
+    eva.fitting.fitBatch = lambda *args, **kwargs: calls.append(args) or fitBatch(*args, **kwargs)
+    try: stnens, fitens = self.loadFit(**kwargs)
+    finally: eva.fitting.fitBatch = fitBatch
+    return fitens, len(calls)
+
+  def testCacheHit(self):
+    first, nfits = self.countFits(fit_cache=self.cache, **self.kwargs)
+    self.assertGreater(nfits, 0); self.assertGreater(len(self.cache), 0)
+    second, nfits = self.countFits(fit_cache=self.cache, **self.kwargs)
+    self.assertEqual(nfits, 0) # all parameters were retrieved from the cache
+    for dataset,refds in zip(second,first):
+      np.testing.assert_array_equal(dataset['MaxPrecip_1d'].data_array, refds['MaxPrecip_1d'].data_array)
+
+
+class RefitTest(CachedFitTest):
+  ''' incremental refits only refit locations with changed samples (warm-started) '''
+
+  def refit(self, stnens, **kwargs):
+    report = RefitReport()
+    fitens, sclens = addDistFit(ensemble=[stnens], dist='gev', refit_report=report, **dict(self.kwargs, **kwargs))
+    return fitens[0], report.report()
+
+  def testRefit(self):
+    with self.assertRaises(ArgumentError): self.loadFit(lrefit=True, **self.kwargs) # requires a fit_cache
+    stnens, fitens = self.loadFit(**self.kwargs)
+    nloc = sum(len(dataset.axes['station']) for dataset in stnens)
+    first, report = self.refit(stnens, fit_cache=self.cache, lrefit=True)
+    self.assertEqual((report['skipped'],report['warm'],report['recomputed']), (0,0,nloc))
+    second, report = self.refit(stnens, fit_cache=self.cache, lrefit=True)
+    self.assertEqual((report['skipped'],report['warm'],report['recomputed']), (nloc,0,0))
+    for dataset,refds in zip(second,first):
+      np.testing.assert_array_equal(dataset['MaxPrecip_1d'].data_array, refds['MaxPrecip_1d'].data_array)
+    for dataset in stnens: # change the samples of the first station
+      var = dataset['MaxPrecip_1d']; data = var.data_array.copy()
+      data.swapaxes(0,var.axisIndex('station'))[0] *= 1.1
+      var.data_array = data
+    third, report = self.refit(stnens, fit_cache=self.cache, lrefit=True)
+    self.assertEqual((report['skipped'],report['warm'],report['recomputed']), (nloc-len(stnens),len(stnens),0))
+    reference, report = self.refit(stnens) # full fit
+    for dataset,refds in zip(third,reference):
+      np.testing.assert_allclose(dataset['MaxPrecip_1d'].data_array, refds['MaxPrecip_1d'].data_array, 
+                                 rtol=1e-2, atol=1e-6)
+
+
+class LMomentTest(unittest.TestCase):
+  ''' L-moment estimates for large samples with known parameters '''
+
+  def assertEstimate(self, dist, rv, params, atol=0.05):
+    samples = rv.rvs(size=(3,20000), random_state=np.random.RandomState(1))
+    estimates = fitBatch(samples, dist=dist, method='lmoments')
+    np.testing.assert_allclose(estimates, np.tile(params,(3,1)), atol=atol)
+
+  def testGEV(self):
+    self.assertEstimate('gev', ss.genextreme(0.1, loc=10., scale=2.), (0.1,10.,2.))
+
+  def testPearson3(self): # uses the gamma function
+    self.assertEstimate('pearson3', ss.pearson3(0.5, loc=3., scale=1.), (0.5,3.,1.))
+
+
+class SharedIndicesTest(unittest.TestCase):
+  ''' shared bootstrap indices resample different variables with the same replicates '''
+
+  def setUp(self):
+    rv = ss.genextreme(0.1, loc=10., scale=2.)
+    self.reference = rv.rvs(size=(4,30), random_state=np.random.RandomState(1))
+    self.target = self.reference*1.5 + 1. # same rank order as the reference
+
+  def bootstrap(self, samples, salt, **kwargs):
+    return bootstrapBatch(samples, dist='gev', nbs=8, salt=salt, method='lmoments', **kwargs)
+
+  def testShared(self):
+    indices = BootstrapIndices(nbs=8, seed=5)
+    refparams = self.bootstrap(self.reference, streamSalt('obs','MaxPrecip_1d'), indices=indices)
+    params = self.bootstrap(self.target, streamSalt('wrf','MaxPrecip_1d'), indices=indices)
+    self.assertIs(indices(30), indices(30)) # one matrix per sample size
+    # a linear transformation of identical resamples only changes location and scale
+    np.testing.assert_allclose(params[...,0], refparams[...,0], atol=1e-8)
+    np.testing.assert_allclose(params[...,2], refparams[...,2]*1.5, rtol=1e-8)
+
+  def testIndependent(self):
+    refparams = self.bootstrap(self.reference, streamSalt('obs','MaxPrecip_1d'), seed=5)
+    params = self.bootstrap(self.target, streamSalt('wrf','MaxPrecip_1d'), seed=5)
+    np.testing.assert_allclose(params[0,:,0], refparams[0,:,0], atol=1e-8) # same original samples
+    self.assertFalse(np.allclose(params[1:,:,0], refparams[1:,:,0])) # independent replicates
+
+
+if __name__ == '__main__':
+  unittest.main()